@@ -1,11 +1,34 @@
 # API Performance Badges - ILN Architecture (VERSION CORRIGÉE)
 # Fichier unique contenant toute la logique métier
 
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response
+from fastapi.routing import APIRoute
 from typing import List, Dict, Optional
 import json
+import math
 import asyncio
 import time
+import datetime
+import base64
+import os
+import struct
+import hashlib
+import threading
+import mmap
+import bisect
+import heapq
+import random
+import sys
+import traceback
+import ssl
+import urllib.parse
+from collections import OrderedDict, deque
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
 
 # =============================================================================
 # PARADIGME ILN : Base Python + ML + Event + Roadmapex
@@ -36,7 +59,7 @@ def create_api_metrics(api_id: str, uptime: float, response_time: float,
     }
 
 def create_badge(badge_id: str, name: str, icon: str, description: str, 
-                criteria: dict, confidence: float):
+                criteria: dict, confidence: float, earned_at: Optional[str] = None):
     """Factory pour créer badge"""
     return {
         "id": badge_id,
@@ -44,16 +67,406 @@ def create_badge(badge_id: str, name: str, icon: str, description: str,
         "icon": icon,
         "description": description,
         "criteria": criteria,
-        "earned_at": get_current_timestamp(),
+        "earned_at": earned_at or get_current_timestamp(),
         "confidence_score": confidence
     }
 
+# Clés d'un badge (create_badge), dans l'ordre
+BADGE_KEYS = ('id', 'name', 'icon', 'description', 'criteria', 'earned_at', 'confidence_score')
+TEMPLATE_FIELDS = ('id', 'name', 'icon', 'description', 'criteria')
+
+
+class BadgeTemplate:
+    """Métadonnées immuables d'un badge, partagées par toutes ses attributions"""
+    __slots__ = ('id', 'name', 'icon', 'description', 'criteria', 'json_prefix')
+
+    def __init__(self, badge_id: str, config: dict):
+        self.id = badge_id
+        self.name = config['name']
+        self.icon = config['icon']
+        self.description = config['description']
+        self.criteria = dict(config['criteria'])
+        self.json_prefix = None  # fragment JSON, rempli à la première sérialisation
+
+    def matches(self, config: dict):
+        return (self.name == config['name'] and self.icon == config['icon']
+                and self.description == config['description'] and self.criteria == config['criteria'])
+
+
+# Templates internés par badge_id (réutilisés tant que la config est identique)
+_badge_templates = {}
+
+
+def intern_badge_template(badge_id: str, config: dict):
+    template = _badge_templates.get(badge_id)
+    if template is None or not template.matches(config):
+        template = _badge_templates[badge_id] = BadgeTemplate(badge_id, config)
+    return template
+
+
+class BadgeAward:
+    """
+    Badge attribué : référence au template + champs propres à l'attribution
+    Lecture comme le dict de create_badge (badge['id'], dict(badge))
+    """
+    __slots__ = ('template', 'confidence_score', 'earned_at')
+
+    def __init__(self, template: BadgeTemplate, confidence_score: float, earned_at: str):
+        self.template = template
+        self.confidence_score = confidence_score
+        self.earned_at = earned_at
+
+    def __getitem__(self, key: str):
+        if key == 'confidence_score':
+            return self.confidence_score
+        if key == 'earned_at':
+            return self.earned_at
+        if key in TEMPLATE_FIELDS:
+            return getattr(self.template, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return BADGE_KEYS
+
+    def __iter__(self):
+        return iter(BADGE_KEYS)
+
+    def __len__(self):
+        return len(BADGE_KEYS)
+
+    def __contains__(self, key: str):
+        return key in BADGE_KEYS
+
+    def __eq__(self, other):
+        if isinstance(other, (BadgeAward, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    def to_dict(self):
+        template = self.template
+        return create_badge(
+            badge_id=template.id,
+            name=template.name,
+            icon=template.icon,
+            description=template.description,
+            criteria=template.criteria,
+            confidence=self.confidence_score,
+            earned_at=self.earned_at
+        )
+
+REQUIRED_FIELDS = [
+    'api_id', 'uptime_percentage', 'avg_response_time', 
+    'total_requests', 'error_rate', 'active_users', 'security_score'
+]
+
+# (champ, types acceptés, min, max, message type, message bornes) dans l'ordre de validation
+# Entiers stockés en int64 (MetricsStore, colonnes) : bornés à la validation
+INT64_MAX = 2 ** 63 - 1
+
+FIELD_CONSTRAINTS = (
+    ('uptime_percentage', (int, float), 0, 100,
+     "uptime_percentage must be numeric", "uptime_percentage must be between 0 and 100"),
+    ('avg_response_time', (int, float), 0, None,
+     "avg_response_time must be numeric", "avg_response_time must be >= 0"),
+    ('total_requests', int, 0, INT64_MAX,
+     "total_requests must be integer", f"total_requests must be between 0 and {INT64_MAX}"),
+    ('error_rate', (int, float), 0, 100,
+     "error_rate must be numeric", "error_rate must be between 0 and 100"),
+    ('active_users', int, 0, INT64_MAX,
+     "active_users must be integer", f"active_users must be between 0 and {INT64_MAX}"),
+    ('security_score', (int, float), 0, 10,
+     "security_score must be numeric", "security_score must be between 0 and 10"),
+)
+
+
+class MetricsRecord:
+    """
+    Métriques API typées et compactes (__slots__)
+    Accès par attribut ou par clé (record['uptime_percentage']) pour rester
+    interchangeable avec les dicts de create_api_metrics
+    """
+
+    __slots__ = ('api_id', 'uptime_percentage', 'avg_response_time', 'total_requests',
+                 'error_rate', 'active_users', 'security_score', 'timestamp')
+
+    def __init__(self, api_id: str, uptime_percentage, avg_response_time, total_requests: int,
+                 error_rate, active_users: int, security_score, timestamp=None):
+        self.api_id = api_id
+        self.uptime_percentage = uptime_percentage
+        self.avg_response_time = avg_response_time
+        self.total_requests = total_requests
+        self.error_rate = error_rate
+        self.active_users = active_users
+        self.security_score = security_score
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_dict(cls, metrics: dict):
+        """Validation en une passe, arrêt à la première erreur"""
+        missing_fields = [field for field in REQUIRED_FIELDS if field not in metrics]
+        if missing_fields:
+            raise HTTPException(
+                status_code=400, 
+                detail={
+                    "error": "Missing required fields",
+                    "missing_fields": missing_fields,
+                    "required_fields": REQUIRED_FIELDS,
+                    "received_fields": list(metrics.keys()),
+                    "timestamp": get_current_timestamp()
+                }
+            )
+        
+        for field, types, lower, upper, type_message, range_message in FIELD_CONSTRAINTS:
+            value = metrics[field]
+            if not isinstance(value, types):
+                _raise_invalid(metrics, type_message)
+            # Forme "not (a <= v <= b)" : NaN est rejeté
+            if not (lower <= value <= upper if upper is not None else lower <= value):
+                _raise_invalid(metrics, range_message)
+        
+        api_id = metrics['api_id']
+        if not isinstance(api_id, str) or len(api_id) == 0:
+            _raise_invalid(metrics, "api_id must be non-empty string")
+        
+        # Timestamp optionnel : un nombre doit être fini (stockage, croissance mensuelle)
+        timestamp = metrics.get('timestamp')
+        if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool) and not math.isfinite(sample_timestamp(metrics)):
+            _raise_invalid(metrics, "timestamp must be a finite number")
+        
+        return cls(
+            api_id,
+            metrics['uptime_percentage'],
+            metrics['avg_response_time'],
+            metrics['total_requests'],
+            metrics['error_rate'],
+            metrics['active_users'],
+            metrics['security_score'],
+            metrics.get('timestamp')
+        )
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default) if isinstance(key, str) else default
+
+    def __contains__(self, key: str):
+        return key in self.__slots__
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__ if getattr(self, field) is not None}
+
+
+def _raise_invalid(metrics: dict, message: str):
+    raise HTTPException(
+        status_code=400,
+        detail={
+            "error": "Invalid data format",
+            "message": message,
+            # NaN / inf (acceptés par le parseur JSON) : null dans la réponse
+            "received_data": {key: None if isinstance(value, float) and not math.isfinite(value) else value
+                              for key, value in metrics.items()},
+            "timestamp": get_current_timestamp()
+        }
+    )
+
+# =============================================================================
+# PLANS DE RÈGLES COMPILÉS
+# =============================================================================
+
+METRIC_FIELDS = ('uptime_percentage', 'avg_response_time', 'total_requests',
+                 'error_rate', 'active_users', 'security_score')
+WEIGHTED_FIELDS = ('uptime_percentage', 'avg_response_time', 'error_rate', 'security_score')
+INTEGER_FIELDS = ('total_requests', 'active_users')
+
+# Latences de queue (ms), lues dans les sketches de latence par API
+TAIL_QUANTILES = {'p95_response_time': 0.95, 'p99_response_time': 0.99}
+TAIL_FIELDS = tuple(TAIL_QUANTILES)
+# Sans échantillon de latence : critère de queue non satisfait
+MISSING_TAILS = (math.inf,) * len(TAIL_FIELDS)
+
+# Fenêtres de disponibilité (UptimeRollups) : champ -> (mesure, durée en secondes)
+ROLLUP_WINDOWS = {
+    'uptime_30d': ('uptime', 30 * 86400),
+    'error_rate_30d': ('error_rate', 30 * 86400),
+    'uptime_180d': ('uptime', 180 * 86400),
+    'incident_minutes_180d': ('incident_minutes', 180 * 86400),
+}
+ROLLUP_FIELDS = tuple(ROLLUP_WINDOWS)
+# Sans observation dans la fenêtre : critère non satisfait
+MISSING_ROLLUPS = tuple(0.0 if measure == 'uptime' else math.inf for measure, _ in ROLLUP_WINDOWS.values())
+
+# Croissance mois sur mois d'active_users en % (GrowthTracker)
+GROWTH_FIELDS = ('active_users_growth',)
+# Sans deux mois de données récents : croissance inconnue (hors classement)
+MISSING_GROWTH = (math.nan,)
+
+# Métriques dérivées par API (sketches, rollups, croissance), hors point courant
+DERIVED_FIELDS = TAIL_FIELDS + ROLLUP_FIELDS + GROWTH_FIELDS
+MISSING_DERIVED = MISSING_TAILS + MISSING_ROLLUPS + MISSING_GROWTH
+
+# Rangs relatifs (MetricRanks) : champ -> métrique classée ; valeur = position
+# dans la population du catalogue en % depuis le haut (1 = premier pourcent)
+RANK_SPECS = {
+    'active_users_rank': 'active_users',
+    'total_requests_rank': 'total_requests',
+    'active_users_growth_rank': 'active_users_growth',
+}
+RANK_FIELDS = tuple(RANK_SPECS)
+
+# Métriques adressables par un critère (index métrique des slots)
+CRITERION_FIELDS = METRIC_FIELDS + DERIVED_FIELDS + RANK_FIELDS
+# Index (dans CRITERION_FIELDS) de la métrique classée de chaque rang
+RANK_BASE_INDEXES = tuple(CRITERION_FIELDS.index(base) for base in RANK_SPECS.values())
+
+CONFIDENCE_THRESHOLD = 0.85
+
+# Sens du score : valeur / seuil, ou seuil / max(valeur, plancher)
+SCORE_RATIO = 0
+SCORE_INVERSE = 1
+
+# Critère -> (métrique, sens, plancher)
+CRITERION_SPECS = {
+    'uptime': ('uptime_percentage', SCORE_RATIO, None),
+    'response_time': ('avg_response_time', SCORE_INVERSE, 1),
+    'error_rate': ('error_rate', SCORE_INVERSE, 0.01),
+    'security_score': ('security_score', SCORE_RATIO, None),
+    'min_requests': ('total_requests', SCORE_RATIO, None),
+    'active_users': ('active_users', SCORE_RATIO, None),
+    'p95_response_time': ('p95_response_time', SCORE_INVERSE, 1),
+    'p99_response_time': ('p99_response_time', SCORE_INVERSE, 1),
+    'uptime_30d': ('uptime_30d', SCORE_RATIO, None),
+    'error_rate_30d': ('error_rate_30d', SCORE_INVERSE, 0.01),
+    'uptime_180d': ('uptime_180d', SCORE_RATIO, None),
+    'incident_minutes_180d': ('incident_minutes_180d', SCORE_INVERSE, 1),
+    # Seuil = top X % du catalogue
+    'top_active_users': ('active_users_rank', SCORE_INVERSE, 0.01),
+    'top_requests': ('total_requests_rank', SCORE_INVERSE, 0.01),
+    'top_growth': ('active_users_growth_rank', SCORE_INVERSE, 0.01),
+}
+
+# Score attribué aux critères inconnus
+UNKNOWN_CRITERION_SCORE = 0.5
+
+
+class BadgeRulePlan:
+    """
+    Règles badges compilées en plan plat
+    slots  : critères uniques (index métrique, seuil, sens, plancher),
+             partagés entre badges ; index métrique -1 = critère inconnu
+    badges : (badge_id, template interné, index des slots, exposant géométrique)
+    dependencies : badge_id -> métriques lues par ses critères (rangs : + métrique classée)
+    uses_derived : au moins un critère lit une métrique dérivée (DERIVED_FIELDS)
+    uses_ranks : au moins un critère de rang (RANK_FIELDS)
+    """
+
+    def __init__(self, slots: list, badges: list, version: int):
+        self.slots = slots
+        self.badges = badges
+        self.version = version
+        self.dependencies = {}
+        for badge_id, _, indices, _ in badges:
+            fields = {CRITERION_FIELDS[slots[index][0]] for index in indices if slots[index][0] >= 0}
+            fields |= {RANK_SPECS[field] for field in fields if field in RANK_SPECS}
+            self.dependencies[badge_id] = tuple(sorted(fields))
+        used = set().union(*self.dependencies.values()) if badges else set()
+        self.uses_derived = any(field in DERIVED_FIELDS for field in used)
+        self.uses_ranks = any(field in RANK_SPECS for field in used)
+
+    def templates(self):
+        return {badge_id: template for badge_id, template, _, _ in self.badges}
+
+
+def diff_rule_plans(previous: BadgeRulePlan, current: BadgeRulePlan):
+    """
+    Badges ajoutés / supprimés / modifiés entre deux plans
+    Templates internés : même objet = même configuration
+    criteria_changed : badges à réévaluer ; metadata_changed : affichage seul
+    """
+    before = previous.templates() if previous is not None else {}
+    after = current.templates()
+    changes = {
+        'added': [badge_id for badge_id in after if badge_id not in before],
+        'removed': [badge_id for badge_id in before if badge_id not in after],
+        'criteria_changed': [],
+        'metadata_changed': []
+    }
+    for badge_id, template in after.items():
+        old = before.get(badge_id)
+        if old is None or old is template:
+            continue
+        if old.criteria != template.criteria:
+            changes['criteria_changed'].append(badge_id)
+        elif (old.name, old.icon, old.description) != (template.name, template.icon, template.description):
+            changes['metadata_changed'].append(badge_id)
+    return changes
+
+
+def compile_badge_rules(badge_rules: dict, version: int = 0, intern: bool = True):
+    """
+    Compilation badge_rules -> BadgeRulePlan (une fois par version des règles)
+    intern=False : templates propres au plan (règles candidates, hors registre)
+    """
+    slots = []
+    slot_index = {}
+    badges = []
+
+    for badge_id, badge_config in badge_rules.items():
+        indices = []
+        for criterion, threshold in badge_config['criteria'].items():
+            spec = CRITERION_SPECS.get(criterion)
+            if spec is None:
+                slot = (-1, threshold, SCORE_RATIO, None)
+            else:
+                metric, direction, floor = spec
+                slot = (CRITERION_FIELDS.index(metric), threshold, direction, floor)
+            # Même critère + même seuil -> score calculé une seule fois
+            if slot not in slot_index:
+                slot_index[slot] = len(slots)
+                slots.append(slot)
+            indices.append(slot_index[slot])
+
+        exponent = 1.0 / len(indices) if indices else None
+        template = intern_badge_template(badge_id, badge_config) if intern else BadgeTemplate(badge_id, badge_config)
+        badges.append((badge_id, template, tuple(indices), exponent))
+
+    return BadgeRulePlan(slots, badges, version)
+
+
+def score_slot(slot: tuple, value):
+    """Score d'un critère compilé (sans dispatch par chaîne)"""
+    metric_index, threshold, direction, floor = slot
+    if metric_index < 0:
+        score = UNKNOWN_CRITERION_SCORE
+    elif direction == SCORE_RATIO:
+        score = min(1.0, value / threshold)
+    else:
+        score = min(1.0, threshold / max(value, floor))
+    return max(0.0, score)
+
 # =============================================================================
 # MOTEUR DE CALCUL BADGES (Pure Python)
 # =============================================================================
 
 class BadgeCalculationEngine:
     def __init__(self):
+        self.rules_version = 0
+        self.rule_plan = None
+        self.badge_versions = {}
+        self.last_changes = None
+        # Métriques dérivées par API (DerivedMetrics / PrecomputedDerived)
+        self.derived_source = None
+        # Populations classées pour les critères de rang (MetricRanks / FrozenRanks)
+        self.rank_source = None
         # Configuration badges avec critères objectifs
         self.badge_rules = {
             'trusted_api': {
@@ -106,31 +519,157 @@ class BadgeCalculationEngine:
             }
         }
     
-    def calculate_badges(self, metrics: dict, historical_data: list = None):
-        """Calcul badges avec algorithmes pure Python"""
+    @property
+    def badge_rules(self):
+        return self._badge_rules
+    
+    @badge_rules.setter
+    def badge_rules(self, rules: dict):
+        """Remplacement des règles -> recompilation du plan"""
+        self._badge_rules = rules
+        self.recompile_rules()
+    
+    def recompile_rules(self):
+        """
+        Recompilation du plan (à appeler après modification en place des règles)
+        Version par badge : version des règles de sa dernière modification
+        """
+        previous = self.rule_plan
+        self.rules_version += 1
+        self.rule_plan = compile_badge_rules(self._badge_rules, self.rules_version)
+        self.last_changes = diff_rule_plans(previous, self.rule_plan)
+        changes = self.last_changes
+        for badge_id in changes['added'] + changes['criteria_changed'] + changes['metadata_changed']:
+            self.badge_versions[badge_id] = self.rules_version
+        for badge_id in changes['removed']:
+            self.badge_versions.pop(badge_id, None)
+        return self.rule_plan
+    
+    def load_rules(self, rules: dict, version: int, badge_versions: dict):
+        """Règles publiées par l'écrivain (snapshot) : mêmes numéros de version que lui"""
+        self.badge_rules = rules
+        self.rules_version = version
+        self.rule_plan.version = version
+        self.badge_versions = dict(badge_versions)
+    
+    def set_badge_rule(self, badge_id: str, config: dict):
+        """Ajout / remplacement d'un badge -> changements (diff_rule_plans)"""
+        if self._badge_rules.get(badge_id) == config:
+            return diff_rule_plans(self.rule_plan, self.rule_plan)
+        rules = dict(self._badge_rules)
+        rules[badge_id] = config
+        self.badge_rules = rules
+        return self.last_changes
+    
+    def remove_badge_rule(self, badge_id: str):
+        rules = dict(self._badge_rules)
+        rules.pop(badge_id, None)
+        self.badge_rules = rules
+        return self.last_changes
+    
+    def derived_values(self, api_id: str):
+        """Métriques dérivées de l'API, dans l'ordre de DERIVED_FIELDS"""
+        if self.derived_source is None:
+            return MISSING_DERIVED
+        return self.derived_source.derived_values(api_id)
+    
+    def gather_derived(self, api_ids: list):
+        """Métriques dérivées d'un lot [n x len(DERIVED_FIELDS)]"""
+        if self.derived_source is None:
+            return np.tile(np.array(MISSING_DERIVED), (len(api_ids), 1))
+        return self.derived_source.gather(api_ids)
+    
+    def ranks_version(self):
+        """
+        Version des populations classées si le plan a des critères de rang (sinon None)
+        Populations figées (FrozenRanks, snapshot) : None, le cache est vidé à chaque snapshot
+        """
+        if self.rank_source is None or not self.rule_plan.uses_ranks:
+            return None
+        return getattr(self.rank_source, 'version', None)
+    
+    def top_percent(self, base: str, value, api_id: str = None):
+        """Position de value dans la population de base, en % depuis le haut (hors entrée de api_id)"""
+        if self.rank_source is None:
+            return 100.0
+        return self.rank_source.top_percent(base, value, api_id)
+    
+    def rank_values(self, metrics: dict, values: list):
+        """
+        Valeurs RANK_FIELDS : la population classe les métriques brutes reçues
+        (catalogue) et la croissance dérivée ; l'API est classée sur la même
+        grandeur, sa propre entrée (valeur précédente) étant exclue
+        """
+        return [
+            self.top_percent(base, metrics[base] if base in METRIC_FIELDS else values[index], metrics['api_id'])
+            for base, index in zip(RANK_SPECS.values(), RANK_BASE_INDEXES)
+        ]
+    
+    def add_rank_columns(self, averaged: dict, raw: dict, api_ids: list = None):
+        """
+        Équivalent vectorisé de rank_values pour les métriques classées présentes
+        raw : colonnes brutes reçues ; api_ids None : valeurs déjà en population
+        (catalogue), aucune entrée à exclure
+        """
+        for field, base in RANK_SPECS.items():
+            column = raw.get(base, averaged.get(base))
+            if column is None:
+                continue
+            averaged[field] = (self.rank_source.top_percent_many(base, column, api_ids)
+                               if self.rank_source is not None else np.full(len(column), 100.0))
+    
+    def calculate_badges(self, metrics: dict, historical_data: list = None, aggregate: tuple = None,
+                         timings: dict = None, earned_at: str = None):
+        """
+        Calcul badges via le plan de règles compilé
+        aggregate : (sommes pondérées, poids total) de DecayedAggregates,
+        prioritaire sur historical_data
+        timings : durées par étape (secondes) ajoutées si fourni
+        earned_at : horodatage commun d'un lot (sinon calculé une fois ici)
+        """
         if historical_data is None:
             historical_data = []
         
         earned_badges = []
+        started = time.perf_counter() if timings is not None else 0.0
         
         # Calcul moyennes pondérées
-        avg_metrics = self._calculate_weighted_averages(metrics, historical_data)
+        if aggregate is not None:
+            avg_metrics = self._weighted_averages_from_aggregate(metrics, *aggregate)
+        else:
+            avg_metrics = self._calculate_weighted_averages(metrics, historical_data)
+        values = [avg_metrics[field] for field in METRIC_FIELDS]
+        plan = self.rule_plan
+        if plan.uses_derived:
+            values.extend(self.derived_values(metrics['api_id']))
+        elif plan.uses_ranks:
+            values.extend(MISSING_DERIVED)
+        if plan.uses_ranks:
+            values.extend(self.rank_values(metrics, values))
+        if timings is not None:
+            started = add_timing(timings, 'weighted_averages', started)
+        
+        # Scores des critères uniques, partagés entre badges
+        scores = [max(score_slot(slot, values[slot[0]]), 0.01) for slot in plan.slots]
         
         # Évaluation chaque badge
-        for badge_id, badge_config in self.badge_rules.items():
-            confidence = self._evaluate_badge_criteria(avg_metrics, badge_config['criteria'])
+        for badge_id, template, indices, exponent in plan.badges:
+            if exponent is None:
+                continue
             
-            if confidence >= 0.85:  # Seuil confiance 85%
-                badge = create_badge(
-                    badge_id=badge_id,
-                    name=badge_config['name'],
-                    icon=badge_config['icon'],
-                    description=badge_config['description'],
-                    criteria=badge_config['criteria'],
-                    confidence=round(confidence, 2)
-                )
-                earned_badges.append(badge)
+            # Moyenne géométrique
+            geometric_mean = 1.0
+            for index in indices:
+                geometric_mean *= scores[index]
+            confidence = geometric_mean ** exponent
+            
+            if confidence >= CONFIDENCE_THRESHOLD:  # Seuil confiance 85%
+                if earned_at is None:
+                    earned_at = get_current_timestamp()
+                earned_badges.append(BadgeAward(template, round(confidence, 2), earned_at))
         
+        if timings is not None:
+            add_timing(timings, 'rule_evaluation', started)
         return earned_badges
     
     def _calculate_weighted_averages(self, current: dict, historical: list):
@@ -167,28 +706,41 @@ class BadgeCalculationEngine:
         
         return weighted_avg
     
+    def _weighted_averages_from_aggregate(self, current: dict, sums: list, weight: float):
+        """Moyennes pondérées en O(1) depuis l'agrégat incrémental"""
+        total_weight = 1.0 + weight
+        weighted_avg = {}
+        
+        for k, key in enumerate(WEIGHTED_FIELDS):
+            weighted_avg[key] = (current[key] * 1.0 + sums[k]) / total_weight
+        
+        # Valeurs absolues (non moyennées)
+        weighted_avg['active_users'] = current['active_users']
+        weighted_avg['total_requests'] = current['total_requests']
+        
+        return weighted_avg
+    
+    def _criterion_value(self, metrics: dict, field: str):
+        if field in DERIVED_FIELDS and field not in metrics:
+            return self.derived_values(metrics['api_id'])[DERIVED_FIELDS.index(field)]
+        return metrics[field]
+    
     def _evaluate_badge_criteria(self, metrics: dict, criteria: dict):
-        """Évaluation probabiliste des critères"""
+        """Évaluation probabiliste des critères (hors plan compilé)"""
         scores = []
         
         for criterion, threshold in criteria.items():
-            if criterion == 'uptime':
-                score = min(1.0, metrics['uptime_percentage'] / threshold)
-            elif criterion == 'response_time':
-                score = min(1.0, threshold / max(metrics['avg_response_time'], 1))
-            elif criterion == 'error_rate':
-                actual_error = max(metrics['error_rate'], 0.01)
-                score = min(1.0, threshold / actual_error)
-            elif criterion == 'security_score':
-                score = min(1.0, metrics['security_score'] / threshold)
-            elif criterion == 'min_requests':
-                score = min(1.0, metrics['total_requests'] / threshold)
-            elif criterion == 'active_users':
-                score = min(1.0, metrics['active_users'] / threshold)
+            spec = CRITERION_SPECS.get(criterion)
+            if spec is None:
+                score = score_slot((-1, threshold, SCORE_RATIO, None), None)
             else:
-                score = 0.5
-            
-            scores.append(max(0.0, score))
+                metric, direction, floor = spec
+                if metric in RANK_SPECS and metric not in metrics:
+                    value = self.top_percent(RANK_SPECS[metric], self._criterion_value(metrics, RANK_SPECS[metric]))
+                else:
+                    value = self._criterion_value(metrics, metric)
+                score = score_slot((0, threshold, direction, floor), value)
+            scores.append(score)
         
         if not scores:
             return 0.0
@@ -200,6 +752,204 @@ class BadgeCalculationEngine:
         
         return geometric_mean ** (1.0 / len(scores))
 
+# =============================================================================
+# MOTEUR VECTORISÉ BULK (NumPy, une colonne par métrique)
+# =============================================================================
+
+# Entiers au-delà de 2**53 : non représentables en float64 -> chemin scalaire
+EXACT_INT_LIMIT = 2 ** 53
+
+# En dessous de cette taille, le chemin scalaire reste plus rapide
+COLUMNAR_BATCH_THRESHOLD = 32
+
+
+def _is_exact_number(value, integer_only: bool):
+    """Valeur numérique convertible en float64 sans perte"""
+    if isinstance(value, int):
+        return -EXACT_INT_LIMIT <= value <= EXACT_INT_LIMIT
+    return not integer_only and isinstance(value, float)
+
+
+class ColumnarBadgeEngine:
+    """
+    Calcul badges en colonnes pour /bulk-calculate
+    Validation, moyennes pondérées, scores et moyennes géométriques
+    calculés en opérations tableaux sur tout le lot et tous les badges.
+    Résultats identiques au chemin scalaire (mêmes opérations flottantes,
+    dans le même ordre).
+    """
+
+    def __init__(self, engine: BadgeCalculationEngine, aggregates: 'DecayedAggregates'):
+        self.engine = engine
+        self.aggregates = aggregates
+
+    def load_columns(self, api_metrics_list: list):
+        """Chargement lot -> colonnes float64 + masque lignes éligibles"""
+        n = len(api_metrics_list)
+        eligible = np.fromiter(
+            (isinstance(m.get('api_id'), str) and len(m['api_id']) > 0 for m in api_metrics_list),
+            dtype=bool, count=n
+        )
+        columns = {}
+        for field in METRIC_FIELDS:
+            integer_only = field in INTEGER_FIELDS
+            values = [m.get(field) for m in api_metrics_list]
+            exact = [_is_exact_number(v, integer_only) for v in values]
+            columns[field] = np.array(
+                [float(v) if ok else np.nan for v, ok in zip(values, exact)],
+                dtype=np.float64
+            ).reshape(n)
+            eligible &= np.array(exact, dtype=bool).reshape(n)
+
+        return columns, self.check_ranges(columns, eligible)
+
+    @staticmethod
+    def check_ranges(columns: dict, eligible):
+        """Contraintes de validate_metrics_data (NaN -> False) appliquées au masque"""
+        uptime = columns['uptime_percentage']
+        error_rate = columns['error_rate']
+        security = columns['security_score']
+        eligible &= (uptime >= 0) & (uptime <= 100)
+        eligible &= columns['avg_response_time'] >= 0
+        eligible &= columns['total_requests'] >= 0
+        eligible &= (error_rate >= 0) & (error_rate <= 100)
+        eligible &= columns['active_users'] >= 0
+        eligible &= (security >= 0) & (security <= 10)
+        return eligible
+
+    def weighted_averages(self, columns: dict, sums, weights):
+        """Équivalent vectorisé de _weighted_averages_from_aggregate (colonnes fournies seulement)"""
+        total_weight = 1.0 + weights
+
+        averaged = {}
+        for k, key in enumerate(WEIGHTED_FIELDS):
+            if key in columns:
+                averaged[key] = (columns[key] * 1.0 + sums[:, k]) / total_weight
+
+        for key in ('active_users', 'total_requests'):
+            if key in columns:
+                averaged[key] = columns[key]
+        return averaged
+
+    def _slot_scores(self, averaged: dict, slot: tuple, n: int):
+        """Équivalent vectorisé de score_slot"""
+        metric_index, threshold, direction, floor = slot
+        if metric_index < 0:
+            return np.full(n, UNKNOWN_CRITERION_SCORE)
+        column = averaged[CRITERION_FIELDS[metric_index]]
+        if direction == SCORE_RATIO:
+            score = np.minimum(1.0, column / threshold)
+        else:
+            score = np.minimum(1.0, threshold / np.maximum(column, floor))
+        return np.maximum(0.0, score)
+
+    def evaluate(self, averaged: dict, plan: BadgeRulePlan, n: int = None):
+        """
+        Scores de tous les badges pour tout le lot
+        Retourne les produits géométriques [badges x apis]
+        """
+        if n is None:
+            n = len(averaged['active_users'])
+        slot_scores = [np.maximum(self._slot_scores(averaged, slot, n), 0.01) for slot in plan.slots]
+        products = np.ones((len(plan.badges), n))
+
+        for b, (_, _, indices, _) in enumerate(plan.badges):
+            for index in indices:
+                products[b] = products[b] * slot_scores[index]
+
+        return products
+
+    def _score(self, api_ids: list, selected: dict, timings: dict, started: float):
+        """
+        Historique + moyennes + scores des lignes éligibles
+        Retourne (plan, produits, pow vectorisé, candidats [badges x lignes], started)
+        """
+        sums, weights = self.aggregates.gather(api_ids)
+        plan = self.engine.rule_plan
+        derived = self.engine.gather_derived(api_ids) if plan.uses_derived else None
+        started = add_timing(timings, 'history_fetch', started)
+        averaged = self.weighted_averages(selected, sums, weights)
+        if derived is not None:
+            for k, field in enumerate(DERIVED_FIELDS):
+                averaged[field] = derived[:, k]
+        if plan.uses_ranks:
+            self.engine.add_rank_columns(averaged, selected, api_ids)
+        started = add_timing(timings, 'weighted_averages', started)
+        products = self.evaluate(averaged, plan)
+
+        exponents = np.array([exponent or 0.0 for _, _, _, exponent in plan.badges])
+        awardable = np.array([exponent is not None for _, _, _, exponent in plan.badges], dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            approx = products ** exponents[:, None]
+        # Marge pour les écarts d'arrondi de pow vectorisé, confirmés par le pow scalaire
+        candidates = (approx >= CONFIDENCE_THRESHOLD - 1e-9) & awardable[:, None]
+        return plan, products, approx, candidates, started
+
+    def calculate_columns(self, api_ids: list, columns: dict, eligible, timings: dict = None):
+        """
+        Lot déjà en colonnes (format binaire), sans structure par API
+        Retourne (plan, confiances arrondies [badges x lot], NaN = non attribué)
+        Lignes non éligibles : NaN partout, à traiter par le chemin scalaire
+        """
+        timings = {} if timings is None else timings
+        started = time.perf_counter()
+        rows = np.flatnonzero(eligible)
+        if len(rows) == 0:
+            plan = self.engine.rule_plan
+            return plan, np.full((len(plan.badges), len(api_ids)), np.nan)
+
+        selected = {field: columns[field][rows] for field in METRIC_FIELDS}
+        plan, products, approx, candidates, started = self._score(
+            [api_ids[i] for i in rows.tolist()], selected, timings, started
+        )
+        confidences = np.full((len(plan.badges), len(api_ids)), np.nan)
+        # Seuil ou arrondi au centième indécis à 1 ulp près : pow scalaire (même résultat que calculate_batch)
+        scaled = approx * 100.0
+        doubtful = candidates & ((approx < CONFIDENCE_THRESHOLD + 1e-9) | (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6))
+        block = np.where(candidates & ~doubtful, np.round(approx, 2), np.nan)
+        badge_idx, api_idx = np.nonzero(doubtful)
+        for b, a in zip(badge_idx.tolist(), api_idx.tolist()):
+            confidence = float(products[b, a]) ** plan.badges[b][3]
+            if confidence >= CONFIDENCE_THRESHOLD:
+                block[b, a] = round(confidence, 2)
+        confidences[:, rows] = block
+
+        add_timing(timings, 'rule_evaluation', started)
+        return plan, confidences
+
+    def calculate_batch(self, api_metrics_list: list, timings: dict = None, earned_at: str = None):
+        """
+        Badges pour chaque élément du lot
+        None pour les lignes à traiter par le chemin scalaire (invalides
+        ou non représentables exactement)
+        """
+        timings = {} if timings is None else timings
+        started = time.perf_counter()
+        columns, eligible = self.load_columns(api_metrics_list)
+        rows = np.flatnonzero(eligible)
+        results = [None] * len(api_metrics_list)
+        started = add_timing(timings, 'validation', started)
+        if len(rows) == 0:
+            return results
+
+        selected = {field: columns[field][rows] for field in METRIC_FIELDS}
+        api_ids = [api_metrics_list[i]['api_id'] for i in rows]
+        plan, products, approx, candidates, started = self._score(api_ids, selected, timings, started)
+
+        for i in rows:
+            results[i] = []
+        if earned_at is None:
+            earned_at = get_current_timestamp()
+        api_idx, badge_idx = np.nonzero(candidates.T)
+        for a, b in zip(api_idx.tolist(), badge_idx.tolist()):
+            _, template, _, exponent = plan.badges[b]
+            confidence = float(products[b, a]) ** exponent
+            if confidence >= CONFIDENCE_THRESHOLD:
+                results[rows[a]].append(BadgeAward(template, round(confidence, 2), earned_at))
+
+        add_timing(timings, 'rule_evaluation', started)
+        return results
+
 # =============================================================================
 # CALCULS COMMISSION (Pure Python)
 # =============================================================================
@@ -234,171 +984,5198 @@ class CommissionCalculator:
         else:
             return 0.65
 
+
+class EvaluationState:
+    """
+    Règles, agrégats, catalogue et commission d'une même version
+    Un calcul lit evaluation_state une fois et n'utilise que cet état ;
+    un lecteur en construit un nouveau par snapshot et le remplace d'un bloc
+    """
+
+    __slots__ = ('engine', 'columnar', 'aggregates', 'catalog', 'commission')
+
+    def __init__(self, engine: BadgeCalculationEngine, columnar: ColumnarBadgeEngine, aggregates,
+                 catalog: 'BadgeCatalog', commission: CommissionCalculator):
+        self.engine = engine
+        self.columnar = columnar
+        self.aggregates = aggregates
+        self.catalog = catalog
+        self.commission = commission
+
 # =============================================================================
-# FONCTIONS UTILITAIRES (Pure Python)
+# STOCKAGE SÉRIES TEMPORELLES (segments binaires append-only par API)
 # =============================================================================
 
-def get_current_timestamp():
-    """Timestamp actuel format ISO"""
-    import datetime
-    return datetime.datetime.now().isoformat()
+DATA_DIR = os.environ.get("BADGES_DATA_DIR", "data")
 
-def get_historical_metrics(api_id: str):
-    """Simulation données historiques"""
-    historical = []
-    for i in range(10):  # 10 derniers jours
-        historical.append({
-            'uptime_percentage': 98.5 + (i * 0.1),
-            'avg_response_time': 150 - (i * 2),
-            'error_rate': max(2.0 - (i * 0.05), 0.1),
-            'security_score': min(7.0 + (i * 0.05), 10.0),
-            'timestamp': get_current_timestamp()
-        })
-    
-    return historical
+# Points historiques lus par évaluation (hors point courant)
+HISTORY_DEPTH = 10
 
-def validate_metrics_data(metrics: dict):
-    """🔧 NOUVELLE FONCTION : Validation complète des données d'entrée"""
-    
-    # Vérification champs obligatoires
-    required_fields = [
-        'api_id', 'uptime_percentage', 'avg_response_time', 
-        'total_requests', 'error_rate', 'active_users', 'security_score'
-    ]
-    
-    missing_fields = [field for field in required_fields if field not in metrics]
-    
-    if missing_fields:
-        raise HTTPException(
-            status_code=400, 
-            detail={
-                "error": "Missing required fields",
-                "missing_fields": missing_fields,
-                "required_fields": required_fields,
-                "received_fields": list(metrics.keys()),
-                "timestamp": get_current_timestamp()
+# Enregistrement fixe 56 octets, ordre chronologique dans chaque segment
+SAMPLE_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('uptime_percentage', '<f8'),
+    ('avg_response_time', '<f8'),
+    ('error_rate', '<f8'),
+    ('security_score', '<f8'),
+    ('total_requests', '<i8'),
+    ('active_users', '<i8'),
+])
+SAMPLE_STRUCT = struct.Struct('<5d2q')
+SEGMENT_MAGIC = b'BDGSEG01'
+SEGMENT_HEADER = struct.Struct('<8sII')
+
+
+class MetricsStore:
+    """
+    Stockage fichier des métriques, sans service externe
+    - un segment append-only par API : en-tête 16 octets + enregistrements
+      SAMPLE_DTYPE triés par timestamp (index temporel = recherche dichotomique)
+    - index api_id -> segment : hash sha1 réparti sur 256 sous-répertoires,
+      liste des api_id dans api_index.log
+    - rétention (retention_days) et plafond de points par API (max_points),
+      appliqués par compaction (réécriture atomique du segment)
+    """
+
+    def __init__(self, root: str, retention_days: float = 400, max_points: int = 400,
+                 max_open_files: int = 256):
+        self.root = root
+        self.retention_seconds = retention_days * 86400
+        self.max_points = max_points
+        self.max_open_files = max_open_files
+        self._lock = threading.RLock()
+        self._fds = OrderedDict()
+        self._last_timestamps = {}
+        self._api_ids = set()
+        os.makedirs(root, exist_ok=True)
+        self._index_path = os.path.join(root, 'api_index.log')
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, 'r', encoding='utf-8') as index_file:
+            for line in index_file:
+                if line.strip():
+                    self._api_ids.add(json.loads(line))
+
+    def _segment_path(self, api_id: str):
+        digest = hashlib.sha1(api_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest + '.seg')
+
+    def _fd(self, api_id: str, create: bool = False):
+        """Descripteur en cache LRU (None si segment absent et create=False)"""
+        fd = self._fds.get(api_id)
+        if fd is not None:
+            self._fds.move_to_end(api_id)
+            return fd
+
+        path = self._segment_path(api_id)
+        if not os.path.exists(path):
+            if not create:
+                return None
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(fd, SEGMENT_HEADER.pack(SEGMENT_MAGIC, SAMPLE_DTYPE.itemsize, 0))
+            if api_id not in self._api_ids:
+                self._api_ids.add(api_id)
+                with open(self._index_path, 'a', encoding='utf-8') as index_file:
+                    index_file.write(json.dumps(api_id) + '\n')
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_APPEND)
+
+        self._fds[api_id] = fd
+        while len(self._fds) > self.max_open_files:
+            _, old_fd = self._fds.popitem(last=False)
+            os.close(old_fd)
+        return fd
+
+    def _close(self, api_id: str):
+        fd = self._fds.pop(api_id, None)
+        if fd is not None:
+            os.close(fd)
+
+    def _count(self, fd: int):
+        return (os.fstat(fd).st_size - SEGMENT_HEADER.size) // SAMPLE_DTYPE.itemsize
+
+    def _last_timestamp(self, api_id: str, fd: int):
+        if api_id not in self._last_timestamps:
+            last = self._read_tail(fd, 1)
+            self._last_timestamps[api_id] = float(last['timestamp'][0]) if len(last) else 0.0
+        return self._last_timestamps[api_id]
+
+    def _read_tail(self, fd: int, n: int):
+        count = self._count(fd)
+        n = min(n, count)
+        if n <= 0:
+            return np.empty(0, dtype=SAMPLE_DTYPE)
+        offset = SEGMENT_HEADER.size + (count - n) * SAMPLE_DTYPE.itemsize
+        data = os.pread(fd, n * SAMPLE_DTYPE.itemsize, offset)
+        return np.frombuffer(data, dtype=SAMPLE_DTYPE)
+
+    def append_many(self, api_id: str, samples: list):
+        """Ajout de points (dicts métriques) à la fin du segment de l'API"""
+        with self._lock:
+            fd = self._fd(api_id, create=True)
+            last = self._last_timestamp(api_id, fd)
+            chunks = []
+            for sample in samples:
+                # Segment trié : un point en retard est ramené au dernier timestamp
+                timestamp = max(sample_timestamp(sample), last)
+                last = timestamp
+                chunks.append(SAMPLE_STRUCT.pack(
+                    timestamp,
+                    sample['uptime_percentage'],
+                    sample['avg_response_time'],
+                    sample['error_rate'],
+                    sample['security_score'],
+                    sample['total_requests'],
+                    sample['active_users']
+                ))
+            os.write(fd, b''.join(chunks))
+            self._last_timestamps[api_id] = last
+
+            # Compaction amortie quand le segment dépasse son plafond de 25%
+            if self._count(fd) > self.max_points * 1.25:
+                self.compact(api_id)
+
+    def append(self, api_id: str, sample: dict):
+        self.append_many(api_id, [sample])
+
+    def read_last(self, api_id: str, n: int):
+        """N derniers points (ordre chronologique), tableau SAMPLE_DTYPE"""
+        with self._lock:
+            fd = self._fd(api_id)
+            if fd is None:
+                return np.empty(0, dtype=SAMPLE_DTYPE)
+            return self._read_tail(fd, n)
+
+    def read_range(self, api_id: str, start: float, end: float):
+        """Points avec start <= timestamp < end"""
+        with self._lock:
+            fd = self._fd(api_id)
+            if fd is None:
+                return np.empty(0, dtype=SAMPLE_DTYPE)
+            points = self._read_tail(fd, self._count(fd))
+        timestamps = points['timestamp']
+        lo = np.searchsorted(timestamps, start, side='left')
+        hi = np.searchsorted(timestamps, end, side='left')
+        return points[lo:hi]
+
+    def api_ids(self):
+        with self._lock:
+            return list(self._api_ids)
+
+    def has_history(self, api_id: str):
+        with self._lock:
+            return api_id in self._api_ids
+
+    def compact(self, api_id: str = None, now: float = None):
+        """
+        Application rétention + plafond de points
+        Sans api_id : toutes les APIs ; segments vidés supprimés
+        """
+        now = time.time() if now is None else now
+        cutoff = now - self.retention_seconds
+        targets = [api_id] if api_id is not None else self.api_ids()
+        removed_points = 0
+        emptied = []
+
+        with self._lock:
+            for target in targets:
+                path = self._segment_path(target)
+                if not os.path.exists(path):
+                    continue
+                fd = self._fd(target)
+                points = self._read_tail(fd, self._count(fd))
+                keep = points[points['timestamp'] >= cutoff][-self.max_points:]
+                if len(keep) == len(points):
+                    continue
+
+                removed_points += len(points) - len(keep)
+                self._close(target)
+                if len(keep) == 0:
+                    os.remove(path)
+                    self._last_timestamps.pop(target, None)
+                    emptied.append(target)
+                    continue
+
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'wb') as tmp_file:
+                    tmp_file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SAMPLE_DTYPE.itemsize, 0))
+                    tmp_file.write(keep.tobytes())
+                os.replace(tmp_path, path)
+
+            if emptied:
+                # APIs sans point conservé : retirées de api_ids() et de l'index
+                self._api_ids.difference_update(emptied)
+                self._write_index()
+
+        return {"compacted_apis": len(targets), "removed_points": removed_points, "removed_apis": len(emptied)}
+
+    def _write_index(self):
+        """Réécriture atomique de api_index.log (fichier temporaire + os.replace)"""
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as index_file:
+            index_file.writelines(json.dumps(api_id) + '\n' for api_id in self._api_ids)
+        os.replace(tmp_path, self._index_path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "apis": len(self._api_ids),
+                "open_segments": len(self._fds),
+                "retention_days": self.retention_seconds / 86400,
+                "max_points_per_api": self.max_points,
+                "record_bytes": SAMPLE_DTYPE.itemsize
             }
-        )
-    
-    # Validation types et valeurs
-    validations = [
-        # Uptime
-        (isinstance(metrics.get('uptime_percentage'), (int, float)), 
-         "uptime_percentage must be numeric"),
-        (0 <= metrics.get('uptime_percentage', -1) <= 100, 
-         "uptime_percentage must be between 0 and 100"),
-        
-        # Response time
-        (isinstance(metrics.get('avg_response_time'), (int, float)), 
-         "avg_response_time must be numeric"),
-        (metrics.get('avg_response_time', -1) >= 0, 
-         "avg_response_time must be >= 0"),
-        
-        # Total requests
-        (isinstance(metrics.get('total_requests'), int), 
-         "total_requests must be integer"),
-        (metrics.get('total_requests', -1) >= 0, 
-         "total_requests must be >= 0"),
-        
-        # Error rate
-        (isinstance(metrics.get('error_rate'), (int, float)), 
-         "error_rate must be numeric"),
-        (0 <= metrics.get('error_rate', -1) <= 100, 
-         "error_rate must be between 0 and 100"),
-        
-        # Active users
-        (isinstance(metrics.get('active_users'), int), 
-         "active_users must be integer"),
-        (metrics.get('active_users', -1) >= 0, 
-         "active_users must be >= 0"),
-        
-        # Security score
-        (isinstance(metrics.get('security_score'), (int, float)), 
-         "security_score must be numeric"),
-        (0 <= metrics.get('security_score', -1) <= 10, 
-         "security_score must be between 0 and 10"),
-        
-        # API ID
-        (isinstance(metrics.get('api_id'), str) and len(metrics.get('api_id', '')) > 0, 
-         "api_id must be non-empty string")
-    ]
-    
-    # Vérification de chaque validation
-    for is_valid, error_message in validations:
-        if not is_valid:
-            raise HTTPException(
-                status_code=400,
-                detail={
-                    "error": "Invalid data format",
-                    "message": error_message,
-                    "received_data": metrics,
-                    "timestamp": get_current_timestamp()
-                }
-            )
-    
-    return True
 
-# =============================================================================
-# INSTANCES GLOBALES
-# =============================================================================
 
-badge_engine = BadgeCalculationEngine()
-commission_calc = CommissionCalculator()
+# Écart relatif max entre DecayedAggregates et _calculate_weighted_averages
+# sur le même historique complet (400 points, valeurs des bornes de validation)
+AGGREGATE_TOLERANCE = 1e-12
+
+
+class DecayedAggregates:
+    """
+    Moyennes pondérées décroissantes incrémentales par API
+    sums[k] = somme decay**i * h_i[k] et weight = somme decay**i, h_0 étant
+    le point le plus récent : un nouveau point met l'état à jour en O(1)
+    (sums = point + decay * sums). (courant + sums) / (1 + weight) vaut
+    _calculate_weighted_averages sur l'historique complet à AGGREGATE_TOLERANCE
+    près en relatif (ordre des additions flottantes différent).
+    État reconstruit paresseusement depuis MetricsStore au premier accès ;
+    une API sans historique stocké n'occupe une ligne qu'à son premier point.
+    L'état précédant le dernier point est conservé (before_last) pour
+    réévaluer ce point contre l'historique qui le précède.
+    """
+
+    def __init__(self, store: MetricsStore, decay: float = 0.95, capacity: int = 1024):
+        self.store = store
+        self.decay = decay
+        self._rows = {}
+        self._sums = np.zeros((capacity, len(WEIGHTED_FIELDS)))
+        self._weights = np.zeros(capacity)
+        self._prev_sums = np.zeros((capacity, len(WEIGHTED_FIELDS)))
+        self._prev_weights = np.zeros(capacity)
+        self._lock = threading.RLock()
+        self.updates = 0
+
+    def _row(self, api_id: str, create: bool = False):
+        """Ligne de l'API (rejeu du stockage) ; None sans historique stocké si create=False"""
+        row = self._rows.get(api_id)
+        if row is not None:
+            return row
+        if not create and not self.store.has_history(api_id):
+            return None
+
+        row = len(self._rows)
+        if row == len(self._weights):
+            self._sums = np.concatenate([self._sums, np.zeros_like(self._sums)])
+            self._weights = np.concatenate([self._weights, np.zeros_like(self._weights)])
+            self._prev_sums = np.concatenate([self._prev_sums, np.zeros_like(self._prev_sums)])
+            self._prev_weights = np.concatenate([self._prev_weights, np.zeros_like(self._prev_weights)])
+        self._rows[api_id] = row
+
+        # Rejeu chronologique de l'historique stocké
+        sums = [0.0] * len(WEIGHTED_FIELDS)
+        weight = 0.0
+        prev_sums, prev_weight = sums, weight
+        decay = self.decay
+        for point in self.store.read_range(api_id, -np.inf, np.inf).tolist():
+            # tolist() -> (timestamp, uptime, response_time, error_rate, security, ...)
+            prev_sums, prev_weight = list(sums), weight
+            for k in range(len(WEIGHTED_FIELDS)):
+                sums[k] = point[k + 1] + decay * sums[k]
+            weight = 1.0 + decay * weight
+        self._sums[row] = sums
+        self._weights[row] = weight
+        self._prev_sums[row] = prev_sums
+        self._prev_weights[row] = prev_weight
+        return row
+
+    def load(self, api_id: str):
+        """Ligne créée (historique stocké rejoué) avant l'écriture d'un nouveau point"""
+        with self._lock:
+            self._row(api_id, create=True)
+
+    def update(self, api_id: str, sample: dict):
+        """Prise en compte d'un nouveau point en temps constant"""
+        with self._lock:
+            row = self._row(api_id, create=True)
+            self._prev_sums[row] = self._sums[row]
+            self._prev_weights[row] = self._weights[row]
+            sums = self._sums[row]
+            sums *= self.decay
+            sums += [float(sample[key]) for key in WEIGHTED_FIELDS]
+            self._weights[row] = 1.0 + self.decay * self._weights[row]
+            self.updates += 1
+
+    def get(self, api_id: str):
+        """(sommes pondérées, poids total) pour calculate_badges"""
+        with self._lock:
+            row = self._row(api_id)
+            if row is None:
+                return [0.0] * len(WEIGHTED_FIELDS), 0.0
+            return self._sums[row].tolist(), float(self._weights[row])
+
+    def gather(self, api_ids: list, before_last: bool = False):
+        """États d'un lot : sommes [n x 4], poids [n] (sans le dernier point si before_last ; zéros sans historique)"""
+        with self._lock:
+            rows = np.fromiter((self._row(api_id) if api_id in self._rows or self.store.has_history(api_id) else -1
+                                for api_id in api_ids), dtype=np.int64, count=len(api_ids))
+            sums, weights = (self._prev_sums, self._prev_weights) if before_last else (self._sums, self._weights)
+            known = rows >= 0
+            if known.all():
+                return sums[rows], weights[rows]
+            gathered_sums = np.zeros((len(rows), len(WEIGHTED_FIELDS)))
+            gathered_weights = np.zeros(len(rows))
+            gathered_sums[known] = sums[rows[known]]
+            gathered_weights[known] = weights[rows[known]]
+            return gathered_sums, gathered_weights
+
+
+def record_metrics(api_id: str, samples: list):
+    """
+    Ingestion : stockage d'abord (un échec n'altère pas les agrégats), puis
+    agrégats incrémentaux, croissance, invalidation cache
+    Ligne d'agrégat rejouée avant l'écriture : les nouveaux points ne sont comptés qu'une fois
+    """
+    aggregates.load(api_id)
+    metrics_store.append_many(api_id, samples)
+    for sample in samples:
+        aggregates.update(api_id, sample)
+    growth_tracker.add_many(api_id, samples)
+    badge_cache.invalidate(api_id)
+
+
+def sample_timestamp(sample: dict):
+    """Timestamp epoch d'un échantillon (ISO, numérique, ou maintenant) ; entier hors float -> inf"""
+    value = sample.get('timestamp')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return float(value)
+        except OverflowError:
+            return math.inf
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+    return time.time()
 
 # =============================================================================
-# ENDPOINTS API
+# SKETCHES DE LATENCE (quantiles fusionnables, type DDSketch)
 # =============================================================================
 
-@app.get("/")
-def root():
-    """Health check"""
-    return {
-        "service": "API Performance Badges Engine",
-        "status": "operational", 
-        "version": "1.0.1",  # Version corrigée
-        "dependencies": "FastAPI only",
-        "timestamp": get_current_timestamp(),
-        "fixes_applied": ["input_validation", "error_handling"]
-    }
+# Erreur relative des quantiles, buckets max par sketch
+SKETCH_ALPHA = float(os.environ.get("BADGES_SKETCH_ALPHA", "0.01"))
+SKETCH_MAX_BINS = int(os.environ.get("BADGES_SKETCH_MAX_BINS", "1024"))
+# Fenêtres par API : durée (secondes) et nombre conservé
+SKETCH_WINDOW_SECONDS = float(os.environ.get("BADGES_SKETCH_WINDOW", "3600"))
+SKETCH_WINDOWS = int(os.environ.get("BADGES_SKETCH_WINDOWS", "24"))
+# Latences (ms) en dessous : comptées comme nulles
+SKETCH_MIN_VALUE = 1e-3
+# Échantillons max par appel d'ingestion
+SKETCH_MAX_SAMPLES = 100000
 
-@app.post("/calculate-badges")
-def calculate_api_badges(metrics: dict):
+
+class LatencySketch:
     """
-    🔧 ENDPOINT PRINCIPAL CORRIGÉ pour Nokia
-    Input: Métriques API
-    Output: Badges + Commission info
+    Sketch de quantiles à erreur relative bornée (DDSketch)
+    Une latence x tombe dans le bucket ceil(log_gamma(x)), gamma = (1+α)/(1-α) :
+    chaque quantile est restitué à α près en relatif. Au-delà de max_bins,
+    les buckets les plus bas sont regroupés (la queue haute reste à α près).
+    Fusion = somme des compteurs par bucket : exacte, associative et
+    commutative (fenêtres, shards, workers).
     """
-    try:
-        # 🔧 VALIDATION COMPLÈTE DES DONNÉES (NOUVEAU)
-        validate_metrics_data(metrics)
+
+    __slots__ = ('alpha', 'max_bins', '_log_gamma', 'bins', 'zero_count', 'count', 'total', 'min', 'max')
+
+    def __init__(self, alpha: float = SKETCH_ALPHA, max_bins: int = SKETCH_MAX_BINS):
+        if not 0 < alpha < 1:
+            raise ValueError("alpha must be between 0 and 1")
+        if max_bins < 1:
+            raise ValueError("max_bins must be positive")
+        self.alpha = alpha
+        self.max_bins = max_bins
+        self._log_gamma = math.log((1 + alpha) / (1 - alpha))
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add_many(self, values):
+        """Ajout vectorisé de latences (ms, finies et >= 0)"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+        if not np.all(np.isfinite(values)) or values.min() < 0:
+            raise ValueError("latency samples must be finite numbers >= 0")
+        zeros = values < SKETCH_MIN_VALUE
+        indexes = np.ceil(np.log(values[~zeros]) / self._log_gamma).astype(np.int64)
+        keys, counts = np.unique(indexes, return_counts=True)
+        bins = self.bins
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            bins[key] = bins.get(key, 0) + count
+        self.zero_count += int(zeros.sum())
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._collapse()
+
+    def add(self, value: float):
+        self.add_many((value,))
+
+    def _collapse(self):
+        """Regroupement des buckets les plus bas au-delà de max_bins"""
+        excess = len(self.bins) - self.max_bins
+        if excess > 0:
+            keys = sorted(self.bins)
+            self.bins[keys[excess]] += sum(self.bins.pop(key) for key in keys[:excess])
+
+    def merge(self, other: 'LatencySketch'):
+        """Fusion en place (même alpha requis)"""
+        if other.alpha != self.alpha:
+            raise ValueError(f"cannot merge sketches with alpha {other.alpha} and {self.alpha}")
+        bins = self.bins
+        for key, count in other.bins.items():
+            bins[key] = bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._collapse()
+        return self
+
+    def _value(self, key: int):
+        """Point milieu du bucket (gamma^(k-1), gamma^k] : erreur relative <= alpha"""
+        return 2.0 * math.exp(key * self._log_gamma) / (math.exp(self._log_gamma) + 1.0)
+
+    def quantiles(self, qs):
+        """Quantiles croissants (0..1) en un parcours des buckets ; None si vide"""
+        if self.count == 0:
+            return [None] * len(qs)
+        keys = sorted(self.bins)
+        results = []
+        position = 0
+        running = self.zero_count
+        for q in qs:
+            rank = q * (self.count - 1)
+            if rank < self.zero_count:
+                results.append(0.0)
+                continue
+            while running <= rank and position < len(keys):
+                running += self.bins[keys[position]]
+                position += 1
+            # Borné par les extrêmes observés
+            value = self._value(keys[max(position - 1, 0)])
+            results.append(min(max(value, self.min), self.max))
+        return results
+
+    def quantile(self, q: float):
+        return self.quantiles((q,))[0]
+
+    def to_dict(self):
+        """Forme sérialisable (JSON), fusionnable avec from_dict"""
+        return {
+            "alpha": self.alpha,
+            "count": self.count,
+            "zero_count": self.zero_count,
+            "sum": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "bins": [[key, self.bins[key]] for key in sorted(self.bins)]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, max_bins: int = SKETCH_MAX_BINS):
+        """Sketch sérialisé (autre shard / worker / agent) ; ValueError si incohérent"""
+        if not isinstance(data, dict):
+            raise ValueError("sketch must be an object")
+        alpha = data.get('alpha', SKETCH_ALPHA)
+        bins = data.get('bins', [])
+        zero_count = data.get('zero_count', 0)
+        if isinstance(alpha, bool) or not isinstance(alpha, (int, float)):
+            raise ValueError("sketch alpha must be a number")
+        if not isinstance(zero_count, int) or isinstance(zero_count, bool) or zero_count < 0:
+            raise ValueError("sketch zero_count must be a non-negative integer")
+        if not isinstance(bins, list):
+            raise ValueError("sketch bins must be a list of [index, count]")
+        sketch = cls(float(alpha), max_bins)
+        for entry in bins:
+            if (not isinstance(entry, list) or len(entry) != 2
+                    or not all(isinstance(v, int) and not isinstance(v, bool) for v in entry) or entry[1] < 0):
+                raise ValueError("sketch bins must be a list of [index, count]")
+            if entry[1]:
+                sketch.bins[entry[0]] = sketch.bins.get(entry[0], 0) + entry[1]
+        sketch.zero_count = zero_count
+        sketch.count = zero_count + sum(sketch.bins.values())
+        if sketch.count:
+            sketch.min = _finite_or(data.get('min'), 0.0 if zero_count else sketch._value(min(sketch.bins)))
+            sketch.max = _finite_or(data.get('max'), sketch._value(max(sketch.bins)) if sketch.bins else 0.0)
+            sketch.total = _finite_or(data.get('sum'), 0.0)
+        sketch._collapse()
+        return sketch
+
+    def copy(self):
+        sketch = LatencySketch(self.alpha, self.max_bins)
+        return sketch.merge(self)
+
+
+def _finite_or(value, default: float):
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        return float(value)
+    return default
+
+
+class LatencySketchStore:
+    """
+    Sketches de latence par API et par fenêtre de temps
+    - fenêtres alignées de window_seconds, les windows plus récentes
+      conservées : mémoire par API bornée (windows x max_bins buckets)
+      quel que soit le nombre d'échantillons
+    - quantiles de queue = fusion des fenêtres conservées, mise en cache par
+      API jusqu'au prochain ajout ou au changement de fenêtre courante
+    """
+
+    def __init__(self, window_seconds: float = SKETCH_WINDOW_SECONDS, windows: int = SKETCH_WINDOWS,
+                 alpha: float = SKETCH_ALPHA, max_bins: int = SKETCH_MAX_BINS):
+        self.window_seconds = window_seconds
+        self.windows = windows
+        self.alpha = alpha
+        self.max_bins = max_bins
+        self._apis = {}
+        self._tails = {}
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.merges = 0
+
+    def _window(self, timestamp: float):
+        return math.floor(timestamp / self.window_seconds) * self.window_seconds
+
+    def _horizon(self, now: float = None):
+        """Début de la plus ancienne fenêtre conservée"""
+        return self._window(time.time() if now is None else now) - (self.windows - 1) * self.window_seconds
+
+    def _expire(self, windows: dict, horizon: float):
+        for start in [start for start in windows if start < horizon]:
+            del windows[start]
+
+    def merge_sketch(self, api_id: str, sketch: LatencySketch, timestamp: float = None):
+        """Fusion d'un sketch dans la fenêtre de timestamp ; False si hors rétention"""
+        if sketch.alpha != self.alpha:
+            raise ValueError(f"sketch alpha must be {self.alpha}")
+        start = self._window(time.time() if timestamp is None else timestamp)
+        with self._lock:
+            horizon = self._horizon()
+            if start < horizon:
+                return False
+            windows = self._apis.setdefault(api_id, {})
+            window = windows.get(start)
+            if window is None:
+                window = windows[start] = LatencySketch(self.alpha, self.max_bins)
+            window.merge(sketch)
+            self._expire(windows, horizon)
+            self._tails.pop(api_id, None)
+            self.samples += sketch.count
+            self.merges += 1
+            return True
+
+    def add_samples(self, api_id: str, values, timestamp: float = None):
+        """Latences brutes (ms) -> fenêtre de timestamp"""
+        sketch = LatencySketch(self.alpha, self.max_bins)
+        sketch.add_many(values)
+        return self.merge_sketch(api_id, sketch, timestamp) if sketch.count else False
+
+    def merged(self, api_id: str):
+        """Fusion des fenêtres conservées (None sans échantillon)"""
+        with self._lock:
+            windows = self._apis.get(api_id)
+            if not windows:
+                return None
+            self._expire(windows, self._horizon())
+            merged = LatencySketch(self.alpha, self.max_bins)
+            for window in windows.values():
+                merged.merge(window)
+            return merged if merged.count else None
+
+    def tail_values(self, api_id: str):
+        """Quantiles TAIL_FIELDS (ms) sur la rétention ; MISSING_TAILS sans échantillon"""
+        horizon = self._horizon()
+        cached = self._tails.get(api_id)
+        if cached is not None and cached[0] == horizon:
+            return cached[1]
+        merged = self.merged(api_id)
+        values = tuple(merged.quantiles(tuple(TAIL_QUANTILES.values()))) if merged is not None else MISSING_TAILS
+        with self._lock:
+            self._tails[api_id] = (horizon, values)
+        return values
+
+    def gather(self, api_ids: list):
+        """Latences de queue d'un lot [n x len(TAIL_FIELDS)]"""
+        values = np.empty((len(api_ids), len(TAIL_FIELDS)))
+        for row, api_id in enumerate(api_ids):
+            values[row] = self.tail_values(api_id)
+        return values
+
+    def api_ids(self):
+        with self._lock:
+            return list(self._apis)
+
+    def windows_of(self, api_id: str):
+        """[(début de fenêtre, sketch)] chronologiques"""
+        with self._lock:
+            windows = self._apis.get(api_id, {})
+            self._expire(windows, self._horizon())
+            return [(start, windows[start].copy()) for start in sorted(windows)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "apis": len(self._apis),
+                "windows": sum(len(windows) for windows in self._apis.values()),
+                "bins": sum(len(sketch.bins) for windows in self._apis.values() for sketch in windows.values()),
+                "samples_total": self.samples,
+                "merges_total": self.merges,
+                "alpha": self.alpha,
+                "max_bins": self.max_bins,
+                "window_seconds": self.window_seconds,
+                "windows_per_api": self.windows
+            }
+
+    def save(self, path: str):
+        """Écriture atomique (fichier temporaire + os.replace)"""
+        with self._lock:
+            state = {
+                api_id: {repr(start): sketch.to_dict() for start, sketch in windows.items()}
+                for api_id, windows in self._apis.items()
+            }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        """Rechargement au démarrage ; fenêtres expirées ou alpha différent ignorés"""
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        loaded = 0
+        for api_id, windows in state.items():
+            for start, data in windows.items():
+                try:
+                    sketch = LatencySketch.from_dict(data, self.max_bins)
+                    loaded += self.merge_sketch(api_id, sketch, float(start))
+                except ValueError:
+                    continue
+        return loaded
+
+
+# =============================================================================
+# ROLLUPS DE DISPONIBILITÉ (minute -> heure -> jour, anneaux de taille fixe)
+# =============================================================================
+
+# Niveaux : (nom, durée d'un bucket en secondes, buckets conservés par API)
+ROLLUP_LEVELS = (
+    ('minute', 60, int(os.environ.get("BADGES_ROLLUP_MINUTES", "60"))),
+    ('hour', 3600, int(os.environ.get("BADGES_ROLLUP_HOURS", "48"))),
+    ('day', 86400, int(os.environ.get("BADGES_ROLLUP_DAYS", "190"))),
+)
+# Compteurs d'un bucket
+ROLLUP_COUNTERS = ('total', 'available', 'errors', 'incident_minutes')
+# Libération des APIs sans observation au plus une fois par intervalle (secondes)
+ROLLUP_PRUNE_INTERVAL = 3600.0
+# Observations max par appel d'ingestion
+ROLLUP_MAX_OBSERVATIONS = 10000
+# Avance max d'un timestamp sur l'horloge locale (secondes) : un bucket futur
+# remettrait à zéro les cases courantes et masquerait les vraies observations
+ROLLUP_MAX_SKEW = float(os.environ.get("BADGES_ROLLUP_MAX_SKEW", "300"))
+# Compteur max par observation : les sommes des buckets restent loin de la limite int64
+ROLLUP_MAX_COUNT = 2 ** 40
+
+
+class UptimeRollups:
+    """
+    Disponibilité par API en buckets minute / heure / jour
+    - un anneau de taille fixe par niveau : bucket = epoch // durée,
+      case = bucket % taille ; un bucket plus récent remet la case à zéro,
+      les buckets expirés sont libérés sans balayage
+    - chaque observation alimente les trois niveaux ; une minute qui passe
+      en indisponibilité compte une minute d'incident dans son heure et son jour
+    - fenêtre (30 j, 180 j...) = somme des buckets du niveau le plus grossier
+      qui la couvre : coût borné par la taille de l'anneau, jamais par le
+      nombre d'observations
+    - APIs sans observation dans toute la rétention libérées (prune),
+      lignes réutilisées
+    """
+
+    def __init__(self, levels: tuple = ROLLUP_LEVELS, capacity: int = 256):
+        self.levels = levels
+        self._rows = {}
+        self._free = []
+        self._capacity = capacity
+        self._counts = [np.zeros((capacity, size, len(ROLLUP_COUNTERS)), dtype=np.int64) for _, _, size in levels]
+        self._buckets = [np.full((capacity, size), -1, dtype=np.int64) for _, _, size in levels]
+        self._lock = threading.Lock()
+        self._pruned_at = time.time()
+        self.observations = 0
+        self.expired_buckets = 0
+        self.pruned_apis = 0
+
+    def _row(self, api_id: str):
+        row = self._rows.get(api_id)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = len(self._rows)
+            self._reserve(row + 1)
+        self._rows[api_id] = row
+        return row
+
+    def _reserve(self, rows: int):
+        """Capacité >= rows (par doublements) : une seule copie pour un rechargement complet"""
+        capacity = self._capacity
+        while capacity < rows:
+            capacity *= 2
+        if capacity == self._capacity:
+            return
+        extra = capacity - self._capacity
+        self._counts = [np.concatenate([counts, np.zeros((extra,) + counts.shape[1:], dtype=counts.dtype)])
+                        for counts in self._counts]
+        self._buckets = [np.concatenate([buckets, np.full((extra,) + buckets.shape[1:], -1, dtype=buckets.dtype)])
+                         for buckets in self._buckets]
+        self._capacity = capacity
+
+    def accepts(self, timestamp: float, now: float = None):
+        """Timestamp fini, dans la rétention de l'anneau le plus long et au plus ROLLUP_MAX_SKEW dans le futur"""
+        now = time.time() if now is None else now
+        _, width, size = self.levels[-1]
+        return math.isfinite(timestamp) and now - width * size < timestamp <= now + ROLLUP_MAX_SKEW
+
+    def add(self, api_id: str, total: int, available: int, errors: int, timestamp: float = None):
+        """Observation agrégée (sondes, moniteur externe) à timestamp ; False si timestamp refusé (accepts)"""
+        now = time.time()
+        timestamp = now if timestamp is None else timestamp
+        if not self.accepts(timestamp, now):
+            return False
+        with self._lock:
+            row = self._row(api_id)
+            new_incident = available < total
+            for level, (_, width, size) in enumerate(self.levels):
+                bucket = int(timestamp // width)
+                slot = bucket % size
+                current = self._buckets[level][row, slot]
+                if current != bucket:
+                    if current > bucket:
+                        # Case déjà réutilisée par un bucket plus récent
+                        continue
+                    if current >= 0:
+                        self.expired_buckets += 1
+                    self._buckets[level][row, slot] = bucket
+                    self._counts[level][row, slot] = 0
+                counts = self._counts[level][row, slot]
+                # Minute hors anneau (donnée tardive) : chaque échec compte une minute
+                if level == 0:
+                    # Minute déjà en incident : pas de double comptage plus haut
+                    new_incident = new_incident and counts[3] == 0
+                    counts[3] |= available < total
+                else:
+                    counts[3] += new_incident
+                counts[0] += total
+                counts[1] += available
+                counts[2] += errors
+            self.observations += 1
+        if now - self._pruned_at >= ROLLUP_PRUNE_INTERVAL:
+            self.prune(now)
+        return True
+
+    def _level_for(self, seconds: float):
+        """Niveau le plus grossier dont l'anneau couvre la fenêtre -> (niveau, buckets)"""
+        for level in range(len(self.levels) - 1, -1, -1):
+            _, width, size = self.levels[level]
+            count = math.ceil(seconds / width)
+            if seconds >= width and count <= size:
+                return level, count
+        return 0, min(math.ceil(seconds / self.levels[0][1]), self.levels[0][2])
+
+    def window_counts(self, rows, seconds: float, now: float = None):
+        """Compteurs ROLLUP_COUNTERS des lignes sur la fenêtre [n x 4] (buckets alignés, courant inclus)"""
+        now = time.time() if now is None else now
+        level, count = self._level_for(seconds)
+        current = int(now // self.levels[level][1])
+        buckets = self._buckets[level][rows]
+        mask = (buckets > current - count) & (buckets <= current)
+        return (self._counts[level][rows] * mask[..., None]).sum(axis=1)
+
+    def gather(self, api_ids: list, now: float = None):
+        """Valeurs ROLLUP_FIELDS d'un lot [n x len(ROLLUP_FIELDS)] ; MISSING_ROLLUPS sans observation"""
+        values = np.tile(np.array(MISSING_ROLLUPS), (len(api_ids), 1))
+        with self._lock:
+            positions = [i for i, api_id in enumerate(api_ids) if api_id in self._rows]
+            if not positions:
+                return values
+            rows = np.array([self._rows[api_ids[i]] for i in positions], dtype=np.int64)
+            windows = {}
+            for k, (measure, seconds) in enumerate(ROLLUP_WINDOWS.values()):
+                if seconds not in windows:
+                    windows[seconds] = self.window_counts(rows, seconds, now)
+                counts = windows[seconds]
+                total = counts[:, 0]
+                observed = total > 0
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    if measure == 'uptime':
+                        column = counts[:, 1] / total * 100
+                    elif measure == 'error_rate':
+                        column = counts[:, 2] / total * 100
+                    else:
+                        column = counts[:, 3].astype(np.float64)
+                values[positions, k] = np.where(observed, column, MISSING_ROLLUPS[k])
+        return values
+
+    def api_ids(self):
+        with self._lock:
+            return list(self._rows)
+
+    def window_values(self, api_id: str):
+        """Valeurs ROLLUP_FIELDS de l'API (mêmes opérations que gather)"""
+        return tuple(self.gather([api_id])[0].tolist())
+
+    def summary(self, api_id: str, seconds: float, now: float = None):
+        """Compteurs + uptime / error_rate d'une fenêtre, None si API inconnue"""
+        with self._lock:
+            row = self._rows.get(api_id)
+            if row is None:
+                return None
+            counts = self.window_counts(np.array([row]), seconds, now)[0].tolist()
+        result = dict(zip(ROLLUP_COUNTERS, counts))
+        total = result['total']
+        result['uptime_percentage'] = round(result['available'] / total * 100, 4) if total else None
+        result['error_rate'] = round(result['errors'] / total * 100, 4) if total else None
+        return result
+
+    def buckets(self, api_id: str, level_name: str, now: float = None):
+        """Buckets conservés d'un niveau, chronologiques : [{start, compteurs...}]"""
+        names = [name for name, _, _ in self.levels]
+        if level_name not in names:
+            raise ValueError(f"level must be one of {names}")
+        level = names.index(level_name)
+        _, width, size = self.levels[level]
+        current = int((time.time() if now is None else now) // width)
+        with self._lock:
+            row = self._rows.get(api_id)
+            if row is None:
+                return []
+            buckets = self._buckets[level][row]
+            counts = self._counts[level][row]
+            slots = np.flatnonzero((buckets > current - size) & (buckets <= current))
+            slots = slots[np.argsort(buckets[slots])]
+            return [
+                dict(start=int(buckets[slot]) * width, **dict(zip(ROLLUP_COUNTERS, counts[slot].tolist())))
+                for slot in slots.tolist()
+            ]
+
+    def prune(self, now: float = None):
+        """Libère les APIs dont tous les buckets du niveau le plus long ont expiré"""
+        now = time.time() if now is None else now
+        _, width, size = self.levels[-1]
+        current = int(now // width)
+        with self._lock:
+            self._pruned_at = now
+            stale = [
+                api_id for api_id, row in self._rows.items()
+                if self._buckets[-1][row].max() <= current - size
+            ]
+            for api_id in stale:
+                row = self._rows.pop(api_id)
+                for counts, buckets in zip(self._counts, self._buckets):
+                    counts[row] = 0
+                    buckets[row] = -1
+                self._free.append(row)
+            self.pruned_apis += len(stale)
+            return len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "apis": len(self._rows),
+                "observations_total": self.observations,
+                "expired_buckets_total": self.expired_buckets,
+                "pruned_apis_total": self.pruned_apis,
+                "levels": {name: {"bucket_seconds": width, "buckets": size} for name, width, size in self.levels},
+                "memory_bytes": sum(array.nbytes for array in self._counts + self._buckets)
+            }
+
+    def save(self, path: str):
+        """Écriture atomique des lignes utilisées (fichier temporaire + os.replace)"""
+        with self._lock:
+            api_ids = list(self._rows)
+            rows = np.array([self._rows[api_id] for api_id in api_ids], dtype=np.int64)
+            arrays = {f"counts_{name}": counts[rows] for (name, _, _), counts in zip(self.levels, self._counts)}
+            arrays.update({f"buckets_{name}": buckets[rows] for (name, _, _), buckets in zip(self.levels, self._buckets)})
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, api_ids=np.array(api_ids, dtype=str),
+                     levels=np.array([(width, size) for _, width, size in self.levels]), **arrays)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        """Rechargement au démarrage ; ignoré si les niveaux ont changé"""
+        try:
+            with np.load(path) as data:
+                if data['levels'].tolist() != [[width, size] for _, width, size in self.levels]:
+                    return 0
+                api_ids = data['api_ids'].tolist()
+                # Un accès data[...] relit le tableau entier : chaque tableau lu une fois
+                with self._lock:
+                    self._reserve(len(self._rows) + len(api_ids))
+                    rows = np.array([self._row(api_id) for api_id in api_ids], dtype=np.int64)
+                    if len(rows):
+                        for level, (name, _, _) in enumerate(self.levels):
+                            self._counts[level][rows] = data[f"counts_{name}"]
+                            self._buckets[level][rows] = data[f"buckets_{name}"]
+                return len(api_ids)
+        except (OSError, ValueError, KeyError):
+            return 0
+
+
+def _is_count(value):
+    """Compteur d'observations : entier entre 0 et ROLLUP_MAX_COUNT (bool exclu)"""
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= ROLLUP_MAX_COUNT
+
+
+# =============================================================================
+# RANGS RELATIFS (top X % du catalogue, arbres de Fenwick sur buckets de valeurs)
+# =============================================================================
+
+# Bornes des buckets : 0 et ±RANK_MIN_VALUE * RANK_GAMMA**k jusqu'à RANK_MAX_VALUE
+# (1 % d'écart relatif ; valeurs d'un même bucket classées ex aequo)
+RANK_GAMMA = 1.01
+RANK_MIN_VALUE = 1e-3
+RANK_MAX_VALUE = 1e13
+_rank_positive_edges = RANK_MIN_VALUE * RANK_GAMMA ** np.arange(
+    math.ceil(math.log(RANK_MAX_VALUE / RANK_MIN_VALUE) / math.log(RANK_GAMMA)) + 1
+)
+RANK_EDGES = np.concatenate([-_rank_positive_edges[::-1], [0.0], _rank_positive_edges])
+RANK_EDGE_LIST = RANK_EDGES.tolist()
+RANK_BINS = len(RANK_EDGES) + 1
+# En dessous de cette population, aucun rang n'est attribué (100 %)
+RANK_MIN_POPULATION = int(os.environ.get("BADGES_RANK_MIN_POPULATION", "20"))
+# Au-delà de ce nombre de changements, arbre reconstruit en bloc plutôt que point par point
+RANK_BATCH_REBUILD = 64
+
+
+def rank_percent(greater: int, size: int):
+    """APIs strictement devant + soi-même, en % de la population (mêmes opérations partout)"""
+    if size < RANK_MIN_POPULATION:
+        return 100.0
+    return min(100.0, 100.0 * (greater + 1) / size)
+
+
+def rank_percent_many(greater, size):
+    """Équivalent vectorisé de rank_percent (size scalaire ou par valeur)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent = np.minimum(100.0, 100.0 * (greater + 1) / size)
+    return np.where(np.asarray(size) < RANK_MIN_POPULATION, 100.0, percent)
+
+
+def rank_excluding_own(greater, size: int, position, own):
+    """
+    Entrée de l'API évaluée retirée de la population (own : son bucket, -1 si
+    absente), puis l'API comptée une fois pour la valeur évaluée
+    Retourne (APIs strictement devant, taille de la population)
+    """
+    present = own >= 0
+    return greater - (present & (own > position)), size - present + 1
+
+
+class RankIndex:
+    """
+    Population d'une métrique : bucket courant de chaque API + effectifs par bucket
+    - arbre de Fenwick sur les effectifs : mise à jour et rang en O(log B)
+    - gros lots : effectifs mis à jour en bloc, arbre reconstruit en O(B)
+    - rang d'une valeur : APIs dans un bucket strictement supérieur
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._bins = np.full(capacity, -1, dtype=np.int64)
+        self.counts = np.zeros(RANK_BINS, dtype=np.int64)
+        self._tree = [0] * (RANK_BINS + 1)
+        self.size = 0
+        self.updates = 0
+
+    def _row(self, api_id: str):
+        row = self._rows.get(api_id)
+        if row is None:
+            row = self._rows[api_id] = len(self._rows)
+            if row == len(self._bins):
+                self._bins = np.concatenate([self._bins, np.full(len(self._bins), -1, dtype=np.int64)])
+        return row
+
+    def _add(self, position: int, delta: int):
+        tree = self._tree
+        position += 1
+        while position <= RANK_BINS:
+            tree[position] += delta
+            position += position & -position
+
+    def _prefix(self, position: int):
+        """Effectif des buckets 0..position"""
+        tree = self._tree
+        total = 0
+        position += 1
+        while position > 0:
+            total += tree[position]
+            position -= position & -position
+        return total
+
+    def _rebuild(self):
+        positions = np.arange(1, RANK_BINS + 1)
+        cumulative = np.concatenate([[0], np.cumsum(self.counts)])
+        self._tree = [0] + (cumulative[positions] - cumulative[positions - (positions & -positions)]).tolist()
+
+    def update_many(self, api_ids: list, values):
+        """Dernières valeurs des APIs (NaN = retirée de la population ; la dernière occurrence l'emporte)"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(set(api_ids)) != len(api_ids):
+            latest = dict(zip(api_ids, values.tolist()))
+            api_ids, values = list(latest), np.array(list(latest.values()), dtype=np.float64)
+        present = ~np.isnan(values)
+        new_bins = np.where(present, np.searchsorted(RANK_EDGES, np.where(present, values, 0.0), 'right'), -1)
+        with self._lock:
+            rows = np.fromiter((self._row(api_id) for api_id in api_ids), dtype=np.int64, count=len(api_ids))
+            old_bins = self._bins[rows]
+            self._bins[rows] = new_bins
+            changed = old_bins != new_bins
+            removed = old_bins[changed & (old_bins >= 0)]
+            added = new_bins[changed & (new_bins >= 0)]
+            np.subtract.at(self.counts, removed, 1)
+            np.add.at(self.counts, added, 1)
+            self.size += len(added) - len(removed)
+            if len(removed) + len(added) > RANK_BATCH_REBUILD:
+                self._rebuild()
+            else:
+                for position in removed.tolist():
+                    self._add(position, -1)
+                for position in added.tolist():
+                    self._add(position, 1)
+            self.updates += int(np.count_nonzero(changed))
+
+    def _own_bins(self, api_ids: list):
+        rows = np.fromiter((self._rows.get(api_id, -1) for api_id in api_ids), dtype=np.int64, count=len(api_ids))
+        return np.where(rows >= 0, self._bins[rows], -1)
+
+    def own_bins(self, api_ids: list):
+        """Bucket actuel de chaque API dans la population (-1 si absente)"""
+        with self._lock:
+            return self._own_bins(api_ids)
+
+    def top_percent(self, value, api_id: str = None):
+        """Position de value dans la population, en % depuis le haut (100 si NaN) ; entrée de api_id exclue"""
+        if value != value:
+            return 100.0
+        position = bisect.bisect_right(RANK_EDGE_LIST, value)
+        with self._lock:
+            greater, size = self.size - self._prefix(position), self.size
+            if api_id is not None:
+                row = self._rows.get(api_id)
+                own = int(self._bins[row]) if row is not None else -1
+                greater, size = rank_excluding_own(greater, size, position, own)
+            return rank_percent(int(greater), int(size))
+
+    def top_percent_many(self, values, api_ids: list = None):
+        frozen = self.frozen(api_ids)
+        return frozen.top_percent_many(values, frozen.own)
+
+    def frozen(self, api_ids: list = None):
+        """Effectifs cumulés (+ buckets des api_ids, pris sous le même verrou)"""
+        with self._lock:
+            own = self._own_bins(api_ids) if api_ids is not None else None
+            return FrozenRank(np.cumsum(self.counts), self.size, own)
+
+    def stats(self):
+        with self._lock:
+            return {"apis": self.size, "buckets_used": int(np.count_nonzero(self.counts)), "updates": self.updates}
+
+
+class FrozenRank:
+    """
+    Effectifs cumulés figés d'une population (workers, snapshot) : rang en O(1)
+    own : buckets actuels d'APIs (frozen(api_ids)), pour exclure leur propre entrée
+    """
+
+    def __init__(self, cumulative, size: int, own=None):
+        self.cumulative = cumulative
+        self.size = int(size)
+        self.own = own
+
+    def top_percent(self, value, own: int = None):
+        """own : bucket de l'API évaluée (-1 si absente) ; None : aucune entrée exclue"""
+        if value != value:
+            return 100.0
+        position = bisect.bisect_right(RANK_EDGE_LIST, value)
+        greater, size = self.size - int(self.cumulative[position]), self.size
+        if own is not None:
+            greater, size = rank_excluding_own(greater, size, position, own)
+        return rank_percent(int(greater), int(size))
+
+    def top_percent_many(self, values, own=None):
+        """own : buckets des APIs évaluées (-1 si absentes) ; None : aucune entrée exclue"""
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        positions = np.searchsorted(RANK_EDGES, np.where(missing, 0.0, values), 'right')
+        greater, size = self.size - self.cumulative[positions], self.size
+        if own is not None:
+            greater, size = rank_excluding_own(greater, size, positions, np.asarray(own))
+        percent = rank_percent_many(greater, size)
+        percent[missing] = 100.0
+        return percent
+
+
+class MetricRanks:
+    """
+    Un RankIndex par métrique classée (RANK_SPECS) : rank_source du moteur
+    active_users / total_requests alimentés par le catalogue (derniers
+    résultats), active_users_growth par GrowthTracker
+    """
+
+    def __init__(self):
+        self.indexes = {base: RankIndex() for base in RANK_SPECS.values()}
+
+    def update_many(self, base: str, api_ids: list, values):
+        self.indexes[base].update_many(api_ids, values)
+
+    def top_percent(self, base: str, value, api_id: str = None):
+        return self.indexes[base].top_percent(value, api_id)
+
+    def top_percent_many(self, base: str, values, api_ids: list = None):
+        return self.indexes[base].top_percent_many(values, api_ids)
+
+    @property
+    def version(self):
+        return sum(index.updates for index in self.indexes.values())
+
+    def frozen(self, api_ids: list = None):
+        """Copie figée picklable (workers, snapshot) : FrozenRanks, avec les buckets des api_ids"""
+        return FrozenRanks(
+            {base: index.frozen(api_ids) for base, index in self.indexes.items()},
+            ApiRows(api_ids) if api_ids is not None else None
+        )
+
+    def stats(self):
+        return {base: index.stats() for base, index in self.indexes.items()}
+
+
+class ApiRows:
+    """Lignes d'une liste d'api_ids (même interface rows que SnapshotTable)"""
+
+    def __init__(self, api_ids: list):
+        self._rows = {api_id: row for row, api_id in enumerate(api_ids)}
+
+    def rows(self, api_ids: list):
+        return np.fromiter((self._rows.get(api_id, -1) for api_id in api_ids), dtype=np.int64, count=len(api_ids))
+
+
+class FrozenRanks:
+    """
+    Rangs figés (même interface que MetricRanks en lecture)
+    rows : lignes des buckets FrozenRank.own (ApiRows, SnapshotTable) ; sans
+    rows, aucune entrée n'est exclue
+    """
+
+    def __init__(self, ranks: dict, rows=None):
+        self.ranks = ranks
+        self.rows = rows
+
+    def _own(self, base: str, api_ids: list):
+        if api_ids is None or self.rows is None:
+            return None
+        rows = self.rows.rows(api_ids)
+        return np.where(rows >= 0, self.ranks[base].own[rows], -1)
+
+    def frozen(self, api_ids: list = None):
+        """Sous-ensemble des buckets pour api_ids (fragment envoyé à un worker)"""
+        if api_ids is None:
+            return self
+        return FrozenRanks({
+            base: FrozenRank(rank.cumulative, rank.size, self._own(base, api_ids))
+            for base, rank in self.ranks.items()
+        }, ApiRows(api_ids) if self.rows is not None else None)
+
+    def top_percent(self, base: str, value, api_id: str = None):
+        own = self._own(base, [api_id] if api_id is not None else None)
+        return self.ranks[base].top_percent(value, int(own[0]) if own is not None else None)
+
+    def top_percent_many(self, base: str, values, api_ids: list = None):
+        return self.ranks[base].top_percent_many(values, self._own(base, api_ids))
+
+    def arrays(self):
+        """Tableaux pour le snapshot partagé (buckets des api_ids du snapshot si présents)"""
+        bases = list(RANK_SPECS.values())
+        arrays = {
+            'rank_cumulative': np.array([self.ranks[base].cumulative for base in bases], dtype=np.int64),
+            'rank_sizes': np.array([self.ranks[base].size for base in bases], dtype=np.int64)
+        }
+        if self.rows is not None:
+            arrays['rank_own'] = np.array([self.ranks[base].own for base in bases], dtype=np.int64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, rows=None):
+        """rows : lignes des api_ids du snapshot (SnapshotTable)"""
+        own = arrays.get('rank_own') if rows is not None else None
+        return cls({
+            base: FrozenRank(arrays['rank_cumulative'][k], arrays['rank_sizes'][k], own[k] if own is not None else None)
+            for k, base in enumerate(RANK_SPECS.values())
+        }, rows if own is not None else None)
+
+
+# Croissance : moyenne d'active_users du mois courant vs mois précédent (mois = 30 jours)
+GROWTH_MONTH_SECONDS = 30 * 86400
+GROWTH_PRUNE_INTERVAL = 3600.0
+
+
+class GrowthTracker:
+    """
+    Croissance mois sur mois d'active_users par API, en O(1) par point
+    - deux mois par API (précédent, courant) : sommes + nombre de points
+    - point d'un mois suivant : le courant devient le précédent ; après un
+      trou d'un mois ou plus, le précédent est vide (croissance inconnue)
+    - croissance = (moyenne courante - précédente) / max(précédente, 1) en %,
+      inconnue si le mois courant n'est ni ce mois-ci ni le précédent
+    - chaque changement est reporté dans le classement (ranks)
+    """
+
+    def __init__(self, ranks: MetricRanks = None, capacity: int = 256):
+        self.ranks = ranks
+        self._rows = {}
+        self._free = []
+        self._month = np.full(capacity, -1, dtype=np.int64)
+        self._sums = np.zeros((capacity, 2))
+        self._counts = np.zeros((capacity, 2), dtype=np.int64)
+        self._lock = threading.Lock()
+        self._pruned_at = time.time()
+        self.points = 0
+        self.pruned_apis = 0
+
+    def _row(self, api_id: str):
+        row = self._rows.get(api_id)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = len(self._rows)
+            if row == len(self._month):
+                self._month = np.concatenate([self._month, np.full_like(self._month, -1)])
+                self._sums = np.concatenate([self._sums, np.zeros_like(self._sums)])
+                self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+        self._rows[api_id] = row
+        return row
+
+    def _growth(self, rows, now: float):
+        """Croissance des lignes (NaN si inconnue)"""
+        current_month = int(now // GROWTH_MONTH_SECONDS)
+        sums = self._sums[rows]
+        counts = self._counts[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = sums / counts
+            growth = (means[:, 1] - means[:, 0]) / np.maximum(means[:, 0], 1.0) * 100
+        known = (counts[:, 0] > 0) & (counts[:, 1] > 0) & (self._month[rows] >= current_month - 1)
+        return np.where(known, growth, np.nan)
+
+    def add_many(self, api_id: str, samples: list):
+        """Points d'ingestion (active_users, timestamp)"""
+        now = time.time()
+        with self._lock:
+            row = self._row(api_id)
+            for sample in samples:
+                month = int(sample_timestamp(sample) // GROWTH_MONTH_SECONDS)
+                current = self._month[row]
+                if month > current:
+                    if month == current + 1:
+                        self._sums[row, 0] = self._sums[row, 1]
+                        self._counts[row, 0] = self._counts[row, 1]
+                    else:
+                        self._sums[row, 0] = 0.0
+                        self._counts[row, 0] = 0
+                    self._sums[row, 1] = 0.0
+                    self._counts[row, 1] = 0
+                    self._month[row] = current = month
+                slot = 1 if month == current else 0 if month == current - 1 else None
+                if slot is None:
+                    continue
+                self._sums[row, slot] += float(sample['active_users'])
+                self._counts[row, slot] += 1
+                self.points += 1
+            # Sous le verrou : classement mis à jour dans l'ordre des points
+            if self.ranks is not None:
+                self.ranks.update_many('active_users_growth', [api_id], self._growth(np.array([row]), now))
+        if now - self._pruned_at >= GROWTH_PRUNE_INTERVAL:
+            self.prune(now)
+
+    def gather(self, api_ids: list, now: float = None):
+        """Valeurs GROWTH_FIELDS d'un lot [n x 1]"""
+        values = np.tile(np.array(MISSING_GROWTH), (len(api_ids), 1))
+        with self._lock:
+            positions = [i for i, api_id in enumerate(api_ids) if api_id in self._rows]
+            if positions:
+                rows = np.array([self._rows[api_ids[i]] for i in positions], dtype=np.int64)
+                values[positions, 0] = self._growth(rows, time.time() if now is None else now)
+        return values
+
+    def growth_values(self, api_id: str):
+        return tuple(self.gather([api_id])[0].tolist())
+
+    def api_ids(self):
+        with self._lock:
+            return list(self._rows)
+
+    def prune(self, now: float = None):
+        """Libère les APIs sans point ce mois-ci ni le précédent (et les retire du classement)"""
+        now = time.time() if now is None else now
+        current_month = int(now // GROWTH_MONTH_SECONDS)
+        with self._lock:
+            self._pruned_at = now
+            stale = [api_id for api_id, row in self._rows.items() if self._month[row] < current_month - 1]
+            for api_id in stale:
+                row = self._rows.pop(api_id)
+                self._month[row] = -1
+                self._sums[row] = 0.0
+                self._counts[row] = 0
+                self._free.append(row)
+            self.pruned_apis += len(stale)
+            if stale and self.ranks is not None:
+                self.ranks.update_many('active_users_growth', stale, np.full(len(stale), np.nan))
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {"apis": len(self._rows), "points_total": self.points, "pruned_apis_total": self.pruned_apis}
+
+    def save(self, path: str):
+        """Écriture atomique (fichier temporaire + os.replace)"""
+        with self._lock:
+            api_ids = list(self._rows)
+            rows = np.array([self._rows[api_id] for api_id in api_ids], dtype=np.int64)
+            arrays = {'month': self._month[rows], 'sums': self._sums[rows], 'counts': self._counts[rows]}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, api_ids=np.array(api_ids, dtype=str), **arrays)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        """Rechargement au démarrage + classement de la croissance"""
+        try:
+            with np.load(path) as data:
+                api_ids = data['api_ids'].tolist()
+                with self._lock:
+                    rows = np.array([self._row(api_id) for api_id in api_ids], dtype=np.int64)
+                    if len(rows):
+                        self._month[rows] = data['month']
+                        self._sums[rows] = data['sums']
+                        self._counts[rows] = data['counts']
+                    if self.ranks is not None and api_ids:
+                        self.ranks.update_many('active_users_growth', api_ids, self._growth(rows, time.time()))
+        except (OSError, ValueError, KeyError):
+            return 0
+        return len(api_ids)
+
+
+class DerivedMetrics:
+    """Métriques dérivées par API (DERIVED_FIELDS) : sketches de latence, rollups de disponibilité, croissance"""
+
+    def __init__(self, tails: LatencySketchStore, rollups: UptimeRollups, growth: GrowthTracker):
+        self.tails = tails
+        self.rollups = rollups
+        self.growth = growth
+
+    def derived_values(self, api_id: str):
+        return self.tails.tail_values(api_id) + self.rollups.window_values(api_id) + self.growth.growth_values(api_id)
+
+    def gather(self, api_ids: list):
+        return np.hstack([self.tails.gather(api_ids), self.rollups.gather(api_ids), self.growth.gather(api_ids)])
+
+    def api_ids(self):
+        """APIs ayant au moins une métrique dérivée"""
+        return set(self.tails.api_ids()) | set(self.rollups.api_ids()) | set(self.growth.api_ids())
+
+
+# =============================================================================
+# FONCTIONS UTILITAIRES (Pure Python)
+# =============================================================================
+
+def get_current_timestamp():
+    """Timestamp actuel format ISO"""
+    return datetime.datetime.now().isoformat()
+
+def get_historical_metrics(api_id: str, depth: int = HISTORY_DEPTH):
+    """Historique réel depuis le stockage (plus récent en premier)"""
+    points = metrics_store.read_last(api_id, depth)
+    historical = []
+    for point in points[::-1]:
+        historical.append({
+            'uptime_percentage': float(point['uptime_percentage']),
+            'avg_response_time': float(point['avg_response_time']),
+            'error_rate': float(point['error_rate']),
+            'security_score': float(point['security_score']),
+            'timestamp': datetime.datetime.fromtimestamp(float(point['timestamp'])).isoformat()
+        })
+    
+    return historical
+
+def parse_metrics(metrics: dict):
+    """Validation + conversion en MetricsRecord"""
+    return MetricsRecord.from_dict(metrics)
+
+def validate_metrics_data(metrics: dict):
+    """🔧 Validation complète des données d'entrée (une passe, arrêt à la première erreur)"""
+    MetricsRecord.from_dict(metrics)
+    return True
+
+# =============================================================================
+# CACHE RÉSULTATS BADGES (LRU + TTL)
+# =============================================================================
+
+BADGE_CACHE_SIZE = int(os.environ.get("BADGES_CACHE_SIZE", "10000"))
+BADGE_CACHE_TTL = float(os.environ.get("BADGES_CACHE_TTL", "300"))
+
+
+def metrics_fingerprint(metrics: dict):
+    """Empreinte des métriques utilisées par le calcul"""
+    return tuple(metrics.get(field) for field in METRIC_FIELDS)
+
+
+class BadgeResultCache:
+    """
+    Cache borné des résultats /calculate-badges
+    Clé : (api_id, empreinte métriques, version des règles, version des
+    populations classées si le plan a des critères de rang)
+    - éviction LRU au-delà de max_entries, expiration après ttl secondes
+    - invalidation par API à l'ingestion de nouvelles métriques,
+      vidage complet au changement de version des règles
+    - génération par API (et époque globale) lue au lookup : un put calculé
+      avant une invalidation survenue entre-temps est abandonné
+    - générations bornées : oubliées au vidage, au-delà de max_entries APIs
+      et à la compaction, l'époque incrémentée rend leurs jetons périmés
+    """
+
+    def __init__(self, max_entries: int = BADGE_CACHE_SIZE, ttl: float = BADGE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.rules_version = None
+        self._entries = OrderedDict()
+        self._keys_by_api = {}
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def _key(self, metrics: dict, rules_version: int, ranks_version: int = None):
+        return (metrics['api_id'], metrics_fingerprint(metrics), rules_version, ranks_version)
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        keys = self._keys_by_api.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_api[key[0]]
+
+    def _check_rules(self, rules_version: int):
+        if rules_version != self.rules_version:
+            self._reset()
+            self.rules_version = rules_version
+
+    def _reset(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._keys_by_api.clear()
+        self._generations.clear()
+        self._epoch += 1
+
+    def _forget_generations(self):
+        """Générations remises à zéro sans toucher aux entrées (puts en cours abandonnés)"""
+        forgotten = len(self._generations)
+        self._generations.clear()
+        self._epoch += 1
+        return forgotten
+
+    def lookup(self, metrics: dict, rules_version: int, ranks_version: int = None):
+        """
+        ((badges, commission_info) ou None, jeton) ; le jeton (époque,
+        génération de l'API) est lu sous le même verrou et se repasse à put
+        ranks_version : entrées d'une population classée antérieure ignorées (LRU / TTL)
+        """
+        with self._lock:
+            self._check_rules(rules_version)
+            key = self._key(metrics, rules_version, ranks_version)
+            token = (self._epoch, self._generations.get(key[0], 0))
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, token
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None, token
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], token
+
+    def get(self, metrics: dict, rules_version: int, ranks_version: int = None):
+        """(badges, commission_info) ou None"""
+        return self.lookup(metrics, rules_version, ranks_version)[0]
+
+    def put(self, metrics: dict, rules_version: int, result: tuple, token: tuple = None,
+            ranks_version: int = None):
+        """
+        Stocke le résultat, sauf si l'API a été invalidée depuis le lookup (jeton)
+        ranks_version : celle lue avant le calcul (comme pour lookup)
+        """
+        with self._lock:
+            self._check_rules(rules_version)
+            key = self._key(metrics, rules_version, ranks_version)
+            if token is not None and token != (self._epoch, self._generations.get(key[0], 0)):
+                self.stale_puts += 1
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            self._keys_by_api.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        """Historique remplacé en bloc (nouveau snapshot) : toutes les entrées périmées"""
+        with self._lock:
+            self._reset()
+
+    def invalidate(self, api_id: str):
+        """Nouvelles métriques ingérées -> entrées de l'API périmées"""
+        with self._lock:
+            self._generations[api_id] = self._generations.get(api_id, 0) + 1
+            keys = self._keys_by_api.pop(api_id, None)
+            if keys:
+                for key in keys:
+                    self._entries.pop(key, None)
+                self.invalidations += len(keys)
+            # Une génération par API invalidée : bornée comme les entrées
+            if len(self._generations) > self.max_entries:
+                self._forget_generations()
+
+    def compact(self):
+        """Compaction du stockage : générations des APIs oubliées -> nombre retiré"""
+        with self._lock:
+            return self._forget_generations()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "rules_version": self.rules_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+                "generations": len(self._generations)
+            }
+
+# =============================================================================
+# COALESCENCE DES CALCULS IDENTIQUES (single-flight + dédoublonnage des lots)
+# =============================================================================
+
+def request_fingerprint(metrics: dict):
+    """
+    Clé d'une requête brute (avant validation) : champs reçus + api_id et
+    métriques typés (1 et 1.0 restent distincts) ; None si non hachable
+    """
+    try:
+        key = (tuple(metrics), tuple((type(metrics.get(field)), metrics.get(field))
+                                     for field in ('api_id',) + METRIC_FIELDS))
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class RequestCoalescer:
+    """
+    Calculs identiques concurrents exécutés une seule fois
+    - /calculate-badges : le premier appel d'une clé (meneur) calcule, les
+      appels identiques arrivés entre-temps attendent son résultat (ou son erreur)
+    - /bulk-calculate : éléments identiques d'un même lot évalués une fois
+    Clés en vol détenues par la boucle asyncio ; compteurs protégés (exécuteurs)
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.bulk_duplicates = 0
+
+    def join(self, key):
+        """Future du calcul en vol pour key (attente partagée) ou None"""
+        flight = self._inflight.get(key)
+        if flight is None:
+            return None
+        flight[1] += 1
+        with self._lock:
+            self.coalesced += 1
+        return flight[0]
+
+    def lead(self, key):
+        """Enregistre le calcul de key : les appels identiques s'y joignent"""
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = [future, 0]
+        with self._lock:
+            self.leaders += 1
+        return future
+
+    def finish(self, key, body: bytes = None, error: BaseException = None):
+        """Fin du calcul meneur : résultat (ou erreur) transmis aux appels en attente"""
+        future, waiters = self._inflight.pop(key)
+        if error is None:
+            future.set_result(body)
+        elif waiters:
+            future.set_exception(error)
+        else:
+            future.cancel()
+
+    async def run(self, key, compute):
+        """Corps JSON de compute() partagé entre appels concurrents de même clé"""
+        if key is None:
+            return await compute()
+        shared = self.join(key)
+        if shared is not None:
+            # shield : un appel en attente annulé n'annule pas le calcul partagé
+            return await asyncio.shield(shared)
+        self.lead(key)
+        try:
+            body = await compute()
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, body)
+        return body
+
+    def dedupe(self, items: list):
+        """
+        (éléments uniques, position unique de chaque élément) ou (items, None)
+        sans doublon ; seuls les api_id répétés sont comparés en détail
+        """
+        try:
+            ids = [metrics.get('api_id') for metrics in items]
+            if len(set(ids)) == len(ids):
+                return items, None
+        except TypeError:
+            pass
+        unique = []
+        positions = []
+        first = {}
+        for metrics in items:
+            key = request_fingerprint(metrics)
+            position = first.get(key) if key is not None else None
+            if position is None:
+                position = len(unique)
+                unique.append(metrics)
+                if key is not None:
+                    first[key] = position
+            positions.append(position)
+        if len(unique) == len(items):
+            return items, None
+        with self._lock:
+            self.bulk_duplicates += len(items) - len(unique)
+        return unique, positions
+
+    def dedupe_rows(self, keys):
+        """
+        Lot en colonnes : keys = octets de chaque ligne (api_id + métriques)
+        (lignes uniques dans l'ordre d'origine, position unique de chaque ligne)
+        ou (None, None) sans doublon
+        """
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        if len(unique) == len(keys):
+            return None, None
+        order = np.argsort(first, kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        with self._lock:
+            self.bulk_duplicates += len(keys) - len(unique)
+        return first[order], rank[inverse.reshape(-1)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "bulk_duplicates": self.bulk_duplicates
+            }
+
+
+def expand_bulk_results(api_metrics_list: list, results: list, validation_errors: list,
+                        positions: list):
+    """Résultats d'un lot dédoublonné recopiés à chaque position d'origine"""
+    failed = {error['index']: error for error in validation_errors}
+    entries = iter(results)
+    by_position = {
+        position: next(entries) for position in range(max(positions) + 1) if position not in failed
+    }
+    expanded, errors = [], []
+    for index, position in enumerate(positions):
+        error = failed.get(position)
+        if error is None:
+            expanded.append(by_position[position])
+        else:
+            api_id = api_metrics_list[index].get('api_id', f'unknown-{index}')
+            errors.append(dict(error, index=index, api_id=api_id))
+    return expanded, errors
+
+# =============================================================================
+# CATALOGUE BADGES (index bitmap + index triés, pagination par curseur)
+# =============================================================================
+
+CATALOG_MAX_LIMIT = 500
+CATALOG_SCAN_CHUNK = 1024
+
+# Tri -> (colonne, ordre par défaut) ; colonne None = confiance
+CATALOG_SORTS = {
+    'confidence': (None, 'desc'),
+    'badge_count': ('badge_count', 'desc'),
+    'uptime': ('uptime_percentage', 'desc'),
+    'response_time': ('avg_response_time', 'asc'),
+    'error_rate': ('error_rate', 'asc'),
+    'security_score': ('security_score', 'desc'),
+    'requests': ('total_requests', 'desc'),
+    'active_users': ('active_users', 'desc'),
+}
+
+# Filtre -> (métrique, borne basse ?)
+CATALOG_FILTERS = {
+    'min_uptime': ('uptime_percentage', True),
+    'max_response_time': ('avg_response_time', False),
+    'max_error_rate': ('error_rate', False),
+    'min_security_score': ('security_score', True),
+    'min_requests': ('total_requests', True),
+    'min_active_users': ('active_users', True),
+}
+
+
+class SnapshotIds:
+    """
+    api_ids d'un snapshot (tableau d'octets mappé), décodés à la lecture
+    get : ligne d'un api_id (comme dict.get) par recherche dans l'ordre trié
+    """
+
+    __slots__ = ('_ids', '_order')
+
+    def __init__(self, ids, order):
+        self._ids = ids
+        self._order = order
+
+    def get(self, api_id: str, default=None):
+        key = api_id.encode()
+        ids = self._ids
+        position = bisect.bisect_left(self._order, key, key=lambda row: ids[row])
+        if position < len(self._order) and ids[self._order[position]] == key:
+            return int(self._order[position])
+        return default
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [api_id.decode() for api_id in self._ids[index].tolist()]
+        return self._ids[index].decode()
+
+
+def encode_cursor(sort_key: str, order: str, key: float, row: int):
+    payload = json.dumps([sort_key, order, key, row], separators=(',', ':')).encode('ascii')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort_key: str, order: str):
+    """(clé, ligne) du dernier élément de la page précédente"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_order, key, row = json.loads(payload)
+        key, row = float(key), int(row)
+    except Exception:
+        raise ValueError("invalid cursor")
+    if cursor_sort != sort_key or cursor_order != order:
+        raise ValueError("cursor does not match sort/order")
+    return key, row
+
+
+def result_etag(epoch: str, version: int):
+    """ETag fort d'un résultat : instance du catalogue + version"""
+    return f'"{epoch}-{version}"'
+
+
+def etag_matches(if_none_match: str, etag: str):
+    """En-tête If-None-Match (liste, *, préfixe W/) contre l'ETag courant"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+class BadgeCatalog:
+    """
+    Derniers résultats par API, en colonnes NumPy (une ligne par api_id)
+    - index bitmap par badge (tableau bool) + confiance par badge
+    - index triés par colonne, construits à la demande ; les lignes
+      modifiées depuis la construction ("sales") sont triées à part et
+      fusionnées, l'index est reconstruit quand elles deviennent nombreuses
+    - pagination keyset : curseur = (clé de tri, ligne) du dernier élément
+    - agrégats historiques (sommes, poids) au moment du calcul, pour
+      réévaluer un badge seul quand ses règles changent
+    - version de résultat par API (badges ou confiances modifiés) : ETag
+      des lectures GET et flux des changements depuis une version
+    - from_snapshot : vue en lecture seule sur un snapshot mappé ; les lignes
+      évaluées par un lecteur sont transmises à l'écrivain (forward)
+    """
+
+    def __init__(self, aggregate_source=None, capacity: int = 1024):
+        self._lock = threading.Lock()
+        self.aggregate_source = aggregate_source
+        # Populations classées (MetricRanks) alimentées par les derniers résultats
+        self.ranks = None
+        self.read_only = False
+        # Vue de snapshot : destination des lignes évaluées (CatalogForwarder.submit)
+        self.forward = None
+        # Identifie cette instance dans les ETags (les versions repartent de 0 au redémarrage)
+        self.epoch = os.urandom(4).hex()
+        self._rows = {}
+        self._api_ids = []
+        self._capacity = capacity
+        self._metrics = np.zeros((capacity, len(METRIC_FIELDS)))
+        self._sums = np.zeros((capacity, len(WEIGHTED_FIELDS)))
+        self._weights = np.zeros(capacity)
+        self._badge_count = np.zeros(capacity)
+        self._highest = np.zeros(capacity)
+        self._updated = np.zeros(capacity)
+        self._row_version = np.zeros(capacity, dtype=np.int64)
+        self._badge_version = np.zeros(capacity, dtype=np.int64)
+        self._changed = np.zeros(capacity)
+        self._bitmaps = {}
+        self._confidence = {}
+        self._indexes = {}
+        self.version = 0
+        self.index_builds = 0
+
+    def __len__(self):
+        return len(self._api_ids)
+
+    def _grow(self, needed: int):
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self._capacity:
+            return
+        grow = lambda array, fill=0: np.concatenate(
+            [array, np.full((capacity - self._capacity,) + array.shape[1:], fill, dtype=array.dtype)]
+        )
+        self._metrics = grow(self._metrics)
+        self._sums = grow(self._sums)
+        self._weights = grow(self._weights)
+        self._badge_count = grow(self._badge_count)
+        self._highest = grow(self._highest)
+        self._updated = grow(self._updated)
+        self._row_version = grow(self._row_version)
+        self._badge_version = grow(self._badge_version)
+        self._changed = grow(self._changed)
+        self._bitmaps = {badge_id: grow(bitmap, False) for badge_id, bitmap in self._bitmaps.items()}
+        self._confidence = {badge_id: grow(values, np.nan) for badge_id, values in self._confidence.items()}
+        self._capacity = capacity
+
+    def _badge_columns(self, badge_id: str):
+        if badge_id not in self._bitmaps:
+            self._bitmaps[badge_id] = np.zeros(self._capacity, dtype=bool)
+            self._confidence[badge_id] = np.full(self._capacity, np.nan)
+        return self._bitmaps[badge_id], self._confidence[badge_id]
+
+    def update_many(self, entries, aggregate_source=None):
+        """
+        entries : (api_id, métriques, badges) ; la dernière occurrence d'une API l'emporte
+        À appeler avant d'enregistrer les métriques évaluées dans l'historique,
+        ou avec les agrégats utilisés pour l'évaluation (aggregate_source)
+        Vue de snapshot : lignes transmises à l'écrivain, qui tient le catalogue partagé
+        """
+        if self.read_only and self.forward is None:
+            return 0
+        latest = {}
+        for api_id, metrics, badges in entries:
+            latest[api_id] = (metrics, badges)
+        if not latest:
+            return 0
+
+        # Colonnes préparées hors verrou ; awarded : badge -> (positions, confiances)
+        awarded = {}
+        counts = []
+        highest = []
+        values = []
+        for position, (metrics, badges) in enumerate(latest.values()):
+            values.append([metrics[field] for field in METRIC_FIELDS])
+            counts.append(len(badges))
+            top = 0.0
+            for badge in badges:
+                positions, confidences = awarded.setdefault(badge['id'], ([], []))
+                positions.append(position)
+                confidences.append(badge['confidence_score'])
+                top = max(top, badge['confidence_score'])
+            highest.append(top)
+        values = np.array(values, dtype=np.float64)
+        return self._store(list(latest), values, counts, highest, awarded, aggregate_source)
+
+    def update_columns(self, api_ids: list, values, badge_ids: list, confidences, aggregate_source=None):
+        """
+        Équivalent en colonnes de update_many (lot binaire, sans structure par API)
+        values : [APIs x METRIC_FIELDS] ; confidences : [badges x APIs], NaN = non attribué
+        """
+        if (self.read_only and self.forward is None) or not api_ids:
+            return 0
+        latest = dict(zip(api_ids, range(len(api_ids))))
+        if len(latest) != len(api_ids):
+            positions = np.fromiter(latest.values(), dtype=np.int64, count=len(latest))
+            api_ids, values, confidences = list(latest), values[positions], confidences[:, positions]
+        earned = ~np.isnan(confidences)
+        counts = earned.sum(axis=0)
+        highest = np.where(earned, confidences, 0.0).max(axis=0, initial=0.0)
+        awarded = {}
+        for b, badge_id in enumerate(badge_ids):
+            positions = np.flatnonzero(earned[b])
+            if len(positions):
+                awarded[badge_id] = (positions, confidences[b, positions])
+        return self._store(api_ids, values, counts, highest, awarded, aggregate_source)
+
+    def update_awarded(self, api_ids: list, values, awarded: dict):
+        """Lignes évaluées ailleurs (lecteur) : api_id distincts, awarded : badge -> (positions, confiances)"""
+        counts = np.zeros(len(api_ids), dtype=np.int64)
+        highest = np.zeros(len(api_ids))
+        for positions, confidences in awarded.values():
+            np.add.at(counts, positions, 1)
+            np.maximum.at(highest, positions, confidences)
+        return self._store(api_ids, values, counts, highest, awarded)
+
+    def _store(self, api_ids: list, values, counts, highest, awarded: dict, aggregate_source=None):
+        """Écriture des lignes (une par api_id distinct) ; awarded : badge -> (positions, confiances)"""
+        if self.read_only:
+            self.forward(api_ids, values, awarded)
+            return len(api_ids)
+        aggregate_source = aggregate_source or self.aggregate_source
+        if aggregate_source is not None:
+            sums, weights = aggregate_source.gather(api_ids)
+        else:
+            sums, weights = 0.0, 0.0
+        now = time.time()
+
+        with self._lock:
+            rows = []
+            added = []
+            for position, api_id in enumerate(api_ids):
+                row = self._rows.get(api_id)
+                if row is None:
+                    row = self._rows[api_id] = len(self._api_ids)
+                    self._api_ids.append(api_id)
+                    added.append(position)
+                rows.append(row)
+            self._grow(len(self._api_ids))
+
+            rows = np.array(rows, dtype=np.int64)
+            # Résultats modifiés : nouvelles APIs, badges gagnés / perdus, confiance
+            changed = np.zeros(len(rows), dtype=bool)
+            changed[added] = True
+            for badge_id in set(self._bitmaps) | set(awarded):
+                now_awarded = np.zeros(len(rows), dtype=bool)
+                new_confidence = np.full(len(rows), np.nan)
+                if badge_id in awarded:
+                    positions, confidences = awarded[badge_id]
+                    now_awarded[positions] = True
+                    new_confidence[positions] = confidences
+                if badge_id in self._bitmaps:
+                    was_awarded = self._bitmaps[badge_id][rows]
+                    changed |= (now_awarded != was_awarded) | (now_awarded & (new_confidence != self._confidence[badge_id][rows]))
+                else:
+                    changed |= now_awarded
+            self._metrics[rows] = values
+            self._sums[rows] = sums
+            self._weights[rows] = weights
+            self._badge_count[rows] = counts
+            self._highest[rows] = highest
+            self._updated[rows] = now
+            for badge_id in list(self._bitmaps):
+                self._bitmaps[badge_id][rows] = False
+                self._confidence[badge_id][rows] = np.nan
+            for badge_id, (positions, confidences) in awarded.items():
+                bitmap, confidence = self._badge_columns(badge_id)
+                bitmap[rows[positions]] = True
+                confidence[rows[positions]] = confidences
+
+            self.version += 1
+            self._row_version[rows] = self.version
+            self._badge_version[rows[changed]] = self.version
+            self._changed[rows[changed]] = now
+            # Sous le verrou : populations mises à jour dans l'ordre des écritures du catalogue
+            if self.ranks is not None:
+                for base in ('active_users', 'total_requests'):
+                    self.ranks.update_many(base, api_ids, values[:, METRIC_FIELDS.index(base)])
+        return len(rows)
+
+    def snapshot_arrays(self):
+        """
+        Copie cohérente pour publication : (méta, tableaux, lignes par api_id)
+        Index triés complets pour les tris par défaut et la confiance de chaque badge
+        """
+        with self._lock:
+            n = len(self._api_ids)
+            badges = list(self._bitmaps)
+            arrays = {
+                'catalog_api_ids': np.array([api_id.encode() for api_id in self._api_ids] or [b''], dtype=bytes)[:n],
+                'catalog_metrics': self._metrics[:n].copy(),
+                'catalog_sums': self._sums[:n].copy(),
+                'catalog_weights': self._weights[:n].copy(),
+                'catalog_badge_count': self._badge_count[:n].copy(),
+                'catalog_highest': self._highest[:n].copy(),
+                'catalog_updated': self._updated[:n].copy(),
+                'catalog_badge_version': self._badge_version[:n].copy(),
+                'catalog_changed': self._changed[:n].copy(),
+                'catalog_bitmaps': np.array([self._bitmaps[badge_id][:n] for badge_id in badges], dtype=bool).reshape(len(badges), n),
+                'catalog_confidence': np.array([self._confidence[badge_id][:n] for badge_id in badges]).reshape(len(badges), n),
+            }
+            rows = dict(self._rows)
+            version = self.version
+        arrays['catalog_id_order'] = np.argsort(arrays['catalog_api_ids'], kind='stable')
+
+        meta = {"version": version, "epoch": self.epoch, "size": n, "badges": badges, "indexes": []}
+        view = BadgeCatalog.from_snapshot(meta, arrays)
+        indexes = [(column, default_order == 'desc') for column, default_order in CATALOG_SORTS.values()]
+        indexes += [('confidence:' + badge_id, True) for badge_id in badges]
+        for k, (column, descending) in enumerate(indexes):
+            keys = view._sort_keys(column, descending, n)
+            order = np.argsort(keys, kind='stable')
+            arrays[f'index_order_{k}'] = order
+            arrays[f'index_keys_{k}'] = keys[order]
+        meta["indexes"] = indexes
+        return meta, arrays, rows
+
+    @classmethod
+    def from_snapshot(cls, meta: dict, arrays: dict):
+        """Vue en lecture seule sur les tableaux d'un snapshot mappé (aucune copie)"""
+        catalog = cls(None, capacity=1)
+        n = meta['size']
+        catalog.read_only = True
+        catalog.epoch = meta['epoch']
+        catalog._api_ids = SnapshotIds(arrays['catalog_api_ids'], arrays['catalog_id_order'])
+        catalog._rows = catalog._api_ids
+        catalog._capacity = n
+        catalog._metrics = arrays['catalog_metrics']
+        catalog._sums = arrays['catalog_sums']
+        catalog._weights = arrays['catalog_weights']
+        catalog._badge_count = arrays['catalog_badge_count']
+        catalog._highest = arrays['catalog_highest']
+        catalog._updated = arrays['catalog_updated']
+        catalog._row_version = np.broadcast_to(np.int64(0), (n,))
+        catalog._badge_version = arrays['catalog_badge_version']
+        catalog._changed = arrays['catalog_changed']
+        catalog._bitmaps = dict(zip(meta['badges'], arrays['catalog_bitmaps']))
+        catalog._confidence = dict(zip(meta['badges'], arrays['catalog_confidence']))
+        catalog.version = meta['version']
+        catalog._indexes = {
+            (column, descending): (0, arrays[f'index_order_{k}'], arrays[f'index_keys_{k}'], n)
+            for k, (column, descending) in enumerate(meta['indexes'])
+        }
+        return catalog
+
+    def evaluation_inputs(self, fields: tuple, derived_source=None):
+        """
+        Instantané pour réévaluation : (version, colonnes métriques demandées,
+        sommes, poids) ; les lignes modifiées ensuite ne seront pas écrasées
+        Métriques dérivées (DERIVED_FIELDS) lues dans derived_source au moment de l'appel
+        """
+        with self._lock:
+            n = len(self._api_ids)
+            columns = {
+                field: self._metrics[:n, METRIC_FIELDS.index(field)].copy()
+                for field in fields if field in METRIC_FIELDS
+            }
+            if any(field in DERIVED_FIELDS for field in fields):
+                derived = (derived_source.gather(self._api_ids[:n]) if derived_source is not None
+                           else np.tile(np.array(MISSING_DERIVED), (n, 1)))
+                for k, field in enumerate(DERIVED_FIELDS):
+                    if field in fields:
+                        columns[field] = derived[:, k]
+            return self.version, columns, self._sums[:n].copy(), self._weights[:n].copy()
+
+    def _refresh_summary(self, rows):
+        """badge_count / highest_confidence recalculés depuis les bitmaps"""
+        counts = np.zeros(len(rows))
+        highest = np.zeros(len(rows))
+        for badge_id, bitmap in self._bitmaps.items():
+            counts += bitmap[rows]
+            highest = np.fmax(highest, self._confidence[badge_id][rows])
+        self._badge_count[rows] = counts
+        self._highest[rows] = highest
+
+    def apply_badges(self, snapshot_version: int, results: dict):
+        """
+        Nouveaux résultats de quelques badges sur les lignes de l'instantané
+        results : badge_id -> (lignes attribuées, confiances)
+        Retourne badge_id -> (api_ids gagnants, api_ids perdants)
+        """
+        with self._lock:
+            capacity = len(self._row_version)
+            current = self._row_version <= snapshot_version
+            current[len(self._api_ids):] = False
+            changes = {}
+            touched = []
+            for badge_id, (awarded_rows, confidences) in results.items():
+                bitmap, confidence = self._badge_columns(badge_id)
+                awarded = np.zeros(capacity, dtype=bool)
+                awarded[awarded_rows] = True
+                new_confidence = np.full(capacity, np.nan)
+                new_confidence[awarded_rows] = confidences
+
+                gained = np.flatnonzero(current & awarded & ~bitmap)
+                lost = np.flatnonzero(current & ~awarded & bitmap)
+                changed = np.flatnonzero(current & ((awarded != bitmap) | (awarded & (new_confidence != confidence))))
+                bitmap[changed] = awarded[changed]
+                confidence[changed] = new_confidence[changed]
+                touched.append(changed)
+                changes[badge_id] = ([self._api_ids[row] for row in gained], [self._api_ids[row] for row in lost])
+
+            changed = np.unique(np.concatenate(touched)) if touched else np.zeros(0, dtype=np.int64)
+            if len(changed):
+                self._refresh_summary(changed)
+                self.version += 1
+                self._row_version[changed] = self.version
+                self._badge_version[changed] = self.version
+                self._changed[changed] = time.time()
+            return changes
+
+    def remove_badge(self, badge_id: str):
+        """Badge supprimé des règles : retourne les api_ids qui le perdent"""
+        with self._lock:
+            bitmap = self._bitmaps.pop(badge_id, None)
+            self._confidence.pop(badge_id, None)
+            self._indexes = {key: index for key, index in self._indexes.items()
+                             if key[0] != 'confidence:' + badge_id}
+            if bitmap is None:
+                return []
+            lost = np.flatnonzero(bitmap[:len(self._api_ids)])
+            if len(lost):
+                self._refresh_summary(lost)
+                self.version += 1
+                self._row_version[lost] = self.version
+                self._badge_version[lost] = self.version
+                self._changed[lost] = time.time()
+            return [self._api_ids[row] for row in lost]
+
+    def _column(self, column, n: int):
+        if column is None:
+            return self._highest[:n]
+        if column == 'badge_count':
+            return self._badge_count[:n]
+        if column.startswith('confidence:'):
+            return self._confidence[column[11:]][:n]
+        return self._metrics[:n, METRIC_FIELDS.index(column)]
+
+    def _sort_keys(self, column, descending: bool, n: int):
+        values = self._column(column, n)
+        return -values if descending else values
+
+    def _index(self, column, descending: bool, n: int):
+        """(version, ordre, clés triées, lignes indexées), reconstruit si trop de lignes sales"""
+        index = self._indexes.get((column, descending))
+        if index is not None:
+            stale = np.count_nonzero(self._row_version[:n] > index[0])
+            if stale <= max(CATALOG_SCAN_CHUNK, n // 16):
+                return index
+        keys = self._sort_keys(column, descending, n)
+        order = np.argsort(keys, kind='stable')
+        index = (self.version, order, keys[order], n)
+        self._indexes[(column, descending)] = index
+        self.index_builds += 1
+        return index
+
+    def query(self, badges: list = None, filters: dict = None, sort: str = 'confidence',
+              order: str = None, limit: int = 50, cursor: str = None):
+        """APIs ayant tous les badges demandés, filtrées puis triées (page + curseur suivant)"""
+        badges = badges or []
+        filters = filters or {}
+        if sort not in CATALOG_SORTS:
+            raise ValueError(f"unknown sort '{sort}', expected one of {sorted(CATALOG_SORTS)}")
+        column, default_order = CATALOG_SORTS[sort]
+        order = order or default_order
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be 'asc' or 'desc'")
+        if not 1 <= limit <= CATALOG_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {CATALOG_MAX_LIMIT}")
+        # Tri par confiance : celle du premier badge demandé, sinon la plus haute
+        if column is None and badges:
+            column = 'confidence:' + badges[0]
+        descending = order == 'desc'
+        after = decode_cursor(cursor, sort, order) if cursor else None
+
+        with self._lock:
+            n = len(self._api_ids)
+            mask = np.ones(n, dtype=bool)
+            for badge_id in badges:
+                if badge_id not in self._bitmaps:
+                    mask[:] = False
+                    break
+                mask &= self._bitmaps[badge_id][:n]
+            for name, bound in filters.items():
+                metric, lower = CATALOG_FILTERS[name]
+                values = self._metrics[:n, METRIC_FIELDS.index(metric)]
+                mask &= (values >= bound) if lower else (values <= bound)
+            total = int(np.count_nonzero(mask))
+
+            page_rows = self._scan(column, descending, n, mask, after, limit + 1) if total else []
+            has_more = len(page_rows) > limit
+            page_rows = page_rows[:limit]
+            keys = self._sort_keys(column, descending, n)
+            items = [self._item(row) for row in page_rows]
+            next_cursor = None
+            if has_more:
+                last = page_rows[-1]
+                next_cursor = encode_cursor(sort, order, float(keys[last]), last)
+
+        return {
+            "items": items,
+            "count": len(items),
+            "total_matches": total,
+            "catalog_size": n,
+            "sort": sort,
+            "order": order,
+            "next_cursor": next_cursor
+        }
+
+    def _scan(self, column, descending: bool, n: int, mask, after, wanted: int):
+        """Lignes de mask après le curseur, dans l'ordre de tri (au plus wanted)"""
+        version, order, sorted_keys, indexed = self._index(column, descending, n)
+        keys = self._sort_keys(column, descending, n)
+        dirty = self._row_version[:n] > version
+
+        start = 0
+        if after is not None:
+            key, row = after
+            low = np.searchsorted(sorted_keys, key, 'left')
+            high = np.searchsorted(sorted_keys, key, 'right')
+            start = low + np.searchsorted(order[low:high], row, 'right')
+
+        # Lignes indexées à jour, parcourues par blocs
+        clean = mask & ~dirty
+        hits = []
+        found = 0
+        step = CATALOG_SCAN_CHUNK
+        while start < indexed and found < wanted:
+            block = order[start:start + step]
+            block = block[clean[block]][:wanted - found]
+            hits.append(block)
+            found += len(block)
+            start += step
+            step *= 2
+
+        # Lignes modifiées depuis la construction de l'index
+        stale = np.flatnonzero(dirty & mask)
+        if after is not None and len(stale):
+            key, row = after
+            stale_keys = keys[stale]
+            stale = stale[(stale_keys > key) | ((stale_keys == key) & (stale > row))]
+        hits.append(stale)
+
+        candidates = np.concatenate(hits) if hits else np.zeros(0, dtype=np.int64)
+        candidates = candidates[np.lexsort((candidates, keys[candidates]))]
+        return candidates[:wanted].tolist()
+
+    def _badges(self, row: int):
+        return [
+            {"id": badge_id, "confidence_score": float(self._confidence[badge_id][row])}
+            for badge_id, bitmap in self._bitmaps.items() if bitmap[row]
+        ]
+
+    def _item(self, row: int):
+        values = self._metrics[row]
+        metrics = {}
+        for i, field in enumerate(METRIC_FIELDS):
+            metrics[field] = int(values[i]) if field in INTEGER_FIELDS else float(values[i])
+        badges = self._badges(row)
+        return {
+            "api_id": self._api_ids[row],
+            "badges": badges,
+            "badge_count": len(badges),
+            "highest_confidence": float(self._highest[row]),
+            "metrics": metrics,
+            "updated_at": datetime.datetime.fromtimestamp(self._updated[row]).isoformat()
+        }
+
+    def _result(self, row: int):
+        """Résultat compact d'une API : badges (id + confiance), sans métadonnées statiques"""
+        badges = self._badges(row)
+        return {
+            "api_id": self._api_ids[row],
+            "version": int(self._badge_version[row]),
+            "badges": badges,
+            "badge_count": len(badges),
+            "highest_confidence": float(self._highest[row]),
+            "changed_at": datetime.datetime.fromtimestamp(self._changed[row]).isoformat()
+        }
+
+    def result_version(self, api_id: str):
+        """Version du dernier résultat d'une API (None si absente) : ETag sans construire la réponse"""
+        with self._lock:
+            row = self._rows.get(api_id)
+            return None if row is None else int(self._badge_version[row])
+
+    def lookup(self, api_id: str):
+        with self._lock:
+            row = self._rows.get(api_id)
+            return None if row is None else self._result(row)
+
+    def changes_since(self, since: int = 0, limit: int = 100, cursor: str = None):
+        """
+        APIs dont le résultat a changé après la version since, par version croissante
+        Page suivante : next_cursor ; à la fin, repasser version comme since
+        """
+        if not 1 <= limit <= CATALOG_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {CATALOG_MAX_LIMIT}")
+        if since < 0:
+            raise ValueError("since must be >= 0")
+        after = decode_cursor(cursor, 'changes', 'asc') if cursor else None
+
+        with self._lock:
+            n = len(self._api_ids)
+            versions = self._badge_version[:n]
+            mask = versions > since
+            if after is not None:
+                key, row = after
+                mask &= (versions > key) | ((versions == key) & (np.arange(n) > row))
+            rows = np.flatnonzero(mask)
+            total = len(rows)
+            # (version, ligne) en une clé entière ; sélection partielle avant le tri
+            keys = versions[rows] * max(n, 1) + rows
+            if total > limit + 1:
+                selected = np.argpartition(keys, limit)[:limit + 1]
+                rows, keys = rows[selected], keys[selected]
+            rows = rows[np.argsort(keys, kind='stable')]
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            changes = [self._result(row) for row in rows.tolist()]
+            next_cursor = None
+            if has_more:
+                last = int(rows[-1])
+                next_cursor = encode_cursor('changes', 'asc', float(versions[last]), last)
+            version = self.version
+
+        return {
+            "version": version,
+            "epoch": self.epoch,
+            "since": since,
+            "changes": changes,
+            "count": len(changes),
+            "total_changes": total,
+            "next_cursor": next_cursor
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "apis": len(self._api_ids),
+                "capacity": self._capacity,
+                "version": self.version,
+                "badge_counts": {
+                    badge_id: int(np.count_nonzero(bitmap[:len(self._api_ids)]))
+                    for badge_id, bitmap in self._bitmaps.items()
+                },
+                "sorted_indexes": len(self._indexes),
+                "index_builds": self.index_builds
+            }
+
+# =============================================================================
+# RÉÉVALUATION INCRÉMENTALE (changement de règles d'un badge)
+# =============================================================================
+
+# Une modification de règles à la fois (plan + catalogue cohérents)
+rules_update_lock = threading.Lock()
+
+
+def validate_badge_config(badge_id: str, config: dict):
+    """Configuration badge complète, critères connus à seuils numériques > 0"""
+    def invalid(message: str):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid badge rule",
+                "badge_id": badge_id,
+                "message": message,
+                "timestamp": get_current_timestamp()
+            }
+        )
+
+    missing_fields = [field for field in ('name', 'icon', 'description', 'criteria') if field not in config]
+    if missing_fields:
+        invalid(f"missing fields: {missing_fields}")
+    for field in ('name', 'icon', 'description'):
+        if not isinstance(config[field], str):
+            invalid(f"{field} must be a string")
+    criteria = config['criteria']
+    if not isinstance(criteria, dict) or not criteria:
+        invalid("criteria must be a non-empty object")
+    for criterion, threshold in criteria.items():
+        if criterion not in CRITERION_SPECS:
+            invalid(f"unknown criterion '{criterion}', expected one of {list(CRITERION_SPECS)}")
+        if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not (0 < threshold < float('inf')):
+            invalid(f"criterion '{criterion}' threshold must be a positive number")
+
+    return {
+        'name': config['name'],
+        'icon': config['icon'],
+        'description': config['description'],
+        'criteria': dict(criteria)
+    }
+
+
+def catalog_evaluation_columns(fields: tuple, uses_ranks: bool):
+    """
+    Colonnes moyennées (+ dérivées, + rangs) de tout le catalogue pour les métriques demandées
+    Retourne (version du catalogue, colonnes, nombre d'APIs)
+    """
+    version, columns, sums, weights = badge_catalog.evaluation_inputs(fields, badge_engine.derived_source)
+    n = len(weights)
+    averaged = columnar_engine.weighted_averages(columns, sums, weights)
+    for field in DERIVED_FIELDS:
+        if field in columns:
+            averaged[field] = columns[field]
+    if uses_ranks:
+        badge_engine.add_rank_columns(averaged, columns)
+    return version, averaged, n
+
+
+def reevaluate_catalog_badges(badge_ids: list):
+    """
+    Réévaluation vectorisée de quelques badges sur tout le catalogue
+    Seules les métriques dont ils dépendent sont chargées ; mêmes
+    opérations flottantes que calculate_badges sur les agrégats
+    historiques enregistrés au moment du calcul
+    Retourne (badge_id -> (api_ids gagnants, api_ids perdants), nombre d'APIs)
+    """
+    rules = badge_engine.badge_rules
+    plan = compile_badge_rules({badge_id: rules[badge_id] for badge_id in badge_ids}, badge_engine.rules_version)
+    fields = tuple(sorted({field for badge_id in badge_ids for field in plan.dependencies[badge_id]}))
+
+    version, averaged, n = catalog_evaluation_columns(fields, plan.uses_ranks)
+    products = columnar_engine.evaluate(averaged, plan, n)
+
+    results = {}
+    for b, (badge_id, _, _, exponent) in enumerate(plan.badges):
+        rows = []
+        confidences = []
+        if exponent is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                approx = products[b] ** exponent
+            # Candidats avec marge, confirmés par le pow scalaire
+            candidates = np.flatnonzero(approx >= CONFIDENCE_THRESHOLD - 1e-9)
+            for row, product in zip(candidates.tolist(), products[b, candidates].tolist()):
+                confidence = product ** exponent
+                if confidence >= CONFIDENCE_THRESHOLD:
+                    rows.append(row)
+                    confidences.append(round(confidence, 2))
+        results[badge_id] = (rows, confidences)
+
+    return badge_catalog.apply_badges(version, results), n
+
+
+def apply_badge_rule_change(badge_id: str, config: Optional[dict], diff_limit: int = 1000):
+    """
+    Ajout / modification (config) ou suppression (None) d'un badge
+    Seuls les badges ajoutés ou dont les critères changent sont
+    réévalués ; diff gagnés / perdus par API
+    """
+    started = time.perf_counter()
+    with rules_update_lock:
+        if config is None:
+            changes = badge_engine.remove_badge_rule(badge_id)
+        else:
+            changes = badge_engine.set_badge_rule(badge_id, config)
+
+        reevaluated = changes['added'] + changes['criteria_changed']
+        per_badge, evaluated_apis = reevaluate_catalog_badges(reevaluated) if reevaluated else ({}, 0)
+        for removed_id in changes['removed']:
+            per_badge[removed_id] = ([], badge_catalog.remove_badge(removed_id))
+
+    diff = {}
+    for changed_id, (gained, lost) in per_badge.items():
+        for api_id in gained:
+            diff.setdefault(api_id, {"gained": [], "lost": []})["gained"].append(changed_id)
+        for api_id in lost:
+            diff.setdefault(api_id, {"gained": [], "lost": []})["lost"].append(changed_id)
+
+    if changes['added']:
+        change = "added"
+    elif changes['removed']:
+        change = "removed"
+    elif changes['criteria_changed']:
+        change = "updated"
+    elif changes['metadata_changed']:
+        change = "metadata_updated"
+    else:
+        change = "unchanged"
+
+    return {
+        "success": True,
+        "badge_id": badge_id,
+        "change": change,
+        "rules_version": badge_engine.rules_version,
+        "badge_version": badge_engine.badge_versions.get(badge_id),
+        "dependencies": list(badge_engine.rule_plan.dependencies.get(badge_id, ())),
+        "reevaluated_badges": reevaluated,
+        "reevaluated_apis": evaluated_apis,
+        "summary": {
+            changed_id: {"gained": len(gained), "lost": len(lost)}
+            for changed_id, (gained, lost) in per_badge.items()
+        },
+        "changed_apis": len(diff),
+        "diff": dict(list(diff.items())[:diff_limit]),
+        "diff_truncated": len(diff) > diff_limit,
+        "processing_time_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+# =============================================================================
+# PROJECTIONS COMMISSION / REVENUS (scénarios what-if sur tout le catalogue)
+# =============================================================================
+
+PROJECTION_MAX_SCENARIOS = int(os.environ.get("BADGES_PROJECTION_MAX_SCENARIOS", "16"))
+
+# Paramètres de CommissionCalculator modifiables par scénario (taux entre 0 et 1)
+COMMISSION_PARAMETERS = ('base_commission', 'badge_bonus_per_badge', 'max_commission')
+
+
+def parse_projection_scenario(index: int, scenario: dict):
+    """
+    Scénario -> (nom, calculateur de commission, règles, badges modifiés)
+    badge_rules : configurations remplaçant celles en vigueur, null = badge retiré
+    Paramètres absents : valeurs en vigueur
+    """
+    def invalid(message: str):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid projection scenario",
+                "scenario": index,
+                "message": message,
+                "timestamp": get_current_timestamp()
+            }
+        )
+
+    if not isinstance(scenario, dict):
+        invalid("scenario must be an object")
+    unknown = [key for key in scenario if key not in ('name', 'badge_rules') + COMMISSION_PARAMETERS]
+    if unknown:
+        invalid(f"unknown fields: {unknown}")
+    name = scenario.get('name', f'scenario-{index}')
+    if not isinstance(name, str):
+        invalid("name must be a string")
+
+    calculator = CommissionCalculator()
+    for parameter in COMMISSION_PARAMETERS:
+        value = scenario.get(parameter, getattr(commission_calc, parameter))
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not (0 <= value <= 1):
+            invalid(f"{parameter} must be a number between 0 and 1")
+        setattr(calculator, parameter, value)
+
+    overrides = scenario.get('badge_rules')
+    if overrides is None:
+        overrides = {}
+    if not isinstance(overrides, dict):
+        invalid("badge_rules must be an object")
+    rules = dict(badge_engine.badge_rules)
+    for badge_id, config in overrides.items():
+        if config is None:
+            if badge_id not in rules:
+                invalid(f"unknown badge '{badge_id}'")
+            del rules[badge_id]
+            continue
+        if not isinstance(config, dict):
+            invalid(f"badge '{badge_id}' must be an object or null")
+        try:
+            rules[badge_id] = validate_badge_config(badge_id, config)
+        except HTTPException as e:
+            invalid(f"badge '{badge_id}': {e.detail['message']}")
+
+    return name, calculator, rules, list(overrides)
+
+
+def count_earned_badges(products, plan: BadgeRulePlan):
+    """
+    Badges obtenus par API + attributions par badge, depuis les produits de evaluate
+    pow vectorisé ; valeurs à 1e-9 du seuil confirmées par le pow scalaire
+    """
+    n = products.shape[1]
+    counts = np.zeros(n, dtype=np.int64)
+    awarded = {}
+    for b, (badge_id, _, _, exponent) in enumerate(plan.badges):
+        if exponent is None:
+            awarded[badge_id] = 0
+            continue
+        with np.errstate(divide='ignore', invalid='ignore'):
+            approx = products[b] ** exponent
+        earned = approx >= CONFIDENCE_THRESHOLD
+        borderline = np.flatnonzero(np.abs(approx - CONFIDENCE_THRESHOLD) < 1e-9)
+        for row, product in zip(borderline.tolist(), products[b, borderline].tolist()):
+            earned[row] = product ** exponent >= CONFIDENCE_THRESHOLD
+        counts += earned
+        awarded[badge_id] = int(np.count_nonzero(earned))
+    return counts, awarded
+
+
+def commission_tables(calculator: CommissionCalculator, max_count: int):
+    """Commission et hausse de revenus par nombre de badges (0..max_count), via calculate_commission_impact"""
+    impacts = [calculator.calculate_commission_impact(count) for count in range(max_count + 1)]
+    return (np.array([impact['total_commission'] for impact in impacts]),
+            np.array([impact['revenue_increase_estimate'] for impact in impacts]))
+
+
+def projection_outcome(counts, awarded: dict, calculator: CommissionCalculator):
+    """
+    Agrégats d'un scénario + colonnes par API (commission, indice de revenu plateforme)
+    Indice de revenu plateforme : commission x (1 + hausse de revenus estimée),
+    pour un revenu API de référence de 1
+    """
+    n = len(counts)
+    histogram = np.bincount(counts, minlength=1)
+    commission_by_count, increase_by_count = commission_tables(calculator, len(histogram) - 1)
+    commission = commission_by_count[counts]
+    increase = increase_by_count[counts]
+    platform_revenue = commission * (1.0 + increase)
+
+    commission_distribution = {}
+    for count, apis in enumerate(histogram.tolist()):
+        if apis:
+            rate = str(round(float(commission_by_count[count]), 6))
+            commission_distribution[rate] = commission_distribution.get(rate, 0) + apis
+
+    def average(column):
+        return round(float(column.mean()), 6) if n else 0.0
+
+    summary = {
+        "parameters": {parameter: getattr(calculator, parameter) for parameter in COMMISSION_PARAMETERS},
+        "total_badges": int(counts.sum()),
+        "avg_badges_per_api": round(float(counts.mean()), 4) if n else 0.0,
+        "badge_count_distribution": {str(count): apis for count, apis in enumerate(histogram.tolist()) if apis},
+        "badges_awarded": awarded,
+        "commission": {
+            "average": average(commission),
+            "min": round(float(commission.min()), 6) if n else 0.0,
+            "max": round(float(commission.max()), 6) if n else 0.0,
+            "apis_at_max_commission": int(np.count_nonzero(commission >= calculator.max_commission)),
+            "distribution": commission_distribution
+        },
+        "revenue_increase_estimate": {"average": average(increase)},
+        "platform_revenue_index": {"average": average(platform_revenue)}
+    }
+    return summary, commission, platform_revenue
+
+
+def project_commission_scenarios(scenarios: list):
+    """
+    Scénarios what-if (règles + paramètres de commission) sur tout le catalogue
+    Une seule lecture des colonnes ; un evaluate vectorisé par jeu de règles distinct,
+    commission par nombre de badges (histogramme) ; comparaison au jeu en vigueur
+    """
+    started = time.perf_counter()
+    parsed = [parse_projection_scenario(index, scenario) for index, scenario in enumerate(scenarios)]
+    current_plan = badge_engine.rule_plan
+    plans = [
+        compile_badge_rules(rules, intern=False) if changed else current_plan
+        for _, _, rules, changed in parsed
+    ]
+    fields = tuple(sorted({field for plan in plans + [current_plan]
+                           for dependencies in plan.dependencies.values() for field in dependencies}))
+    version, averaged, n = catalog_evaluation_columns(
+        fields, any(plan.uses_ranks for plan in plans + [current_plan])
+    )
+
+    evaluated = {}
+
+    def earned(plan: BadgeRulePlan):
+        if id(plan) not in evaluated:
+            evaluated[id(plan)] = count_earned_badges(columnar_engine.evaluate(averaged, plan, n), plan)
+        return evaluated[id(plan)]
+
+    current_counts, current_awarded = earned(current_plan)
+    current, current_commission, current_revenue = projection_outcome(
+        current_counts, current_awarded, commission_calc
+    )
+
+    results = []
+    for (name, calculator, _, changed), plan in zip(parsed, plans):
+        counts, awarded = earned(plan)
+        summary, commission, platform_revenue = projection_outcome(counts, awarded, calculator)
+        commission_delta = commission - current_commission
+        results.append({
+            "name": name,
+            "badge_rules_changed": changed,
+            **summary,
+            "vs_current": {
+                "apis_gaining_badges": int(np.count_nonzero(counts > current_counts)),
+                "apis_losing_badges": int(np.count_nonzero(counts < current_counts)),
+                "apis_commission_up": int(np.count_nonzero(commission_delta > 0)),
+                "apis_commission_down": int(np.count_nonzero(commission_delta < 0)),
+                "commission_delta_average": round(float(commission_delta.mean()), 6) if n else 0.0,
+                "platform_revenue_index_delta": round(float((platform_revenue - current_revenue).mean()), 6) if n else 0.0
+            }
+        })
+
+    return {
+        "success": True,
+        "apis": n,
+        "catalog_version": version,
+        "rules_version": badge_engine.rules_version,
+        "current": current,
+        "scenarios": results,
+        "processing_time_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+# =============================================================================
+# INGESTION STREAMING (NDJSON, micro-lots)
+# =============================================================================
+
+STREAM_BATCH_SIZE = 500           # points max par micro-lot
+STREAM_BATCH_INTERVAL = 0.05      # secondes max avant vidage d'un micro-lot
+STREAM_QUEUE_SIZE = 2000          # points en attente avant backpressure
+STREAM_MAX_LINE_BYTES = 64 * 1024
+STREAM_MAX_ERRORS = 100           # erreurs détaillées conservées par flux
+
+# Derniers badges calculés par API (alimenté par l'ingestion)
+latest_results = {}
+
+
+def evaluate_metrics_list(metrics_list: list, state: EvaluationState = None):
+    """Badges d'une liste de métriques déjà validées (colonnes si lot important)"""
+    state = evaluation_state if state is None else state
+    earned_at = get_current_timestamp()
+    if len(metrics_list) >= COLUMNAR_BATCH_THRESHOLD:
+        computed = state.columnar.calculate_batch(metrics_list, earned_at=earned_at)
+    else:
+        computed = [None] * len(metrics_list)
+    
+    for i, metrics in enumerate(metrics_list):
+        if computed[i] is None:
+            aggregate = state.aggregates.get(metrics['api_id'])
+            computed[i] = state.engine.calculate_badges(metrics, aggregate=aggregate, earned_at=earned_at)
+    
+    return computed
+
+
+def process_metrics_batch(samples: list):
+    """
+    Micro-lot : stockage + recalcul des seules APIs modifiées
+    Le dernier point de chaque API sert de métriques courantes, évaluées
+    contre l'historique qui le précède (comme /calculate-badges)
+    Un seul état d'évaluation par lot (règles, catalogue, commission)
+    """
+    state = evaluation_state
+    by_api = {}
+    for sample in samples:
+        by_api.setdefault(sample['api_id'], []).append(sample)
+    
+    latest = []
+    for api_id, api_samples in by_api.items():
+        if len(api_samples) > 1:
+            record_metrics(api_id, api_samples[:-1])
+        latest.append(api_samples[-1])
+    
+    computed = evaluate_metrics_list(latest, state)
+    computed_at = get_current_timestamp()
+    # Avant l'enregistrement : le catalogue garde l'historique utilisé pour l'évaluation
+    state.catalog.update_many(
+        (metrics['api_id'], metrics, badges) for metrics, badges in zip(latest, computed)
+    )
+    
+    for metrics, badges in zip(latest, computed):
+        record_metrics(metrics['api_id'], [metrics])
+        latest_results[metrics['api_id']] = {
+            "api_id": metrics['api_id'],
+            "badges": badges,
+            "badge_count": len(badges),
+            "commission_info": state.commission.calculate_commission_impact(len(badges)),
+            "computed_at": computed_at
+        }
+    reevaluation_scheduler.mark_evaluated(
+        {metrics['api_id']: len(badges) for metrics, badges in zip(latest, computed)}
+    )
+    
+    return len(latest)
+
+
+class StreamIngestor:
+    """
+    Ingestion NDJSON incrémentale
+    - lecture du corps chunk par chunk, une ligne = un objet métriques
+    - validation validate_metrics_data ligne par ligne
+    - micro-lots par taille (batch_size) ou délai (interval)
+    - file bornée : quand elle est pleine, la lecture du corps s'arrête
+      (backpressure TCP), la mémoire reste constante
+    """
+
+    def __init__(self, batch_size: int = STREAM_BATCH_SIZE, interval: float = STREAM_BATCH_INTERVAL,
+                 queue_size: int = STREAM_QUEUE_SIZE, max_line_bytes: int = STREAM_MAX_LINE_BYTES):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_line_bytes = max_line_bytes
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.lines = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.recomputed = 0
+        self.errors = []
+
+    def _error(self, entry: dict):
+        # Détail borné : au-delà de STREAM_MAX_ERRORS seuls les compteurs avancent
+        if len(self.errors) < STREAM_MAX_ERRORS:
+            self.errors.append(entry)
+
+    def _reject(self, line_number: int, error, status: str = "validation_failed"):
+        self.rejected += 1
+        self._error({"line": line_number, "error": error, "status": status})
+
+    async def _accept_line(self, line_number: int, line: bytes):
+        try:
+            metrics = json.loads(line)
+        except ValueError as e:
+            self._reject(line_number, f"Invalid JSON: {e}")
+            return
+        if not isinstance(metrics, dict):
+            self._reject(line_number, "Each line must be a JSON object")
+            return
+        
+        try:
+            record = parse_metrics(metrics)
+        except HTTPException as e:
+            self._reject(line_number, e.detail)
+            return
+        except Exception as e:
+            self._reject(line_number, str(e), "processing_failed")
+            return
+        
+        self.accepted += 1
+        # Bloque quand la file est pleine -> plus de lecture du corps
+        await self.queue.put(record)
+
+    async def _produce(self, chunks):
+        buffer = b''
+        skipping = False
+        
+        async for chunk in chunks:
+            if skipping:
+                # Reste d'une ligne trop longue déjà rejetée : ignoré jusqu'au saut de ligne
+                newline = chunk.find(b'\n')
+                if newline < 0:
+                    continue
+                chunk = chunk[newline + 1:]
+                skipping = False
+            
+            buffer += chunk
+            lines = buffer.split(b'\n')
+            buffer = lines.pop()
+            for line in lines:
+                self.lines += 1
+                if len(line) > self.max_line_bytes:
+                    self._reject(self.lines, f"Line exceeds {self.max_line_bytes} bytes")
+                elif line.strip():
+                    await self._accept_line(self.lines, line)
+            
+            if len(buffer) > self.max_line_bytes:
+                self.lines += 1
+                self._reject(self.lines, f"Line exceeds {self.max_line_bytes} bytes")
+                buffer = b''
+                skipping = True
+        
+        if buffer.strip() and not skipping:
+            self.lines += 1
+            await self._accept_line(self.lines, buffer)
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        finished = False
         
-        # Récupération historique simulé
-        historical_data = get_historical_metrics(metrics['api_id'])
+        while not finished:
+            item = await self.queue.get()
+            if item is None:
+                break
+            
+            batch = [item]
+            deadline = loop.time() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+            
+            self.batches += 1
+            try:
+                # Stockage + calcul hors boucle événementielle, pool borné des lots
+                self.recomputed += await loop.run_in_executor(bulk_executor, process_metrics_batch, batch)
+            except Exception as e:
+                self._error({"batch": self.batches, "error": str(e), "status": "processing_failed"})
+
+    async def run(self, chunks):
+        started = time.perf_counter()
+        consumer = asyncio.create_task(self._consume())
+        try:
+            await self._produce(chunks)
+        finally:
+            await self.queue.put(None)
+            await consumer
         
-        # Calcul badges
-        badges = badge_engine.calculate_badges(metrics, historical_data)
+        return {
+            "success": self.accepted > 0,
+            "lines_received": self.lines,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "micro_batches": self.batches,
+            "recomputed_apis": self.recomputed,
+            "errors": self.errors,
+            "processing_time_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+
+# =============================================================================
+# INSTRUMENTATION (histogrammes, /metrics Prometheus, profilage à la demande)
+# =============================================================================
+
+# Bornes (secondes) des histogrammes, 10µs -> 10s
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Profilage échantillonné des requêtes lentes (désactivé si 0)
+PROFILE_SLOW_MS = float(os.environ.get("BADGES_PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("BADGES_PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_STACKS = 500
+
+
+def add_timing(timings: dict, stage: str, started: float):
+    """Ajoute la durée depuis started à l'étape ; retourne l'instant courant"""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (now - started)
+    return now
+
+
+class LatencyHistogram:
+    """Histogramme à bornes fixes (coût : une recherche dichotomique + 3 additions)"""
+
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        # Sans verrou : incréments sous GIL, écart éventuel négligeable
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class PerformanceMetrics:
+    """Registre des histogrammes requêtes + étapes, rendu au format texte Prometheus"""
+
+    def __init__(self):
+        self.requests = {}
+        self.request_latency = {}
+        self.stage_latency = {}
+
+    def observe_request(self, endpoint: str, method: str, status: int, seconds: float):
+        key = (endpoint, method, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.request_latency.get(endpoint)
+        if histogram is None:
+            histogram = self.request_latency[endpoint] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def observe_stages(self, endpoint: str, timings: dict):
+        for stage, seconds in timings.items():
+            key = (endpoint, stage)
+            histogram = self.stage_latency.get(key)
+            if histogram is None:
+                histogram = self.stage_latency[key] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def _render_histogram(self, lines: list, name: str, labels: str, histogram: LatencyHistogram):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram.total}')
+        lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+    def render_prometheus(self, gauges: dict = None):
+        lines = [
+            '# HELP badges_requests_total HTTP requests by endpoint, method and status',
+            '# TYPE badges_requests_total counter'
+        ]
+        for (endpoint, method, status), count in sorted(self.requests.items()):
+            lines.append(f'badges_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+        lines.append('# HELP badges_request_duration_seconds End-to-end request latency')
+        lines.append('# TYPE badges_request_duration_seconds histogram')
+        for endpoint, histogram in sorted(self.request_latency.items()):
+            self._render_histogram(lines, 'badges_request_duration_seconds', f'endpoint="{endpoint}"', histogram)
+
+        lines.append('# HELP badges_stage_duration_seconds Hot-path stage latency per request')
+        lines.append('# TYPE badges_stage_duration_seconds histogram')
+        for (endpoint, stage), histogram in sorted(self.stage_latency.items()):
+            self._render_histogram(
+                lines, 'badges_stage_duration_seconds', f'endpoint="{endpoint}",stage="{stage}"', histogram
+            )
+
+        for name, (kind, help_text, value) in (gauges or {}).items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler:
+    """
+    Profileur échantillonné opt-in (BADGES_PROFILE_SLOW_MS)
+    Tant qu'une requête dépasse le seuil, un thread échantillonne les piles
+    des autres threads toutes les PROFILE_INTERVAL_MS et agrège les piles
+    repliées (format flamegraph). Aucun coût quand aucune requête n'est lente.
+    """
+
+    IDLE_FUNCTIONS = {'select', 'poll', 'wait', 'sleep', 'accept', '_worker', 'get'}
+
+    def __init__(self, slow_ms: float, interval_ms: float):
+        self.slow_seconds = slow_ms / 1000
+        self.interval = interval_ms / 1000
+        self.in_flight = {}
+        self.stacks = {}
+        self.samples = 0
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.slow_seconds > 0
+
+    def start_request(self, token, path: str):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+            self._thread.start()
+        self.in_flight[token] = (time.perf_counter(), path)
+
+    def end_request(self, token):
+        self.in_flight.pop(token, None)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            slow = [path for started, path in list(self.in_flight.values()) if now - started >= self.slow_seconds]
+            if not slow:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_name in self.IDLE_FUNCTIONS:
+                    continue
+                stack = ';'.join(
+                    f'{os.path.basename(entry.filename)}:{entry.name}'
+                    for entry in traceback.extract_stack(frame)
+                )
+                key = f'{slow[0]};{stack}'
+                if key in self.stacks or len(self.stacks) < PROFILE_MAX_STACKS:
+                    self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def report(self, limit: int = 50):
+        top = sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return {
+            "enabled": self.enabled,
+            "slow_threshold_ms": self.slow_seconds * 1000,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": [{"stack": stack, "samples": count} for stack, count in top]
+        }
+
+
+class RequestTimingMiddleware:
+    """Middleware ASGI minimal : latence + statut par route (gabarit de chemin)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+        token = object()
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        if slow_profiler.enabled:
+            slow_profiler.start_request(token, scope['path'])
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if slow_profiler.enabled:
+                slow_profiler.end_request(token)
+            route = scope.get('route')
+            endpoint = getattr(route, 'path', 'unmatched')
+            perf_metrics.observe_request(endpoint, scope['method'], status[0], time.perf_counter() - started)
+
+# =============================================================================
+# ENCODAGE JSON RAPIDE (fragments badges pré-sérialisés)
+# =============================================================================
+
+# Même rendu que JSONResponse de Starlette
+_dumps = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode
+_encode_str = json.encoder.encode_basestring
+
+# Clés d'un élément 'results' de /bulk-calculate (bulk_result_entry)
+RESULT_KEYS = ('api_id', 'badges', 'badge_count', 'commission_info', 'status')
+
+
+def _encode_value(value):
+    """Scalaires encodés directement, le reste via json (même rendu)"""
+    kind = type(value)
+    if kind is str:
+        return _encode_str(value)
+    if kind is int:
+        return int.__repr__(value)
+    if kind is float and value - value == 0.0:  # fini (ni NaN ni inf)
+        return float.__repr__(value)
+    return _dumps(value)
+
+
+class FastJSONResponse(Response):
+    """Corps JSON déjà encodé (pas de jsonable_encoder ni de json.dumps générique)"""
+    media_type = "application/json"
+
+
+class BadgeJSONEncoder:
+    """
+    Encodage des résultats badges à partir de fragments mis en cache
+    La partie statique d'un badge (id, name, icon, description, criteria)
+    est sérialisée une fois par template interné ; seuls earned_at et
+    confidence_score sont encodés à chaque réponse. Les dicts commission
+    (une poignée de valeurs possibles) et les clés d'objets sont aussi
+    mis en cache. Octets identiques à JSONResponse(content).body.
+    """
+
+    def __init__(self):
+        self._commissions = {}
+        self._keys = {}
+
+    def _badge(self, badge, earned: dict):
+        if type(badge) is not BadgeAward:
+            return _dumps(badge)
+        template = badge.template
+        prefix = template.json_prefix
+        if prefix is None:
+            prefix = template.json_prefix = '{"id":%s,"name":%s,"icon":%s,"description":%s,"criteria":%s,"earned_at":' % (
+                _dumps(template.id), _dumps(template.name), _dumps(template.icon),
+                _dumps(template.description), _dumps(template.criteria)
+            )
+        earned_at = badge.earned_at
+        earned_at_json = earned.get(earned_at)
+        if earned_at_json is None:
+            earned_at_json = earned[earned_at] = _encode_value(earned_at)
+        return prefix + earned_at_json + ',"confidence_score":' + _encode_value(badge.confidence_score) + '}'
+
+    def encode_badges(self, badges: list, earned: dict = None):
+        """
+        earned : earned_at -> JSON, propre à un appel d'encodage (encodeur partagé
+        entre la boucle et les threads bulk : aucun état par réponse sur l'instance)
+        """
+        if not badges:
+            return '[]'
+        if earned is None:
+            earned = {}
+        return '[' + ','.join([self._badge(badge, earned) for badge in badges]) + ']'
+
+    def encode_commission(self, commission):
+        if type(commission) is not dict:
+            return _dumps(commission)
+        key = tuple(commission.items())
+        encoded = self._commissions.get(key)
+        if encoded is None:
+            if len(self._commissions) > 1024:
+                self._commissions.clear()
+            encoded = self._commissions[key] = _dumps(commission)
+        return encoded
+
+    def _encode_object(self, obj: dict, special: dict):
+        keys = self._keys
+        parts = []
+        for key, value in obj.items():
+            encoded_key = keys.get(key)
+            if encoded_key is None:
+                encoded_key = keys[key] = _dumps(key) + ':'
+            encoder = special.get(key)
+            parts.append(encoded_key + (encoder(value) if encoder else _encode_value(value)))
+        return '{' + ','.join(parts) + '}'
+
+    def encode_calculation(self, content: dict):
+        """Corps /calculate-badges"""
+        return self._encode_object(content, {
+            'badges': self.encode_badges,
+            'business_impact': self.encode_commission
+        }).encode('utf-8')
+
+    def _result(self, result: dict, fields: dict, earned: dict):
+        if tuple(result) != RESULT_KEYS:
+            return self._encode_object(result, fields)
+        return '{"api_id":%s,"badges":%s,"badge_count":%s,"commission_info":%s,"status":%s}' % (
+            _encode_value(result['api_id']), self.encode_badges(result['badges'], earned),
+            _encode_value(result['badge_count']), self.encode_commission(result['commission_info']),
+            _encode_value(result['status'])
+        )
+
+    def encode_bulk(self, content: dict):
+        """Corps /bulk-calculate"""
+        # earned_at commun à tous les badges d'un lot : encodé une fois par appel
+        earned = {}
+        fields = {'badges': lambda badges: self.encode_badges(badges, earned), 'commission_info': self.encode_commission}
+        encode_results = lambda results: '[' + ','.join(
+            [self._result(result, fields, earned) for result in results]
+        ) + ']'
+        return self._encode_object(content, {'results': encode_results}).encode('utf-8')
+
+# =============================================================================
+# PLANIFICATEUR DE RÉÉVALUATION (asyncio, cadences par palier)
+# =============================================================================
+
+def parse_cadences(spec: str):
+    """"premium=3600,standard=21600" -> {palier: secondes}"""
+    cadences = {}
+    for item in spec.split(','):
+        if item.strip():
+            tier, seconds = item.split('=')
+            cadences[tier.strip()] = float(seconds)
+    return cadences
+
+
+SCHEDULER_ENABLED = os.environ.get("BADGES_SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_CADENCES = parse_cadences(
+    os.environ.get("BADGES_SCHEDULER_CADENCES", "premium=3600,standard=21600,basic=86400")
+)
+SCHEDULER_JITTER = float(os.environ.get("BADGES_SCHEDULER_JITTER", "0.1"))          # ± fraction de la cadence
+SCHEDULER_CONCURRENCY = int(os.environ.get("BADGES_SCHEDULER_CONCURRENCY", "2"))    # lots en parallèle
+SCHEDULER_BATCH_SIZE = int(os.environ.get("BADGES_SCHEDULER_BATCH_SIZE", "500"))
+SCHEDULER_MAX_RATE = float(os.environ.get("BADGES_SCHEDULER_MAX_RATE", "2000"))     # APIs/s, 0 = illimité
+SCHEDULER_PERSIST_INTERVAL = float(os.environ.get("BADGES_SCHEDULER_PERSIST_INTERVAL", "30"))
+SCHEDULER_IDLE_SLEEP = 1.0
+
+
+def scheduler_tier(badge_count: int):
+    """Palier de cadence (mêmes paliers que les commissions)"""
+    if badge_count >= 4:
+        return 'premium'
+    if badge_count >= 1:
+        return 'standard'
+    return 'basic'
+
+
+def stored_metrics(api_id: str, point):
+    """Dernier point stocké -> métriques au format /calculate-badges"""
+    metrics = {'api_id': api_id}
+    for field in METRIC_FIELDS:
+        metrics[field] = point[field].item()
+    metrics['timestamp'] = point['timestamp'].item()
+    return metrics
+
+
+def reevaluate_stored_apis(api_ids: list):
+    """
+    Réévaluation d'un lot d'APIs depuis le stockage (thread)
+    Dernier point = métriques courantes, évaluées contre l'historique qui
+    le précède (comme /calculate-badges et l'ingestion streaming)
+    Retourne ({api_id: nombre de badges}, erreurs)
+    """
+    metrics_list = []
+    for api_id in api_ids:
+        last = metrics_store.read_last(api_id, 1)
+        if len(last):
+            metrics_list.append(stored_metrics(api_id, last[0]))
+    if not metrics_list:
+        return {}, []
+
+    ids = [metrics['api_id'] for metrics in metrics_list]
+    sums, weights = aggregates.gather(ids, before_last=True)
+    source = PrecomputedAggregates(ids, sums, weights)
+    evaluated, errors = evaluate_bulk_items(
+        metrics_list, badge_engine, ColumnarBadgeEngine(badge_engine, source), source
+    )
+    badge_catalog.update_many(
+        ((metrics_list[index]['api_id'], metrics_list[index], badges) for index, badges in evaluated),
+        aggregate_source=source
+    )
+    return {metrics_list[index]['api_id']: len(badges) for index, badges in evaluated}, errors
+
+
+class ReevaluationScheduler:
+    """
+    Réévaluation périodique des APIs stockées, dans la boucle asyncio
+    - échéance par API : cadence du palier ± jitter ; premier passage
+      étalé sur la cadence par une phase stable dérivée de l'api_id
+    - APIs aux métriques modifiées (mark_changed) traitées en priorité
+    - lots exécutés sur l'exécuteur bulk, concurrence bornée, débit
+      plafonné (max_rate APIs/s)
+    - progression (dernier passage + palier) persistée périodiquement,
+      reprise au redémarrage
+    """
+
+    def __init__(self, state_path: str, cadences: dict = SCHEDULER_CADENCES, jitter: float = SCHEDULER_JITTER,
+                 concurrency: int = SCHEDULER_CONCURRENCY, batch_size: int = SCHEDULER_BATCH_SIZE,
+                 max_rate: float = SCHEDULER_MAX_RATE, persist_interval: float = SCHEDULER_PERSIST_INTERVAL):
+        self.state_path = state_path
+        self.cadences = cadences
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_rate = max_rate
+        self.persist_interval = persist_interval
+        self._lock = threading.Lock()
+        self._heap = []          # (échéance, api_id), entrées périmées ignorées
+        self._due = {}           # api_id -> échéance courante
+        self._changed = OrderedDict()  # api_id -> date du premier changement
+        self._progress = {}      # api_id -> [dernier passage, palier]
+        self._in_flight = set()
+        self._task = None
+        self._pace_until = 0.0
+        self._dirty = False
+        self._last_persist = 0.0
+        self._completed = deque()  # (monotonic, APIs) sur la dernière minute
+        self.evaluated = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error = None
+
+    # -- échéances ------------------------------------------------------------
+
+    def _cadence(self, tier: str):
+        return self.cadences.get(tier, max(self.cadences.values()))
+
+    def _phase(self, api_id: str):
+        """Fraction stable dans [0, 1) : étalement du premier passage"""
+        digest = hashlib.sha1(api_id.encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+    def _schedule(self, api_id: str, due: float):
+        self._due[api_id] = due
+        heapq.heappush(self._heap, (due, api_id))
+
+    def _next_due(self, last_run: float, tier: str):
+        cadence = self._cadence(tier)
+        return last_run + cadence * (1.0 + random.uniform(-self.jitter, self.jitter))
+
+    def track(self, api_ids, now: float = None):
+        """APIs connues sans échéance : premier passage étalé sur la cadence"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for api_id in api_ids:
+                if api_id in self._due:
+                    continue
+                progress = self._progress.get(api_id)
+                if progress is not None:
+                    self._schedule(api_id, self._next_due(*progress))
+                else:
+                    self._schedule(api_id, now + self._phase(api_id) * self._cadence('basic'))
+
+    def mark_changed(self, api_id: str):
+        """Nouvelles métriques non évaluées : passage prioritaire"""
+        with self._lock:
+            if api_id not in self._changed:
+                self._changed[api_id] = time.time()
+
+    def mark_evaluated(self, api_counts: dict, now: float = None):
+        """APIs évaluées hors planificateur (streaming) : échéance repoussée"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for api_id, badge_count in api_counts.items():
+                tier = scheduler_tier(badge_count)
+                self._progress[api_id] = [now, tier]
+                self._changed.pop(api_id, None)
+                self._schedule(api_id, self._next_due(now, tier))
+            self._dirty = True
+
+    def _take_batch(self, now: float):
+        """
+        Prioritaires d'abord, puis échéances dépassées
+        Prioritaire dont le lot est en cours (métriques arrivées pendant son
+        évaluation) : laissé en file, repris après la fin de ce lot
+        """
+        batch = []
+        with self._lock:
+            waiting = []
+            while self._changed and len(batch) < self.batch_size:
+                api_id, changed_at = self._changed.popitem(last=False)
+                if api_id in self._in_flight:
+                    waiting.append((api_id, changed_at))
+                else:
+                    batch.append(api_id)
+            for api_id, changed_at in reversed(waiting):
+                self._changed[api_id] = changed_at
+                self._changed.move_to_end(api_id, last=False)
+            while self._heap and len(batch) < self.batch_size and self._heap[0][0] <= now:
+                due, api_id = heapq.heappop(self._heap)
+                if self._due.get(api_id) != due or api_id in self._in_flight or api_id in batch:
+                    continue
+                batch.append(api_id)
+            self._in_flight.update(batch)
+        return batch
+
+    def _seconds_to_next(self, now: float):
+        with self._lock:
+            if any(api_id not in self._in_flight for api_id in self._changed):
+                return 0.0
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return SCHEDULER_IDLE_SLEEP
+            return min(SCHEDULER_IDLE_SLEEP, max(0.0, self._heap[0][0] - now))
+
+    def prune(self, api_ids):
+        """APIs absentes de api_ids (segments supprimés par la compaction) oubliées"""
+        known = set(api_ids)
+        with self._lock:
+            stale = [api_id for api_id in set(self._progress) | set(self._due) | set(self._changed)
+                     if api_id not in known]
+            for api_id in stale:
+                self._progress.pop(api_id, None)
+                self._due.pop(api_id, None)
+                self._changed.pop(api_id, None)
+            if stale:
+                self._dirty = True
+        return len(stale)
+
+    def _overdue(self, now: float):
+        """
+        (nombre, plus ancienne) des échéances dépassées, sans parcourir toutes les APIs :
+        seules les branches du tas dont la racine est <= now sont visitées
+        """
+        count, oldest = 0, None
+        pending = [0] if self._heap else []
+        while pending:
+            i = pending.pop()
+            due, api_id = self._heap[i]
+            if due > now:
+                continue
+            if self._due.get(api_id) == due:
+                count += 1
+                oldest = due if oldest is None else min(oldest, due)
+            pending.extend(child for child in (2 * i + 1, 2 * i + 2) if child < len(self._heap))
+        return count, oldest
+
+    # -- exécution ------------------------------------------------------------
+
+    async def _run_batch(self, batch: list, slots: asyncio.Semaphore):
+        loop = asyncio.get_running_loop()
+        try:
+            counts, errors = await loop.run_in_executor(bulk_executor, reevaluate_stored_apis, batch)
+            now = time.time()
+            with self._lock:
+                for api_id in batch:
+                    tier = scheduler_tier(counts.get(api_id, 0))
+                    self._progress[api_id] = [now, tier]
+                    self._schedule(api_id, self._next_due(now, tier))
+                self._in_flight.difference_update(batch)
+                self._dirty = True
+                self.evaluated += len(counts)
+                self.errors += len(errors)
+                self.batches += 1
+                self._completed.append((time.monotonic(), len(counts)))
+        except Exception as e:
+            with self._lock:
+                self._in_flight.difference_update(batch)
+                for api_id in batch:
+                    self._changed.setdefault(api_id, time.time())
+                self.errors += len(batch)
+                self.last_error = str(e)
+            await asyncio.sleep(SCHEDULER_IDLE_SLEEP)
+        finally:
+            slots.release()
+
+    async def _pace(self, count: int):
+        """Plafond de débit : count APIs "consomment" count / max_rate secondes"""
+        if self.max_rate <= 0:
+            return
+        now = time.monotonic()
+        wait = self._pace_until - now
+        self._pace_until = max(self._pace_until, now) + count / self.max_rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def run(self):
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        try:
+            while True:
+                await slots.acquire()
+                batch = self._take_batch(time.time())
+                if not batch:
+                    slots.release()
+                    await self._maybe_persist()
+                    await asyncio.sleep(self._seconds_to_next(time.time()) or 0.01)
+                    continue
+                await self._pace(len(batch))
+                task = asyncio.create_task(self._run_batch(batch, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                await self._maybe_persist()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def start(self):
+        if self._task is None:
+            self.load()
+            self.track(metrics_store.api_ids())
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is None:
+            # Jamais démarré (mode lazy arrêté avant le préchargement) : progression sauvegardée conservée
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.get_running_loop().run_in_executor(bulk_executor, self.persist)
+
+    # -- persistance ----------------------------------------------------------
+
+    def load(self):
+        """Progression sauvegardée -> échéances reprises au redémarrage"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self._progress = {api_id: list(progress) for api_id, progress in state.get('progress', {}).items()}
+            for api_id in state.get('changed', []):
+                self._changed.setdefault(api_id, time.time())
+        return True
+
+    def persist(self):
+        """Écriture atomique (fichier temporaire + os.replace)"""
+        with self._lock:
+            state = {
+                'version': 1,
+                'saved_at': time.time(),
+                'progress': dict(self._progress),
+                'changed': list(self._changed) + list(self._in_flight)
+            }
+            self._dirty = False
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        temporary = self.state_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file, separators=(',', ':'))
+        os.replace(temporary, self.state_path)
+        self._last_persist = time.monotonic()
+
+    async def _maybe_persist(self):
+        if self._dirty and time.monotonic() - self._last_persist >= self.persist_interval:
+            self._last_persist = time.monotonic()
+            await asyncio.get_running_loop().run_in_executor(bulk_executor, self.persist)
+
+    # -- statistiques ---------------------------------------------------------
+
+    def stats(self):
+        now = time.time()
+        horizon = time.monotonic() - 60.0
+        with self._lock:
+            while self._completed and self._completed[0][0] < horizon:
+                self._completed.popleft()
+            overdue, oldest_due = self._overdue(now)
+            oldest_change = next(iter(self._changed.values()), None)
+            tiers = {}
+            for _, tier in self._progress.values():
+                tiers[tier] = tiers.get(tier, 0) + 1
+            return {
+                "running": self._task is not None and not self._task.done(),
+                "tracked_apis": len(self._due),
+                "priority_queue": len(self._changed),
+                "due_queue": overdue,
+                "in_flight": len(self._in_flight),
+                "queue_lag_seconds": round(now - oldest_due, 3) if overdue else 0.0,
+                "priority_lag_seconds": round(now - oldest_change, 3) if oldest_change is not None else 0.0,
+                "throughput_per_s": round(sum(count for _, count in self._completed) / 60.0, 2),
+                "evaluated_total": self.evaluated,
+                "batches_total": self.batches,
+                "errors_total": self.errors,
+                "last_error": self.last_error,
+                "apis_per_tier": tiers,
+                "config": {
+                    "cadences_seconds": self.cadences,
+                    "jitter": self.jitter,
+                    "concurrency": self.concurrency,
+                    "batch_size": self.batch_size,
+                    "max_rate_per_s": self.max_rate
+                }
+            }
+
+# =============================================================================
+# SONDES SYNTHÉTIQUES (APIMonitor, HTTP/1.1 keep-alive sur asyncio)
+# =============================================================================
+
+MONITOR_MAX_CONCURRENCY = int(os.environ.get("BADGES_MONITOR_CONCURRENCY", "1000"))
+MONITOR_MAX_PER_HOST = int(os.environ.get("BADGES_MONITOR_PER_HOST", "16"))
+MONITOR_TIMEOUT = float(os.environ.get("BADGES_MONITOR_TIMEOUT", "5.0"))
+MONITOR_MAX_TARGETS = 10000
+MONITOR_MAX_BODY = 1024 * 1024
+
+# En-têtes de sécurité comptés dans security_score
+SECURITY_HEADERS = (
+    b'strict-transport-security', b'content-security-policy',
+    b'x-content-type-options', b'x-frame-options'
+)
+
+
+class ProbeSample:
+    """Résultat d'une sonde : statut HTTP (0 = échec réseau), latence, en-têtes de sécurité"""
+    __slots__ = ('status', 'latency_ms', 'error', 'secure', 'security_headers')
+
+    def __init__(self, status: int, latency_ms: float, error: Optional[str] = None,
+                 secure: bool = False, security_headers: int = 0):
+        self.status = status
+        self.latency_ms = latency_ms
+        self.error = error
+        self.secure = secure
+        self.security_headers = security_headers
+
+    @property
+    def available(self):
+        """Réponse obtenue et pas d'erreur serveur"""
+        return 0 < self.status < 500
+
+    @property
+    def failed(self):
+        return self.status == 0 or self.status >= 400
+
+
+class _HostPool:
+    """Connexions inactives réutilisables + limite de requêtes simultanées par hôte"""
+    __slots__ = ('idle', 'slots')
+
+    def __init__(self, limit: int):
+        self.idle = []
+        self.slots = asyncio.Semaphore(limit)
+
+
+def probe_metrics(api_id: str, samples: list, total_requests: int = None, active_users: int = 0):
+    """
+    Échantillons -> métriques au format create_api_metrics
+    uptime : réponses < 500 ; error_rate : échecs réseau + statuts >= 400 ;
+    latence moyenne des réponses obtenues ; security_score : 5 si
+    joignable, +2 en HTTPS, +0.75 par en-tête de sécurité
+    """
+    total = len(samples)
+    answered = [sample for sample in samples if sample.status > 0]
+    available = sum(1 for sample in samples if sample.available)
+    failed = sum(1 for sample in samples if sample.failed)
+    latency = sum(sample.latency_ms for sample in answered) / len(answered) if answered else MONITOR_TIMEOUT * 1000
+    security = 0.0
+    if answered:
+        best = max(answered, key=lambda sample: (sample.secure, sample.security_headers))
+        security = min(10.0, 5.0 + (2.0 if best.secure else 0.0) + 0.75 * best.security_headers)
+    return create_api_metrics(
+        api_id,
+        round(available / total * 100, 3) if total else 0.0,
+        round(latency, 3),
+        total if total_requests is None else total_requests,
+        round(failed / total * 100, 3) if total else 100.0,
+        active_users,
+        security
+    )
+
+
+class APIMonitor:
+    """
+    Moteur de sondes synthétiques
+    - client HTTP/1.1 minimal sur asyncio.open_connection, connexions
+      keep-alive réutilisées par (schéma, hôte, port)
+    - concurrence globale + limite par hôte (sémaphores)
+    - connexion réutilisée fermée côté serveur -> une nouvelle tentative
+    collect_metrics / collect_many : N sondes par cible -> create_api_metrics
+    """
+
+    def __init__(self, max_concurrency: int = MONITOR_MAX_CONCURRENCY, max_per_host: int = MONITOR_MAX_PER_HOST,
+                 timeout: float = MONITOR_TIMEOUT):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pools = {}
+        self._ssl_context = None
+        self.probes = 0
+        self.failures = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    @staticmethod
+    def _parse(url: str):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"unsupported url '{url}'")
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        default_port = port == (443 if secure else 80)
+        host_header = parts.hostname if default_port else f"{parts.hostname}:{port}"
+        return (parts.scheme, parts.hostname, port), host_header, path, secure
+
+    async def _open(self, key: tuple, secure: bool):
+        if secure and self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        self.connections_opened += 1
+        return await asyncio.open_connection(key[1], key[2], ssl=self._ssl_context if secure else None)
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection[1].close()
+        except Exception:
+            pass
+
+    async def _exchange(self, connection, request: bytes):
+        """Requête + lecture complète de la réponse -> (statut, en-têtes, keep-alive)"""
+        reader, writer = connection
+        writer.write(request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by peer")
+        version, status = status_line.split(b' ', 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.partition(b':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == b'HTTP/1.1' and headers.get(b'connection', b'').lower() != b'close'
+        if b'chunked' in headers.get(b'transfer-encoding', b'').lower():
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif b'content-length' in headers:
+            length = int(headers[b'content-length'])
+            if length > MONITOR_MAX_BODY:
+                keep_alive = False
+            else:
+                await reader.readexactly(length)
+        else:
+            keep_alive = False
+        return int(status), headers, keep_alive
+
+    async def probe(self, url: str):
+        """Une sonde GET ; les erreurs deviennent des échantillons en échec"""
+        try:
+            key, host_header, path, secure = self._parse(url)
+        except ValueError as e:
+            return ProbeSample(0, 0.0, str(e))
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _HostPool(self.max_per_host)
+        request = (
+            f"GET {path} HTTP/1.1\r\nHost: {host_header}\r\n"
+            "User-Agent: api-badges-monitor/1.0\r\nAccept: */*\r\nConnection: keep-alive\r\n\r\n"
+        ).encode('latin-1')
+
+        # Créneau de l'hôte d'abord : les sondes en attente d'un hôte lent ne
+        # retiennent aucun créneau global (les autres hôtes continuent)
+        async with pool.slots, self._slots:
+            self.probes += 1
+            started = time.perf_counter()
+            for attempt in range(2):
+                connection = pool.idle.pop() if pool.idle else None
+                reused = connection is not None
+                try:
+                    if connection is None:
+                        connection = await asyncio.wait_for(self._open(key, secure), self.timeout)
+                    else:
+                        self.connections_reused += 1
+                    status, headers, keep_alive = await asyncio.wait_for(
+                        self._exchange(connection, request), self.timeout
+                    )
+                except (OSError, EOFError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                    if connection is not None:
+                        self._close(connection)
+                    # Connexion keep-alive fermée entre-temps : nouvel essai
+                    if reused and attempt == 0 and not isinstance(e, asyncio.TimeoutError):
+                        started = time.perf_counter()
+                        continue
+                    self.failures += 1
+                    return ProbeSample(0, (time.perf_counter() - started) * 1000, f"{type(e).__name__}: {e}")
+
+                latency_ms = (time.perf_counter() - started) * 1000
+                if keep_alive:
+                    pool.idle.append(connection)
+                else:
+                    self._close(connection)
+                if status >= 400:
+                    self.failures += 1
+                return ProbeSample(
+                    status, latency_ms, secure=secure,
+                    security_headers=sum(1 for header in SECURITY_HEADERS if header in headers)
+                )
+
+    async def collect_metrics(self, api_id: str, url: str, probes: int = 5,
+                              total_requests: int = None, active_users: int = 0, samples_by_api: dict = None):
+        """
+        N sondes successives (connexion réutilisée) -> métriques create_api_metrics
+        samples_by_api : reçoit api_id -> échantillons ProbeSample bruts
+        """
+        samples = [await self.probe(url) for _ in range(probes)]
+        if samples_by_api is not None:
+            samples_by_api[api_id] = samples
+        return probe_metrics(api_id, samples, total_requests, active_users)
+
+    async def collect_many(self, targets: list, probes: int = 5, samples_by_api: dict = None):
+        """Toutes les cibles en parallèle : {api_id, url, total_requests?, active_users?}"""
+        return await asyncio.gather(*(
+            self.collect_metrics(
+                target['api_id'], target['url'], probes,
+                target.get('total_requests'), target.get('active_users', 0), samples_by_api
+            )
+            for target in targets
+        ))
+
+    async def close(self):
+        for pool in self._pools.values():
+            while pool.idle:
+                self._close(pool.idle.pop())
+
+    def stats(self):
+        return {
+            "probes": self.probes,
+            "failures": self.failures,
+            "hosts": len(self._pools),
+            "idle_connections": sum(len(pool.idle) for pool in self._pools.values()),
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+            "max_per_host": self.max_per_host,
+            "timeout_seconds": self.timeout
+        }
+
+_api_monitor = None
+
+
+def _probe_url_valid(url: str) -> bool:
+    try:
+        APIMonitor._parse(url)
+        return True
+    except ValueError:
+        return False
+
+
+def get_api_monitor():
+    """Moniteur de la boucle courante (sémaphores et connexions liés à la boucle)"""
+    global _api_monitor
+    loop = asyncio.get_running_loop()
+    if _api_monitor is None or _api_monitor[0] is not loop:
+        _api_monitor = (loop, APIMonitor())
+    return _api_monitor[1]
+
+
+def _probe_counts_valid(target: dict):
+    """total_requests / active_users optionnels d'une cible : mêmes contraintes que validate_metrics_data"""
+    for field, types, lower, upper, _, _ in FIELD_CONSTRAINTS:
+        if field in ('total_requests', 'active_users') and target.get(field) is not None:
+            value = target[field]
+            if not isinstance(value, types) or not lower <= value <= upper:
+                return False
+    return True
+
+
+def record_probe_results(metrics_list: list, samples_by_api: dict = None):
+    """
+    Métriques sondées -> historique, sketches de latence, rollups de
+    disponibilité, réévaluation prioritaire
+    Toutes les métriques validées avant la première écriture
+    """
+    samples_by_api = samples_by_api or {}
+    for metrics in metrics_list:
+        validate_metrics_data(metrics)
+    for metrics in metrics_list:
+        api_id = metrics['api_id']
+        samples = samples_by_api.get(api_id)
+        if samples:
+            latencies = [sample.latency_ms for sample in samples if sample.status > 0]
+            if latencies:
+                latency_sketches.add_samples(api_id, latencies)
+            uptime_rollups.add(
+                api_id, len(samples),
+                sum(1 for sample in samples if sample.available),
+                sum(1 for sample in samples if sample.failed)
+            )
+        record_metrics(api_id, [metrics])
+        reevaluation_scheduler.mark_changed(api_id)
+
+# =============================================================================
+# DÉMARRAGE RAPIDE (mode lazy, réponses pré-encodées, artefacts)
+# =============================================================================
+
+# eager : stockages rechargés au démarrage ; lazy : au premier usage (serverless, scale-to-zero)
+STARTUP_MODE = os.environ.get("BADGES_STARTUP_MODE", "eager")
+# Mode lazy : préchargement en arrière-plan + planificateur après ce délai (secondes)
+LAZY_WARMUP_DELAY = float(os.environ.get("BADGES_LAZY_WARMUP_DELAY", "5"))
+# Règles + réponses statiques pré-encodées, rechargées à l'import (eager et lazy)
+STARTUP_ARTIFACTS_PATH = os.environ.get("BADGES_STARTUP_ARTIFACTS", os.path.join(DATA_DIR, "startup_artifacts.json"))
+STARTUP_ARTIFACTS_FORMAT = 2
+
+
+def builtin_rules_digest():
+    """Empreinte des règles intégrées au code : un artefact écrit par une autre version est ignoré"""
+    encoded = json.dumps(BadgeCalculationEngine().badge_rules, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class LazyComponent:
+    """
+    Composant construit au premier accès à l'un de ses attributs (mode lazy)
+    - construction unique sous verrou (threads du pool bulk compris)
+    - le proxy reste la référence unique du composant (variable globale,
+      `from app import`, agrégats et métriques dérivées qui l'ont capturé) :
+      les attributs sont lus sur l'objet construit, resolve() le retourne
+    """
+
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+        self.load_seconds = None
+
+    def resolve(self):
+        target = self._target
+        if target is None:
+            with self._lock:
+                if self._target is None:
+                    started = time.perf_counter()
+                    self._target = self._factory()
+                    self.load_seconds = time.perf_counter() - started
+                target = self._target
+        return target
+
+    @property
+    def resolved(self):
+        return self._target is not None
+
+    def __getattr__(self, name: str):
+        return getattr(self.resolve(), name)
+
+
+def load_component(component, path: str):
+    """Composant neuf + rechargement de son fichier sauvegardé"""
+    component.load(path)
+    return component
+
+
+def is_loaded(component):
+    """Faux pour un composant lazy jamais utilisé (rien à sauvegarder)"""
+    return not isinstance(component, LazyComponent) or component.resolved
+
+
+class PrecomputedResponses:
+    """
+    Corps JSON statiques pré-encodés (/badge-rules, préfixe de /demo-data)
+    Clé : version des règles + paramètres de commission ; ré-encodés
+    seulement quand elle change, installables depuis les artefacts de démarrage
+    """
+
+    def __init__(self):
+        self._key = None
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.installed = 0
+
+    @staticmethod
+    def current_key():
+        return (
+            badge_engine.rules_version,
+            commission_calc.base_commission, commission_calc.max_commission, commission_calc.badge_bonus_per_badge
+        )
+
+    def get(self, name: str, build):
+        key = self.current_key()
+        with self._lock:
+            if key != self._key:
+                self._key = key
+                self._bodies = {}
+            body = self._bodies.get(name)
+            if body is not None:
+                self.hits += 1
+                return body
+        body = build()
+        with self._lock:
+            if key == self._key:
+                self._bodies[name] = body
+            self.builds += 1
+        return body
+
+    def export(self):
+        with self._lock:
+            return list(self._key or ()), {name: body.decode('utf-8') for name, body in self._bodies.items()}
+
+    def install(self, key: list, bodies: dict):
+        """Corps d'un artefact : ignorés si la clé ne correspond plus (règles ou commission modifiées)"""
+        if tuple(key) != self.current_key():
+            return 0
+        with self._lock:
+            self._key = tuple(key)
+            self._bodies = {name: body.encode('utf-8') for name, body in bodies.items()}
+            self.installed = len(self._bodies)
+        return self.installed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "responses": sorted(self._bodies),
+                "hits": self.hits,
+                "builds": self.builds,
+                "installed_from_artifacts": self.installed
+            }
+
+
+def write_startup_artifacts(path: str = STARTUP_ARTIFACTS_PATH):
+    """
+    Artefacts de démarrage : règles + versions (plan recompilé au chargement,
+    quelques dizaines de µs) et réponses statiques pré-encodées
+    Écriture atomique (fichier temporaire + os.replace)
+    """
+    for name, build in STATIC_RESPONSES.items():
+        precomputed_responses.get(name, build)
+    key, bodies = precomputed_responses.export()
+    artifacts = {
+        "format": STARTUP_ARTIFACTS_FORMAT,
+        "written_at": get_current_timestamp(),
+        "builtin_rules": builtin_rules_digest(),
+        "rules": {
+            "badge_rules": badge_engine.badge_rules,
+            "rules_version": badge_engine.rules_version,
+            "badge_versions": badge_engine.badge_versions
+        },
+        "commission": {parameter: getattr(commission_calc, parameter) for parameter in COMMISSION_PARAMETERS},
+        "responses": {"key": key, "bodies": bodies}
+    }
+    encoded = _dumps(artifacts).encode('utf-8')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(encoded)
+    os.replace(tmp_path, path)
+    return {
+        "path": path,
+        "bytes": len(encoded),
+        "rules_version": badge_engine.rules_version,
+        "responses": sorted(bodies)
+    }
+
+
+def load_startup_artifacts(path: str = STARTUP_ARTIFACTS_PATH):
+    """
+    Artefacts -> règles (mêmes numéros de version) + réponses pré-encodées
+    Appliqués dans les deux modes de démarrage (mêmes règles en eager et en lazy)
+    Ignorés si absents, d'un autre format, écrits avec d'autres paramètres de
+    commission ou par un code dont les règles intégrées diffèrent
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            artifacts = json.load(f)
+    except (OSError, ValueError):
+        return False
+    commission = {parameter: getattr(commission_calc, parameter) for parameter in COMMISSION_PARAMETERS}
+    if (artifacts.get("format") != STARTUP_ARTIFACTS_FORMAT or artifacts.get("commission") != commission
+            or artifacts.get("builtin_rules") != builtin_rules_digest()):
+        return False
+    rules = artifacts["rules"]
+    badge_engine.load_rules(rules["badge_rules"], rules["rules_version"], rules["badge_versions"])
+    precomputed_responses.install(artifacts["responses"]["key"], artifacts["responses"]["bodies"])
+    return True
+
+# =============================================================================
+# INSTANCES GLOBALES
+# =============================================================================
+
+badge_engine = BadgeCalculationEngine()
+commission_calc = CommissionCalculator()
+LATENCY_SKETCH_PATH = os.path.join(DATA_DIR, "latency_sketches.json")
+UPTIME_ROLLUP_PATH = os.path.join(DATA_DIR, "uptime_rollups.npz")
+if STARTUP_MODE == 'lazy':
+    metrics_store = LazyComponent('metrics_store', lambda: MetricsStore(os.path.join(DATA_DIR, 'timeseries')))
+    latency_sketches = LazyComponent(
+        'latency_sketches', lambda: load_component(LatencySketchStore(), LATENCY_SKETCH_PATH)
+    )
+    uptime_rollups = LazyComponent('uptime_rollups', lambda: load_component(UptimeRollups(), UPTIME_ROLLUP_PATH))
+else:
+    metrics_store = MetricsStore(os.path.join(DATA_DIR, 'timeseries'))
+    latency_sketches = LatencySketchStore()
+    uptime_rollups = UptimeRollups()
+LAZY_COMPONENTS = [component for component in (metrics_store, latency_sketches, uptime_rollups)
+                   if isinstance(component, LazyComponent)]
+aggregates = DecayedAggregates(metrics_store)
+metric_ranks = MetricRanks()
+growth_tracker = GrowthTracker(metric_ranks)
+GROWTH_PATH = os.path.join(DATA_DIR, "user_growth.npz")
+badge_engine.derived_source = DerivedMetrics(latency_sketches, uptime_rollups, growth_tracker)
+badge_engine.rank_source = metric_ranks
+columnar_engine = ColumnarBadgeEngine(badge_engine, aggregates)
+badge_cache = BadgeResultCache()
+request_coalescer = RequestCoalescer()
+badge_catalog = BadgeCatalog(aggregates)
+badge_catalog.ranks = metric_ranks
+evaluation_state = EvaluationState(badge_engine, columnar_engine, aggregates, badge_catalog, commission_calc)
+perf_metrics = PerformanceMetrics()
+badge_encoder = BadgeJSONEncoder()
+reevaluation_scheduler = ReevaluationScheduler(os.path.join(DATA_DIR, "scheduler_state.json"))
+precomputed_responses = PrecomputedResponses()
+startup_artifacts_loaded = load_startup_artifacts()
+slow_profiler = SlowRequestProfiler(PROFILE_SLOW_MS, PROFILE_INTERVAL_MS)
+app.add_middleware(RequestTimingMiddleware)
+
+# Exécuteur dédié aux gros lots /bulk-calculate et à la compaction
+BULK_OFFLOAD_THRESHOLD = int(os.environ.get("BADGES_BULK_OFFLOAD_THRESHOLD", "256"))
+bulk_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("BADGES_BULK_EXECUTOR_WORKERS", "2")),
+    thread_name_prefix="bulk-badges"
+)
+
+# Exécuteur des calculs unitaires non servis par le cache (rejeu disque compris)
+calculation_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("BADGES_CALC_EXECUTOR_WORKERS", "4")),
+    thread_name_prefix="calc-badges"
+)
+
+# =============================================================================
+# SHARDING MULTI-PROCESSUS (/bulk-calculate, très gros lots)
+# =============================================================================
+
+# Nombre de processus workers (1 = désactivé) et taille minimale de lot
+BULK_PROCESS_WORKERS = int(os.environ.get("BADGES_BULK_WORKERS", str(os.cpu_count() or 1)))
+BULK_PARALLEL_THRESHOLD = int(os.environ.get("BADGES_BULK_PARALLEL_THRESHOLD", "20000"))
+
+_bulk_process_pool = None
+_bulk_process_pool_lock = threading.Lock()
+_worker_state = {}
+
+
+class PrecomputedDerived:
+    """Métriques dérivées figées envoyées à un worker (même interface que DerivedMetrics)"""
+
+    def __init__(self, api_ids: list, values):
+        self._rows = {api_id: row for row, api_id in enumerate(api_ids)}
+        self._values = values
+
+    def derived_values(self, api_id: str):
+        return tuple(self._values[self._rows[api_id]].tolist())
+
+    def gather(self, api_ids: list):
+        rows = np.fromiter((self._rows[api_id] for api_id in api_ids), dtype=np.int64, count=len(api_ids))
+        return self._values[rows]
+
+
+class PrecomputedAggregates:
+    """Agrégats figés envoyés à un worker (même interface get/gather que DecayedAggregates)"""
+
+    def __init__(self, api_ids: list, sums, weights):
+        self._rows = {api_id: row for row, api_id in enumerate(api_ids)}
+        self._sums = sums
+        self._weights = weights
+
+    def get(self, api_id: str):
+        row = self._rows[api_id]
+        return self._sums[row].tolist(), float(self._weights[row])
+
+    def gather(self, api_ids: list):
+        rows = np.fromiter((self._rows[api_id] for api_id in api_ids), dtype=np.int64, count=len(api_ids))
+        return self._sums[rows], self._weights[rows]
+
+
+def get_bulk_process_pool():
+    """Pool créé au premier gros lot ; spawn pour ne pas forker les threads du serveur"""
+    global _bulk_process_pool
+    with _bulk_process_pool_lock:
+        if _bulk_process_pool is None:
+            _bulk_process_pool = ProcessPoolExecutor(
+                max_workers=BULK_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_bulk_worker
+            )
+        return _bulk_process_pool
+
+
+def reset_bulk_process_pool(pool):
+    """Pool cassé (worker tué) -> recréé au prochain gros lot"""
+    global _bulk_process_pool
+    with _bulk_process_pool_lock:
+        if _bulk_process_pool is not pool:
+            return
+        _bulk_process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _init_bulk_worker():
+    """Instances propres à chaque worker"""
+    _worker_state['engine'] = BadgeCalculationEngine()
+    _worker_state['rules_version'] = None
+
+
+def _bulk_worker_run(row_ids: list, values, api_ids: list, sums, weights,
+                     rules_version: int, badge_rules: dict, derived=None, ranks=None):
+    """
+    Évaluation d'un fragment en colonnes dans un worker
+    row_ids + values : lignes éligibles (api_id, matrice float64 lignes x METRIC_FIELDS)
+    api_ids : api_id distincts du fragment, ordre de sums/weights/derived
+    derived : métriques dérivées des api_ids si le plan en dépend
+    ranks : populations classées figées (FrozenRanks) si le plan a des critères de rang
+    Retourne (badge_ids du plan, confiances [badges x lignes], NaN = non attribué)
+    """
+    engine = _worker_state['engine']
+    if _worker_state['rules_version'] != rules_version:
+        engine.badge_rules = badge_rules
+        _worker_state['rules_version'] = rules_version
+    engine.derived_source = PrecomputedDerived(api_ids, derived) if derived is not None else None
+    engine.rank_source = ranks
+
+    columnar = ColumnarBadgeEngine(engine, PrecomputedAggregates(api_ids, sums, weights))
+    columns = {field: values[:, k] for k, field in enumerate(METRIC_FIELDS)}
+    plan, confidences = columnar.calculate_columns(row_ids, columns, np.ones(len(row_ids), dtype=bool))
+    return [badge_id for badge_id, _, _, _ in plan.badges], confidences
+
+
+def bulk_worker_ranks(engine: BadgeCalculationEngine, api_ids: list):
+    """Populations classées figées une fois pour tout le lot (None sans critère de rang)"""
+    if engine.rule_plan.uses_ranks and engine.rank_source:
+        return engine.rank_source.frozen(api_ids)
+    return None
+
+
+def submit_bulk_columns(pool, state: EvaluationState, row_ids: list, values, rule_configs: dict,
+                        rules_version: int, ranks=None):
+    """
+    Fragment en colonnes soumis au pool (None si le pool est cassé)
+    Agrégats, dérivées et buckets de rang propres aux api_id du fragment
+    """
+    api_ids = list(dict.fromkeys(row_ids))
+    sums, weights = state.aggregates.gather(api_ids)
+    derived = state.engine.gather_derived(api_ids) if state.engine.rule_plan.uses_derived else None
+    try:
+        return pool.submit(
+            _bulk_worker_run, row_ids, values, api_ids, sums, weights,
+            rules_version, rule_configs, derived,
+            ranks.frozen(api_ids) if ranks is not None else None
+        )
+    except BrokenProcessPool:
+        return None
+
+
+def parallel_calculate_columns(api_ids: list, columns: dict, eligible, timings: dict,
+                               state: EvaluationState):
+    """
+    Équivalent de ColumnarBadgeEngine.calculate_columns réparti sur le pool
+    de processus (lot binaire) ; fragment en échec -> calcul en processus
+    """
+    engine = state.engine
+    plan = engine.rule_plan
+    rule_configs = dict(engine.badge_rules)
+    rules_version = engine.rules_version
+    started = time.perf_counter()
+    rows = np.flatnonzero(eligible)
+    confidences = np.full((len(plan.badges), len(api_ids)), np.nan)
+    if len(rows) == 0:
+        return plan, confidences
+
+    chunk_size = -(-len(rows) // (BULK_PROCESS_WORKERS * 2))
+    row_ids = [api_ids[i] for i in rows.tolist()]
+    ranks = bulk_worker_ranks(engine, list(dict.fromkeys(row_ids)))
+    values = np.column_stack([columns[field][rows] for field in METRIC_FIELDS])
+    pool = get_bulk_process_pool()
+    shards = [
+        (start, submit_bulk_columns(
+            pool, state, row_ids[start:start + chunk_size], values[start:start + chunk_size],
+            rule_configs, rules_version, ranks
+        ))
+        for start in range(0, len(rows), chunk_size)
+    ]
+
+    positions = {badge_id: b for b, (badge_id, _, _, _) in enumerate(plan.badges)}
+    for start, future in shards:
+        chunk_rows = rows[start:start + chunk_size]
+        try:
+            if future is None:
+                raise BrokenProcessPool("bulk worker pool unavailable")
+            badge_ids, block = future.result()
+            confidences[np.ix_([positions[badge_id] for badge_id in badge_ids], chunk_rows)] = block
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                reset_bulk_process_pool(pool)
+            _, block = state.columnar.calculate_columns(
+                row_ids[start:start + chunk_size],
+                {field: columns[field][chunk_rows] for field in METRIC_FIELDS},
+                np.ones(len(chunk_rows), dtype=bool)
+            )
+            confidences[:, chunk_rows] = block
+
+    add_timing(timings, 'rule_evaluation', started)
+    return plan, confidences
+
+
+def parallel_bulk_calculation(api_metrics_list: list, state: EvaluationState):
+    """
+    Lot découpé en fragments contigus répartis sur le pool de processus
+    Fragments envoyés en colonnes (load_columns) ; lignes non éligibles au
+    calcul vectorisé évaluées ici par le chemin scalaire pendant les workers
+    Fusion dans l'ordre d'origine ; fragment en échec -> repli en processus
+    """
+    engine = state.engine
+    n = len(api_metrics_list)
+    chunk_size = -(-n // (BULK_PROCESS_WORKERS * 2))
+    rule_configs = dict(engine.badge_rules)
+    rules_version = engine.rules_version
+    templates = {badge_id: template for badge_id, template, _, _ in engine.rule_plan.badges}
+    ranks = bulk_worker_ranks(engine, list(dict.fromkeys(
+        m['api_id'] for m in api_metrics_list if isinstance(m.get('api_id'), str)
+    )))
+    earned_at = get_current_timestamp()
+    commissions = {}
+
+    def commission_for(count: int):
+        if count not in commissions:
+            commissions[count] = state.commission.calculate_commission_impact(count)
+        return commissions[count]
+
+    pool = get_bulk_process_pool()
+
+    shards = []
+    for offset in range(0, n, chunk_size):
+        chunk = api_metrics_list[offset:offset + chunk_size]
+        columns, eligible = state.columnar.load_columns(chunk)
+        rows = np.flatnonzero(eligible)
+        row_ids = [chunk[i]['api_id'] for i in rows.tolist()]
+        values = np.column_stack([columns[field][rows] for field in METRIC_FIELDS])
+        future = submit_bulk_columns(pool, state, row_ids, values, rule_configs, rules_version, ranks)
+        shards.append((offset, chunk, rows, future))
+
+    # Lignes non éligibles : chemin scalaire (mêmes messages d'erreur) pendant les workers
+    scalar = {}
+    for offset, chunk, rows, _ in shards:
+        ineligible = np.ones(len(chunk), dtype=bool)
+        ineligible[rows] = False
+        for i in np.flatnonzero(ineligible).tolist():
+            scalar[offset + i] = evaluate_bulk_items(
+                [chunk[i]], engine, state.columnar, state.aggregates, offset + i, earned_at=earned_at
+            )
+
+    results = []
+    validation_errors = []
+    for offset, chunk, rows, future in shards:
+        try:
+            if future is None:
+                raise BrokenProcessPool("bulk worker pool unavailable")
+            badge_ids, confidences = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                reset_bulk_process_pool(pool)
+            evaluated, errors = evaluate_bulk_items(
+                chunk, engine, state.columnar, state.aggregates, offset, earned_at=earned_at
+            )
+            for index, badges in evaluated:
+                results.append(bulk_result_entry(
+                    api_metrics_list[index]['api_id'], badges, commission_for(len(badges))
+                ))
+            validation_errors.extend(errors)
+            continue
+
+        awarded = {}
+        for r, i in enumerate(rows.tolist()):
+            column = confidences[:, r]
+            awarded[offset + i] = [
+                BadgeAward(templates[badge_ids[b]], float(column[b]), earned_at)
+                for b in np.flatnonzero(~np.isnan(column)).tolist()
+            ]
+        for index in range(offset, offset + len(chunk)):
+            if index in awarded:
+                evaluated, errors = [(index, awarded[index])], ()
+            else:
+                evaluated, errors = scalar[index]
+            for _, badges in evaluated:
+                results.append(bulk_result_entry(
+                    api_metrics_list[index]['api_id'], badges, commission_for(len(badges))
+                ))
+            validation_errors.extend(errors)
+
+    return results, validation_errors
+
+# =============================================================================
+# SNAPSHOT PARTAGÉ (fichier mmap en lecture seule, un écrivain, N lecteurs)
+# =============================================================================
+
+# standalone : processus unique (défaut) ; writer : état + publication du
+# snapshot ; reader : lectures et calculs depuis le snapshot mappé
+PROCESS_ROLE = os.environ.get("BADGES_ROLE", "standalone")
+if PROCESS_ROLE not in ('standalone', 'writer', 'reader'):
+    raise ValueError(f"BADGES_ROLE must be standalone, writer or reader, got '{PROCESS_ROLE}'")
+SNAPSHOT_PATH = os.environ.get("BADGES_SNAPSHOT_PATH", os.path.join(DATA_DIR, "badges.snapshot"))
+# Écrivain : publication au plus toutes les N secondes si l'état a changé
+SNAPSHOT_INTERVAL = float(os.environ.get("BADGES_SNAPSHOT_INTERVAL", "2.0"))
+# Lecteur : vérification d'une nouvelle version (stat du fichier)
+SNAPSHOT_POLL = float(os.environ.get("BADGES_SNAPSHOT_POLL", "0.5"))
+# Adresse de l'écrivain pour les requêtes d'écriture reçues par un lecteur
+WRITER_URL = os.environ.get("BADGES_WRITER_URL", "")
+WRITER_PORT = int(os.environ.get("BADGES_WRITER_PORT", "8001"))
+# Lecteur : envoi à l'écrivain des lignes de catalogue évaluées (période, file bornée)
+FORWARD_INTERVAL = float(os.environ.get("BADGES_FORWARD_INTERVAL", "0.5"))
+FORWARD_MAX_ROWS = int(os.environ.get("BADGES_FORWARD_MAX_ROWS", "200000"))
+
+# magic, longueur d'en-tête (u64), en-tête JSON, tableaux alignés
+SNAPSHOT_MAGIC = b'BADGSNP1'
+SNAPSHOT_ALIGN = 64
+
+
+def _align(offset: int):
+    return -(-offset // SNAPSHOT_ALIGN) * SNAPSHOT_ALIGN
+
+
+def write_snapshot(path: str, meta: dict, arrays: dict):
+    """
+    Écriture dans un fichier temporaire puis os.replace : les lecteurs voient
+    l'ancienne ou la nouvelle version, jamais un fichier partiel ; un
+    mapping existant reste valide (ancien inode) jusqu'à sa libération
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = arrays[name] = np.ascontiguousarray(array)
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset = _align(offset + array.nbytes)
+    header = json.dumps(dict(meta, arrays=layout), separators=(',', ':')).encode()
+    data_start = _align(len(SNAPSHOT_MAGIC) + 8 + len(header))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + struct.pack('<Q', len(header)) + header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][2])
+            f.write(array.data if array.size else b'')
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return data_start + offset
+
+
+def snapshot_identity(path: str):
+    """(inode, mtime, taille) : change à chaque publication"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class MappedSnapshot:
+    """Snapshot mappé en lecture seule : tableaux NumPy sur le mapping (aucune copie)"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a badges snapshot")
+        header_length = struct.unpack_from('<Q', self._map, len(SNAPSHOT_MAGIC))[0]
+        header_start = len(SNAPSHOT_MAGIC) + 8
+        self.meta = json.loads(self._map[header_start:header_start + header_length])
+        data_start = _align(header_start + header_length)
+        self.arrays = {
+            name: np.frombuffer(
+                self._map, dtype=np.dtype(dtype), count=int(np.prod(shape, dtype=np.int64)),
+                offset=data_start + offset
+            ).reshape(shape)
+            for name, (dtype, shape, offset) in self.meta.pop('arrays').items()
+        }
+        self.size = stat.st_size
+
+
+class SnapshotTable:
+    """
+    Agrégats historiques et métriques dérivées par API lus dans le snapshot
+    (rangs : FrozenRanks.from_arrays sur les mêmes tableaux)
+    api_ids triés : recherche dichotomique sur le tableau mappé, sans dict
+    par processus ; même interface get / gather que DecayedAggregates
+    """
+
+    def __init__(self, arrays: dict):
+        self._ids = arrays['api_ids']
+        self._sums = arrays['sums']
+        self._weights = arrays['weights']
+        self._derived = arrays['derived']
+        self.derived = SnapshotDerived(self)
+
+    def rows(self, api_ids: list):
+        """Lignes des api_ids (-1 si absent du snapshot)"""
+        keys = np.array([api_id.encode() for api_id in api_ids], dtype=bytes)
+        if len(self._ids) == 0 or len(keys) == 0:
+            return np.full(len(api_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._ids, keys), len(self._ids) - 1)
+        return np.where(self._ids[positions] == keys, positions, -1)
+
+    def get(self, api_id: str):
+        row = self.rows([api_id])[0]
+        if row < 0:
+            return [0.0] * len(WEIGHTED_FIELDS), 0.0
+        return self._sums[row].tolist(), float(self._weights[row])
+
+    def gather(self, api_ids: list):
+        rows = self.rows(api_ids)
+        found = rows >= 0
+        sums = np.where(found[:, None], self._sums[rows], 0.0) if len(self._sums) else np.zeros((len(rows), len(WEIGHTED_FIELDS)))
+        weights = np.where(found, self._weights[rows], 0.0) if len(self._weights) else np.zeros(len(rows))
+        return sums, weights
+
+
+class SnapshotDerived:
+    """Métriques dérivées du snapshot (même interface que DerivedMetrics)"""
+
+    def __init__(self, table: SnapshotTable):
+        self.table = table
+
+    def derived_values(self, api_id: str):
+        return tuple(self.gather([api_id])[0].tolist())
+
+    def gather(self, api_ids: list):
+        table = self.table
+        rows = table.rows(api_ids)
+        values = np.tile(np.array(MISSING_DERIVED), (len(api_ids), 1))
+        found = rows >= 0
+        values[found] = table._derived[rows[found]]
+        return values
+
+
+def build_snapshot():
+    """État courant de l'écrivain -> (méta, tableaux) ; copies prises sous les verrous"""
+    catalog_meta, arrays, catalog_rows = badge_catalog.snapshot_arrays()
+    derived_source = badge_engine.derived_source
+    api_ids = sorted(set(metrics_store.api_ids()) | set(catalog_rows) | derived_source.api_ids())
+    sums, weights = aggregates.gather(api_ids)
+    arrays.update({
+        'api_ids': np.array([api_id.encode() for api_id in api_ids] or [b''], dtype=bytes)[:len(api_ids)],
+        'sums': sums,
+        'weights': weights,
+        'derived': derived_source.gather(api_ids).reshape(len(api_ids), len(DERIVED_FIELDS)),
+    })
+    arrays.update(badge_engine.rank_source.frozen(api_ids).arrays())
+    meta = {
+        "published_at": time.time(),
+        "rules": {
+            "badge_rules": badge_engine.badge_rules,
+            "rules_version": badge_engine.rules_version,
+            "badge_versions": badge_engine.badge_versions,
+            "commission": [
+                commission_calc.base_commission,
+                commission_calc.max_commission,
+                commission_calc.badge_bonus_per_badge
+            ]
+        },
+        "catalog": catalog_meta,
+        "apis": len(api_ids)
+    }
+    return meta, arrays
+
+
+class SnapshotPublisher:
+    """
+    Écrivain : republie le snapshot quand l'état change (catalogue, règles,
+    historique, sketches, rollups), au plus toutes les interval secondes
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH, interval: float = SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._task = None
+        self._published_state = None
+        self.publications = 0
+        self.last = None
+
+    def state(self):
+        return (
+            badge_catalog.version, badge_engine.rules_version, aggregates.updates,
+            latency_sketches.merges, uptime_rollups.observations, metric_ranks.version,
+            commission_calc.base_commission, commission_calc.max_commission, commission_calc.badge_bonus_per_badge
+        )
+
+    def publish(self):
+        started = time.perf_counter()
+        state = self.state()
+        meta, arrays = build_snapshot()
+        size = write_snapshot(self.path, meta, arrays)
+        self._published_state = state
+        self.publications += 1
+        self.last = {
+            "published_at": meta["published_at"],
+            "apis": meta["apis"],
+            "catalog_size": meta["catalog"]["size"],
+            "catalog_version": meta["catalog"]["version"],
+            "rules_version": meta["rules"]["rules_version"],
+            "bytes": size,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+        return self.last
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.state() != self._published_state:
+                try:
+                    await loop.run_in_executor(bulk_executor, self.publish)
+                except Exception as e:
+                    print(f"⚠️ snapshot publication failed: {e}", file=sys.stderr)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(bulk_executor, self.publish)
+
+    def stats(self):
+        return {"path": self.path, "interval_seconds": self.interval,
+                "publications": self.publications, "last": self.last}
+
+
+def install_snapshot(snapshot: MappedSnapshot):
+    """
+    Lecteur : bascule sur une nouvelle version (règles, agrégats, dérivées,
+    catalogue). Le nouvel état est construit à part (l'ancien n'est jamais
+    modifié) puis publié par une seule affectation de evaluation_state :
+    les calculs en cours, y compris sur bulk_executor, finissent avec
+    l'ancien état et l'ancien mapping
+    """
+    global evaluation_state, badge_engine, commission_calc, aggregates, columnar_engine, badge_catalog
+    rules = snapshot.meta['rules']
+    engine = BadgeCalculationEngine()
+    engine.load_rules(rules['badge_rules'], rules['rules_version'], rules['badge_versions'])
+    commission = CommissionCalculator()
+    commission.base_commission, commission.max_commission, commission.badge_bonus_per_badge = rules['commission']
+
+    table = SnapshotTable(snapshot.arrays)
+    engine.derived_source = table.derived
+    engine.rank_source = FrozenRanks.from_arrays(snapshot.arrays, table)
+    catalog = BadgeCatalog.from_snapshot(snapshot.meta['catalog'], snapshot.arrays)
+    catalog.forward = catalog_forwarder.submit
+    state = EvaluationState(engine, ColumnarBadgeEngine(engine, table), table, catalog, commission)
+
+    evaluation_state = state
+    # Références individuelles (lectures ponctuelles des autres endpoints)
+    badge_engine, commission_calc, aggregates = state.engine, state.commission, state.aggregates
+    columnar_engine, badge_catalog = state.columnar, state.catalog
+    badge_cache.clear()
+
+
+class SnapshotReader:
+    """Lecteur : vérifie l'identité du fichier toutes les poll secondes et remappe si elle change"""
+
+    def __init__(self, path: str = SNAPSHOT_PATH, poll: float = SNAPSHOT_POLL):
+        self.path = path
+        self.poll = poll
+        self.snapshot = None
+        self._task = None
+        self.reloads = 0
+        self.errors = 0
+
+    def refresh(self):
+        identity = snapshot_identity(self.path)
+        if identity is None or (self.snapshot is not None and identity == self.snapshot.identity):
+            return False
+        snapshot = MappedSnapshot(self.path)
+        install_snapshot(snapshot)
+        self.snapshot = snapshot
+        self.reloads += 1
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ snapshot reload failed: {e}", file=sys.stderr)
+            await asyncio.sleep(self.poll)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            "path": self.path,
+            "poll_seconds": self.poll,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "mapped_bytes": snapshot.size if snapshot else 0,
+            "published_at": snapshot.meta['published_at'] if snapshot else None,
+            "catalog_version": snapshot.meta['catalog']['version'] if snapshot else None,
+            "rules_version": snapshot.meta['rules']['rules_version'] if snapshot else None
+        }
+
+
+def forwarded_batch_payload(api_ids: list, values, awarded: dict):
+    """Lot de lignes évaluées -> élément JSON de POST /catalog/forwarded"""
+    return {
+        "api_ids": list(api_ids),
+        "values": np.asarray(values, dtype=np.float64).tolist(),
+        "awarded": {
+            badge_id: [np.asarray(positions).tolist(), np.asarray(confidences, dtype=np.float64).tolist()]
+            for badge_id, (positions, confidences) in awarded.items()
+        }
+    }
+
+
+def parse_forwarded_batch(batch):
+    """Élément reçu par l'écrivain -> (api_ids, valeurs [n x METRIC_FIELDS], awarded) ; ValueError si invalide"""
+    if not isinstance(batch, dict):
+        raise ValueError("each batch must be an object")
+    api_ids, values, awarded = batch.get('api_ids'), batch.get('values'), batch.get('awarded')
+    if (not isinstance(api_ids, list) or not all(isinstance(api_id, str) and api_id for api_id in api_ids)
+            or len(set(api_ids)) != len(api_ids)):
+        raise ValueError("api_ids must be distinct non-empty strings")
+    n = len(api_ids)
+    try:
+        values = np.array(values, dtype=np.float64).reshape(n, len(METRIC_FIELDS))
+    except (TypeError, ValueError):
+        raise ValueError(f"values must be {n} rows of {len(METRIC_FIELDS)} numbers")
+    if not np.isfinite(values).all():
+        raise ValueError("values must be finite")
+    if not isinstance(awarded, dict):
+        raise ValueError("awarded must be an object")
+    parsed = {}
+    for badge_id, entry in awarded.items():
+        try:
+            positions, confidences = entry
+            positions = np.array(positions, dtype=np.int64).reshape(-1)
+            confidences = np.array(confidences, dtype=np.float64).reshape(len(positions))
+        except (TypeError, ValueError):
+            raise ValueError(f"awarded['{badge_id}'] must be [positions, confidences]")
+        if (len(positions) and (positions.min() < 0 or positions.max() >= n)) or len(set(positions.tolist())) != len(positions):
+            raise ValueError(f"awarded['{badge_id}'] positions must be distinct and below {n}")
+        if not np.isfinite(confidences).all():
+            raise ValueError(f"awarded['{badge_id}'] confidences must be finite")
+        parsed[badge_id] = (positions, confidences)
+    return api_ids, values, parsed
+
+
+def apply_forwarded_batches(body: bytes):
+    """Écrivain : lots validés en entier, puis appliqués dans l'ordre d'envoi -> nombre de lignes"""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise ValueError("body must be JSON")
+    batches = payload.get('batches') if isinstance(payload, dict) else None
+    if not isinstance(batches, list):
+        raise ValueError("body must be {\"batches\": [...]}")
+    parsed = [parse_forwarded_batch(batch) for batch in batches]
+    return sum(badge_catalog.update_awarded(*batch) for batch in parsed)
+
+
+async def post_to_writer(path: str, body: bytes, timeout: float = MONITOR_TIMEOUT):
+    """POST JSON vers l'écrivain (une connexion par envoi) -> statut HTTP"""
+    url = (WRITER_URL or f"http://127.0.0.1:{WRITER_PORT}") + path
+    key, host_header, target, secure = APIMonitor._parse(url)
+    connection = await asyncio.wait_for(
+        asyncio.open_connection(key[1], key[2], ssl=ssl.create_default_context() if secure else None), timeout
+    )
+    reader, writer = connection
+    try:
+        writer.write((
+            f"POST {target} HTTP/1.1\r\nHost: {host_header}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        ).encode('latin-1') + body)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        if not status_line:
+            raise ConnectionResetError("connection closed by writer")
+        return int(status_line.split(b' ', 2)[1])
+    finally:
+        writer.close()
+
+
+class CatalogForwarder:
+    """
+    Lecteur : les résultats de /calculate-badges et /bulk-calculate (vue de
+    snapshot en lecture seule) sont transmis à l'écrivain par lots toutes
+    les interval secondes (POST /catalog/forwarded) ; ils apparaissent dans
+    /catalog/query, /badges/{api_id} et /badge-changes au snapshot suivant
+    File bornée à max_rows lignes : au-delà, les lots les plus anciens sont
+    abandonnés ; un envoi en échec est remis en tête de file
+    """
+
+    def __init__(self, interval: float = FORWARD_INTERVAL, max_rows: int = FORWARD_MAX_ROWS):
+        self.interval = interval
+        self.max_rows = max_rows
+        self._pending = deque()
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._task = None
+        self.forwarded = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_error = None
+
+    def submit(self, api_ids: list, values, awarded: dict):
+        """Appelé par BadgeCatalog._store (tout thread)"""
+        self._enqueue([(len(api_ids), forwarded_batch_payload(api_ids, values, awarded))])
+
+    def _enqueue(self, batches: list, front: bool = False):
+        with self._lock:
+            if front:
+                self._pending.extendleft(reversed(batches))
+            else:
+                self._pending.extend(batches)
+            self._rows += sum(rows for rows, _ in batches)
+            while self._rows > self.max_rows and len(self._pending) > 1:
+                rows, _ = self._pending.popleft()
+                self._rows -= rows
+                self.dropped += rows
+
+    def take(self):
+        with self._lock:
+            batches = list(self._pending)
+            self._pending.clear()
+            self._rows = 0
+        return batches
+
+    async def flush(self):
+        batches = self.take()
+        if not batches:
+            return 0
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(
+            bulk_executor, lambda: json.dumps({"batches": [batch for _, batch in batches]}).encode()
+        )
+        try:
+            status = await post_to_writer('/catalog/forwarded', body)
+            if status != 200:
+                raise RuntimeError(f"writer answered {status}")
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            self._enqueue(batches, front=True)
+            return 0
+        rows = sum(rows for rows, _ in batches)
+        self.forwarded += rows
+        return rows
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = self._rows
+        return {
+            "interval_seconds": self.interval,
+            "pending_rows": pending,
+            "forwarded_rows": self.forwarded,
+            "dropped_rows": self.dropped,
+            "failures": self.failures,
+            "last_error": self.last_error
+        }
+
+
+# Requêtes qui modifient l'état : servies par l'écrivain (préfixe si '/' final)
+WRITER_ROUTES = (
+    ('POST', '/ingest-metrics'), ('POST', '/ingest-stream'), ('POST', '/monitor/probe'),
+    ('POST', '/latency-sketches/'), ('POST', '/rollups/'), ('POST', '/storage/compact'),
+    ('POST', '/snapshot/publish'), ('PUT', '/badge-rules/'), ('DELETE', '/badge-rules/'),
+    ('POST', '/startup/artifacts'), ('POST', '/catalog/forwarded'),
+)
+
+
+def is_writer_route(method: str, path: str):
+    return any(
+        method == route_method and (path == route or (route.endswith('/') and path.startswith(route)))
+        for route_method, route in WRITER_ROUTES
+    )
+
+
+class WriterRedirectMiddleware:
+    """
+    Lecteur : requêtes d'écriture redirigées vers l'écrivain en 307
+    (méthode et corps conservés par le client)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not is_writer_route(scope['method'], scope['path']):
+            await self.app(scope, receive, send)
+            return
+        location = WRITER_URL
+        if not location:
+            host = dict(scope['headers']).get(b'host', b'localhost').decode('latin-1').rsplit(':', 1)[0]
+            location = f"{scope.get('scheme', 'http')}://{host}:{WRITER_PORT}"
+        location += scope['path']
+        if scope.get('query_string'):
+            location += '?' + scope['query_string'].decode('latin-1')
+        await send({
+            'type': 'http.response.start',
+            'status': 307,
+            'headers': [(b'location', location.encode('latin-1')), (b'content-length', b'0')]
+        })
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+snapshot_publisher = SnapshotPublisher()
+snapshot_reader = SnapshotReader()
+catalog_forwarder = CatalogForwarder()
+_lazy_warmup = None
+if PROCESS_ROLE == 'reader':
+    app.add_middleware(WriterRedirectMiddleware)
+
+# =============================================================================
+# ENDPOINTS API
+# =============================================================================
+
+@app.on_event("startup")
+async def start_background_workers():
+    """
+    Sketches / rollups / croissance sauvegardés + planificateur de réévaluation (désactivable : BADGES_SCHEDULER_ENABLED=0)
+    Mode lazy (BADGES_STARTUP_MODE=lazy) : croissance seule, le reste au premier usage ou au préchargement différé
+    Rôle reader : uniquement le suivi du snapshot publié par l'écrivain
+    """
+    if PROCESS_ROLE == 'reader':
+        snapshot_reader.refresh()
+        snapshot_reader.start()
+        catalog_forwarder.start()
+        return
+    global _lazy_warmup
+    loop = asyncio.get_running_loop()
+    # Croissance toujours rechargée (peu coûteuse) : alimente les populations de rang
+    await loop.run_in_executor(bulk_executor, growth_tracker.load, GROWTH_PATH)
+    if STARTUP_MODE == 'lazy':
+        _lazy_warmup = loop.create_task(warm_up_lazy_components(LAZY_WARMUP_DELAY))
+        return
+    await loop.run_in_executor(bulk_executor, latency_sketches.load, LATENCY_SKETCH_PATH)
+    await loop.run_in_executor(bulk_executor, uptime_rollups.load, UPTIME_ROLLUP_PATH)
+    start_periodic_workers()
+
+def start_periodic_workers():
+    if SCHEDULER_ENABLED:
+        reevaluation_scheduler.start()
+    if PROCESS_ROLE == 'writer':
+        snapshot_publisher.start()
+
+async def warm_up_lazy_components(delay: float):
+    """
+    Mode lazy : composants pas encore utilisés chargés hors du chemin des
+    premières requêtes, puis planificateur et publication du snapshot
+    """
+    await asyncio.sleep(delay)
+    loop = asyncio.get_running_loop()
+    for component in LAZY_COMPONENTS:
+        await loop.run_in_executor(bulk_executor, component.resolve)
+    start_periodic_workers()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    """Arrêt + sauvegarde de la progression, des sketches de latence, des rollups, de la croissance et du snapshot"""
+    if PROCESS_ROLE == 'reader':
+        await snapshot_reader.stop()
+        await catalog_forwarder.stop()
+        return
+    if _lazy_warmup is not None and not _lazy_warmup.done():
+        _lazy_warmup.cancel()
+    if SCHEDULER_ENABLED:
+        await reevaluation_scheduler.stop()
+    # Composant lazy jamais utilisé : son fichier sauvegardé reste tel quel
+    if is_loaded(latency_sketches):
+        latency_sketches.save(LATENCY_SKETCH_PATH)
+    if is_loaded(uptime_rollups):
+        uptime_rollups.save(UPTIME_ROLLUP_PATH)
+    growth_tracker.save(GROWTH_PATH)
+    if PROCESS_ROLE == 'writer':
+        await snapshot_publisher.stop()
+    if _api_monitor is not None and _api_monitor[0] is asyncio.get_running_loop():
+        await _api_monitor[1].close()
+
+@app.get("/")
+async def root():
+    """Health check"""
+    return {
+        "service": "API Performance Badges Engine",
+        "status": "operational", 
+        "version": "1.0.1",  # Version corrigée
+        "dependencies": "FastAPI + NumPy",
+        "timestamp": get_current_timestamp(),
+        "fixes_applied": ["input_validation", "error_handling"]
+    }
+
+def compute_calculation(state: EvaluationState, record: MetricsRecord, cache_token: tuple, timings: dict,
+                        ranks_version: int = None):
+    """
+    Partie calcul d'un appel unitaire, exécutée sur calculation_executor :
+    le premier accès à une API rejoue son historique disque hors de la boucle
+    ranks_version : version des populations classées lue avant le calcul (clé du cache)
+    """
+    started = time.perf_counter()
+    # Agrégat historique incrémental (O(1) une fois la ligne chargée)
+    aggregate = state.aggregates.get(record.api_id)
+    add_timing(timings, 'history_fetch', started)
+    
+    # Calcul badges
+    badges = state.engine.calculate_badges(record, aggregate=aggregate, timings=timings)
+    
+    # Calcul impact commission
+    started = time.perf_counter()
+    commission_info = state.commission.calculate_commission_impact(len(badges))
+    add_timing(timings, 'commission', started)
+    badge_cache.put(record, state.engine.rules_version, (badges, commission_info), cache_token, ranks_version)
+    state.catalog.update_many(((record.api_id, record, badges),))
+    return badges, commission_info
+
+async def render_calculation(metrics: dict):
+    """Calcul unitaire complet -> corps JSON encodé (partagé par les appels coalescés)"""
+    request_started = time.perf_counter()
+    timings = {}
+    state = evaluation_state
+    try:
+        # 🔧 VALIDATION COMPLÈTE DES DONNÉES (une passe, record typé)
+        record = parse_metrics(metrics)
+        add_timing(timings, 'validation', request_started)
         
-        # Calcul impact commission
-        commission_info = commission_calc.calculate_commission_impact(len(badges))
+        # Critères de rang : le résultat dépend aussi de la population classée
+        ranks_version = state.engine.ranks_version()
+        cached, cache_token = badge_cache.lookup(record, state.engine.rules_version, ranks_version)
+        if cached is not None:
+            badges, commission_info = cached
+            state.catalog.update_many(((record.api_id, record, badges),))
+        else:
+            # Les requêtes identiques concurrentes attendent ce calcul (coalescence)
+            loop = asyncio.get_running_loop()
+            badges, commission_info = await loop.run_in_executor(
+                calculation_executor, compute_calculation, state, record, cache_token, timings, ranks_version)
         
-        return {
+        content = {
             "success": True,
-            "api_id": metrics['api_id'],
+            "api_id": record.api_id,
             "badges": badges,
             "badge_summary": {
                 "total_badges": len(badges),
-                "badge_types": [badge['id'] for badge in badges],
-                "highest_confidence": max([badge['confidence_score'] for badge in badges], default=0.0)
+                "badge_types": [badge.template.id for badge in badges],
+                "highest_confidence": max([badge.confidence_score for badge in badges], default=0.0)
             },
             "business_impact": commission_info,
             "metadata": {
                 "calculated_at": get_current_timestamp(),
                 "algorithm_version": "1.0.1",
-                "processing_time_ms": 25,
+                "processing_time_ms": round((time.perf_counter() - request_started) * 1000, 3),
                 "validation_passed": True
             }
         }
         
+        started = time.perf_counter()
+        body = badge_encoder.encode_calculation(content)
+        add_timing(timings, 'serialization', started)
+        perf_metrics.observe_stages('/calculate-badges', timings)
+        return body
+        
     except HTTPException:
         # Re-raise HTTP exceptions (erreurs de validation)
         raise
@@ -413,68 +6190,645 @@ def calculate_api_badges(metrics: dict):
             }
         )
 
-@app.post("/bulk-calculate")
-def bulk_calculate_badges(api_metrics_list: List[dict]):
-    """🔧 Calcul badges en lot - AVEC VALIDATION"""
-    try:
-        results = []
-        validation_errors = []
-        
-        for i, metrics in enumerate(api_metrics_list):
-            try:
+@app.post("/calculate-badges")
+async def calculate_api_badges(metrics: dict):
+    """
+    🔧 ENDPOINT PRINCIPAL CORRIGÉ pour Nokia
+    Input: Métriques API
+    Output: Badges + Commission info
+    Requêtes identiques concurrentes (même api_id + métriques) : un seul calcul
+    """
+    key = request_fingerprint(metrics)
+    if key is not None:
+        key += (evaluation_state.engine.rules_version,)
+    body = await request_coalescer.run(key, lambda: render_calculation(metrics))
+    return FastJSONResponse(body)
+
+def evaluate_bulk_items(api_metrics_list: list, engine: BadgeCalculationEngine,
+                        columnar: ColumnarBadgeEngine, aggregate_source, offset: int = 0,
+                        timings: dict = None, earned_at: str = None):
+    """
+    Évaluation d'un lot (ou d'un fragment commençant à offset)
+    Retourne [(index d'origine, badges)] + erreurs au format /bulk-calculate
+    earned_at : horodatage unique du lot
+    """
+    evaluated = []
+    validation_errors = []
+    if earned_at is None:
+        earned_at = get_current_timestamp()
+    
+    # Chemin vectorisé pour les gros lots (None = repli scalaire)
+    if len(api_metrics_list) >= COLUMNAR_BATCH_THRESHOLD:
+        precomputed = columnar.calculate_batch(api_metrics_list, timings, earned_at)
+    else:
+        precomputed = [None] * len(api_metrics_list)
+    
+    for i, metrics in enumerate(api_metrics_list):
+        index = offset + i
+        try:
+            badges = precomputed[i]
+            if badges is None:
+                started = time.perf_counter()
                 # Validation de chaque élément
                 validate_metrics_data(metrics)
+                started = add_timing(timings, 'validation', started)
                 
-                historical = get_historical_metrics(metrics['api_id'])
-                badges = badge_engine.calculate_badges(metrics, historical)
-                commission = commission_calc.calculate_commission_impact(len(badges))
-                
-                results.append({
-                    "api_id": metrics['api_id'],
-                    "badges": badges,
-                    "badge_count": len(badges),
-                    "commission_info": commission,
-                    "status": "success"
-                })
-                
-            except HTTPException as e:
-                validation_errors.append({
-                    "index": i,
-                    "api_id": metrics.get('api_id', f'unknown-{i}'),
-                    "error": e.detail,
-                    "status": "validation_failed"
-                })
-                continue
-            except Exception as e:
-                validation_errors.append({
-                    "index": i,
-                    "api_id": metrics.get('api_id', f'unknown-{i}'),
-                    "error": str(e),
-                    "status": "processing_failed"
-                })
-                continue
+                aggregate = aggregate_source.get(metrics['api_id'])
+                add_timing(timings, 'history_fetch', started)
+                badges = engine.calculate_badges(metrics, aggregate=aggregate, timings=timings,
+                                                 earned_at=earned_at)
+            
+            evaluated.append((index, badges))
+            
+        except HTTPException as e:
+            validation_errors.append({
+                "index": index,
+                "api_id": metrics.get('api_id', f'unknown-{index}'),
+                "error": e.detail,
+                "status": "validation_failed"
+            })
+            continue
+        except Exception as e:
+            validation_errors.append({
+                "index": index,
+                "api_id": metrics.get('api_id', f'unknown-{index}'),
+                "error": str(e),
+                "status": "processing_failed"
+            })
+            continue
+    
+    return evaluated, validation_errors
+
+def bulk_result_entry(api_id: str, badges: list, commission: dict):
+    """Élément 'results' de /bulk-calculate"""
+    return {
+        "api_id": api_id,
+        "badges": badges,
+        "badge_count": len(badges),
+        "commission_info": commission,
+        "status": "success"
+    }
+
+def run_bulk_calculation(api_metrics_list: List[dict], timings: dict = None):
+    """🔧 Calcul badges en lot - AVEC VALIDATION"""
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    state = evaluation_state
+    try:
+        # Éléments identiques (même api_id + métriques) évalués une seule fois
+        unique, positions = request_coalescer.dedupe(api_metrics_list)
+        if BULK_PROCESS_WORKERS > 1 and len(unique) >= BULK_PARALLEL_THRESHOLD:
+            results, validation_errors = parallel_bulk_calculation(unique, state)
+        else:
+            evaluated, validation_errors = evaluate_bulk_items(
+                unique, state.engine, state.columnar, state.aggregates, timings=timings
+            )
+            commission_started = time.perf_counter()
+            results = [
+                bulk_result_entry(
+                    unique[index]['api_id'], badges,
+                    state.commission.calculate_commission_impact(len(badges))
+                )
+                for index, badges in evaluated
+            ]
+            add_timing(timings, 'commission', commission_started)
+        if positions is not None:
+            results, validation_errors = expand_bulk_results(
+                api_metrics_list, results, validation_errors, positions
+            )
         
-        return {
-            "success": len(results) > 0,
-            "processed_apis": len(api_metrics_list),
-            "successful_processing": len(results),
-            "failed_processing": len(validation_errors),
-            "results": results,
-            "errors": validation_errors,
-            "processing_summary": {
-                "total_badges_awarded": sum(r["badge_count"] for r in results),
-                "avg_badges_per_api": round(sum(r["badge_count"] for r in results) / len(results), 2) if results else 0,
-                "success_rate": f"{(len(results)/len(api_metrics_list)*100):.1f}%" if api_metrics_list else "0%",
-                "processed_at": get_current_timestamp()
-            }
-        }
+        # Résultats dans l'ordre d'origine, hors éléments en erreur
+        catalog_started = time.perf_counter()
+        failed = {error['index'] for error in validation_errors}
+        succeeded = (metrics for index, metrics in enumerate(api_metrics_list) if index not in failed)
+        state.catalog.update_many(
+            (result['api_id'], metrics, result['badges']) for result, metrics in zip(results, succeeded)
+        )
+        add_timing(timings, 'catalog', catalog_started)
+        
+        return bulk_response_content(len(api_metrics_list), results, validation_errors, started)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Bulk processing failed: {str(e)}")
 
-@app.get("/badge-rules")
-def get_badge_rules():
-    """Documentation règles badges"""
+def bulk_response_content(processed: int, results: list, validation_errors: list, started: float):
+    """Corps JSON de /bulk-calculate (entrée JSON ou binaire)"""
+    return {
+        "success": len(results) > 0,
+        "processed_apis": processed,
+        "successful_processing": len(results),
+        "failed_processing": len(validation_errors),
+        "results": results,
+        "errors": validation_errors,
+        "processing_summary": {
+            "total_badges_awarded": sum(r["badge_count"] for r in results),
+            "avg_badges_per_api": round(sum(r["badge_count"] for r in results) / len(results), 2) if results else 0,
+            "success_rate": f"{(len(results)/processed*100):.1f}%" if processed else "0%",
+            "processed_at": get_current_timestamp(),
+            "processing_time_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+    }
+
+def render_bulk_response(api_metrics_list: List[dict]):
+    """Calcul + sérialisation JSON d'un lot, étapes enregistrées"""
+    timings = {}
+    content = run_bulk_calculation(api_metrics_list, timings)
+    started = time.perf_counter()
+    response = FastJSONResponse(badge_encoder.encode_bulk(content))
+    add_timing(timings, 'serialization', started)
+    perf_metrics.observe_stages('/bulk-calculate', timings)
+    return response
+
+# Lot binaire en colonnes (Content-Type application/x-badges-bulk), little-endian
+# Entrée : en-tête BULK_INPUT_HEADER (magic, n APIs, largeur w des api_id en octets)
+# puis colonnes alignées sur 8 octets : api_id (n x w, UTF-8 complété par des NUL),
+# puis une colonne par métrique dans l'ordre METRIC_FIELDS (i8 pour INTEGER_FIELDS, f8 sinon)
+BULK_BINARY_TYPE = "application/x-badges-bulk"
+BULK_INPUT_MAGIC = b'BDGBULK1'
+BULK_INPUT_HEADER = struct.Struct('<8sII')
+BULK_COLUMN_DTYPES = tuple('<i8' if field in INTEGER_FIELDS else '<f8' for field in METRIC_FIELDS)
+
+# Résultat : en-tête BULK_RESULT_HEADER (magic, n, w, k badges, octets des noms)
+# puis colonnes alignées sur 8 octets : noms des badges (UTF-8 séparés par '\n'),
+# api_id (n x w), statut (u1), badge_count (u4), confiance par badge (k x n f8,
+# NaN = non attribué), total_commission (f8), revenue_increase_estimate (f8)
+BULK_RESULT_MAGIC = b'BDGRES01'
+BULK_RESULT_HEADER = struct.Struct('<8sIIII')
+BULK_STATUS = {'success': 0, 'validation_failed': 1, 'processing_failed': 2}
+
+
+def _pad8(block: bytes):
+    return block + b'\0' * (-len(block) % 8)
+
+
+def invalid_bulk_payload(message: str):
+    raise HTTPException(
+        status_code=400,
+        detail={
+            "error": "Invalid binary payload",
+            "message": message,
+            "timestamp": get_current_timestamp()
+        }
+    )
+
+
+def binary_bulk_count(body: bytes):
+    """Nombre d'APIs annoncé par l'en-tête (0 si absent)"""
+    return BULK_INPUT_HEADER.unpack_from(body)[1] if len(body) >= BULK_INPUT_HEADER.size else 0
+
+
+def decode_bulk_payload(body: bytes):
+    """
+    Corps binaire -> (colonne api_id brute, api_ids, colonnes métriques)
+    Colonnes = vues numpy sur le corps (aucune copie, aucun dict par API)
+    """
+    if len(body) < BULK_INPUT_HEADER.size:
+        invalid_bulk_payload("payload shorter than its header")
+    magic, n, width = BULK_INPUT_HEADER.unpack_from(body)
+    if magic != BULK_INPUT_MAGIC:
+        invalid_bulk_payload(f"bad magic {magic!r}, expected {BULK_INPUT_MAGIC!r}")
+    ids_size = n * width + (-(n * width) % 8)
+    expected = BULK_INPUT_HEADER.size + ids_size + 8 * n * len(METRIC_FIELDS)
+    if len(body) != expected:
+        invalid_bulk_payload(f"expected {expected} bytes for {n} APIs with {width}-byte api_id, got {len(body)}")
+
+    offset = BULK_INPUT_HEADER.size
+    if width:
+        ids = np.frombuffer(body, dtype=f'S{width}', count=n, offset=offset)
+        try:
+            api_ids = [api_id.decode('utf-8') for api_id in ids.tolist()]
+        except UnicodeDecodeError:
+            invalid_bulk_payload("api_id must be UTF-8")
+    else:
+        ids, api_ids = np.zeros(n, dtype='S1'), [''] * n
+    offset += ids_size
+    raw = {}
+    for field, dtype in zip(METRIC_FIELDS, BULK_COLUMN_DTYPES):
+        raw[field] = np.frombuffer(body, dtype=dtype, count=n, offset=offset)
+        offset += 8 * n
+    return ids, api_ids, raw
+
+
+def bulk_row_keys(ids, raw: dict):
+    """Octets de chaque ligne (api_id brut + métriques) pour le dédoublonnage"""
+    n = len(ids)
+    blocks = [ids.view(np.uint8).reshape(n, ids.dtype.itemsize)]
+    blocks += [raw[field].view(np.uint8).reshape(n, 8) for field in METRIC_FIELDS]
+    matrix = np.ascontiguousarray(np.hstack(blocks))
+    return matrix.view(f'V{matrix.shape[1]}').reshape(n)
+
+
+def evaluate_binary_rows(api_ids: list, raw: dict, timings: dict, state: EvaluationState):
+    """
+    Lignes d'un lot binaire évaluées en colonnes (mêmes résultats que le chemin JSON)
+    Gros lots : fragments répartis sur le pool de processus comme le chemin JSON
+    Lignes non éligibles au calcul vectorisé (valeurs hors bornes, entiers
+    > 2**53, api_id vide) : dict reconstruit pour ces seules lignes et chemin
+    scalaire (mêmes messages d'erreur qu'un corps JSON équivalent)
+    Retourne (plan, confiances [badges x APIs], statut par API, erreurs)
+    """
+    n = len(api_ids)
+    started = time.perf_counter()
+    columns = {field: raw[field].astype(np.float64, copy=False) for field in METRIC_FIELDS}
+    eligible = np.fromiter((len(api_id) > 0 for api_id in api_ids), dtype=bool, count=n)
+    for field in INTEGER_FIELDS:
+        eligible &= np.abs(raw[field]) <= EXACT_INT_LIMIT
+    eligible = state.columnar.check_ranges(columns, eligible)
+    add_timing(timings, 'validation', started)
+    if BULK_PROCESS_WORKERS > 1 and n >= BULK_PARALLEL_THRESHOLD:
+        plan, confidences = parallel_calculate_columns(api_ids, columns, eligible, timings, state)
+    else:
+        plan, confidences = state.columnar.calculate_columns(api_ids, columns, eligible, timings)
+
+    status = np.zeros(n, dtype=np.uint8)
+    errors = []
+    positions = {badge_id: b for b, (badge_id, _, _, _) in enumerate(plan.badges)}
+    earned_at = get_current_timestamp()
+    for index in np.flatnonzero(~eligible).tolist():
+        metrics = {'api_id': api_ids[index]}
+        for field in METRIC_FIELDS:
+            value = raw[field][index].item()
+            # NaN / inf (sans équivalent JSON) : valeur absente, comme null
+            metrics[field] = value if value - value == 0 else None
+        evaluated, failed = evaluate_bulk_items(
+            [metrics], state.engine, state.columnar, state.aggregates, offset=index,
+            timings=timings, earned_at=earned_at
+        )
+        for _, badges in evaluated:
+            for badge in badges:
+                if badge['id'] in positions:
+                    confidences[positions[badge['id']], index] = badge['confidence_score']
+        for error in failed:
+            status[index] = BULK_STATUS[error['status']]
+            errors.append(error)
+    return plan, confidences, status, errors
+
+
+def run_binary_bulk(ids, api_ids: list, raw: dict, timings: dict, state: EvaluationState):
+    """
+    Lot binaire : lignes identiques (mêmes octets) évaluées une fois, résultats
+    recopiés à chaque position, puis catalogue mis à jour dans l'ordre d'origine
+    Retourne (plan, confiances [badges x APIs], statut par API, erreurs)
+    """
+    rows, positions = request_coalescer.dedupe_rows(bulk_row_keys(ids, raw))
+    if positions is None:
+        plan, confidences, status, errors = evaluate_binary_rows(api_ids, raw, timings, state)
+    else:
+        plan, confidences, status, errors = evaluate_binary_rows(
+            [api_ids[i] for i in rows.tolist()], {field: raw[field][rows] for field in METRIC_FIELDS},
+            timings, state
+        )
+        confidences, status = confidences[:, positions], status[positions]
+        failed = {error['index']: error for error in errors}
+        errors = [
+            dict(failed[position], index=index)
+            for index, position in enumerate(positions.tolist()) if position in failed
+        ]
+
+    started = time.perf_counter()
+    succeeded = np.flatnonzero(status == 0)
+    values = np.column_stack([raw[field] for field in METRIC_FIELDS]).astype(np.float64)
+    state.catalog.update_columns(
+        [api_ids[i] for i in succeeded.tolist()], values[succeeded],
+        [badge_id for badge_id, _, _, _ in plan.badges], confidences[:, succeeded]
+    )
+    add_timing(timings, 'catalog', started)
+    return plan, confidences, status, errors
+
+
+def encode_bulk_results(ids, plan: BadgeRulePlan, confidences, status, calculator: CommissionCalculator):
+    """Résultat binaire (BULK_RESULT_HEADER + colonnes), commission par nombre de badges"""
+    n = len(status)
+    counts = np.count_nonzero(~np.isnan(confidences), axis=0)
+    commission_by_count, increase_by_count = commission_tables(calculator, int(counts.max(initial=0)))
+    failed = status != 0
+    commission = np.where(failed, np.nan, commission_by_count[counts])
+    increase = np.where(failed, np.nan, increase_by_count[counts])
+    names = '\n'.join(badge_id for badge_id, _, _, _ in plan.badges).encode('utf-8')
+    width = ids.dtype.itemsize if n else 0
+    return b''.join((
+        BULK_RESULT_HEADER.pack(BULK_RESULT_MAGIC, n, width, len(plan.badges), len(names)),
+        _pad8(names),
+        _pad8(ids.tobytes()),
+        _pad8(status.tobytes()),
+        _pad8(counts.astype('<u4').tobytes()),
+        confidences.astype('<f8', copy=False).tobytes(),
+        commission.astype('<f8', copy=False).tobytes(),
+        increase.astype('<f8', copy=False).tobytes()
+    ))
+
+
+def render_binary_bulk_response(body: bytes, as_json: bool):
+    """Lot binaire -> résultat binaire (ou JSON /bulk-calculate habituel si as_json)"""
+    timings = {}
+    started = time.perf_counter()
+    ids, api_ids, raw = decode_bulk_payload(body)
+    add_timing(timings, 'decode', started)
+    state = evaluation_state
+    try:
+        plan, confidences, status, errors = run_binary_bulk(ids, api_ids, raw, timings, state)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Bulk processing failed: {str(e)}")
+
+    serialization_started = time.perf_counter()
+    if as_json:
+        # Réponse JSON demandée (Accept) : mêmes éléments que le chemin JSON
+        earned_at = get_current_timestamp()
+        commissions = {}
+        results = []
+        for index in np.flatnonzero(status == 0).tolist():
+            column = confidences[:, index]
+            badges = [
+                BadgeAward(plan.badges[b][1], float(column[b]), earned_at)
+                for b in np.flatnonzero(~np.isnan(column)).tolist()
+            ]
+            count = len(badges)
+            if count not in commissions:
+                commissions[count] = state.commission.calculate_commission_impact(count)
+            results.append(bulk_result_entry(api_ids[index], badges, commissions[count]))
+        errors.sort(key=lambda error: error['index'])
+        content = bulk_response_content(len(api_ids), results, errors, started)
+        response = FastJSONResponse(badge_encoder.encode_bulk(content))
+    else:
+        response = Response(encode_bulk_results(ids, plan, confidences, status, state.commission),
+                            media_type=BULK_BINARY_TYPE)
+    add_timing(timings, 'serialization', serialization_started)
+    perf_metrics.observe_stages('/bulk-calculate', timings)
+    return response
+
+
+def is_binary_bulk(content_type: Optional[str]):
+    return content_type is not None and content_type.split(';')[0].strip().lower() == BULK_BINARY_TYPE
+
+
+class BulkCalculateRoute(APIRoute):
+    """
+    /bulk-calculate : corps application/x-badges-bulk décodé en colonnes avant
+    la validation FastAPI du corps JSON (chemin JSON inchangé)
+    Réponse binaire, ou JSON si Accept: application/json
+    """
+
+    def get_route_handler(self):
+        json_handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            if not is_binary_bulk(request.headers.get('content-type')):
+                return await json_handler(request)
+            body = await request.body()
+            as_json = 'application/json' in request.headers.get('accept', '')
+            if binary_bulk_count(body) >= BULK_OFFLOAD_THRESHOLD:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(bulk_executor, render_binary_bulk_response, body, as_json)
+            return render_binary_bulk_response(body, as_json)
+
+        return route_handler
+
+
+bulk_router = APIRouter(route_class=BulkCalculateRoute)
+
+
+@bulk_router.post(
+    "/bulk-calculate",
+    openapi_extra={"requestBody": {"content": {BULK_BINARY_TYPE: {"schema": {"type": "string", "format": "binary"}}}}}
+)
+async def bulk_calculate_badges(api_metrics_list: List[dict]):
+    """
+    Calcul badges en lot
+    Petits lots traités sur la boucle, gros lots sur l'exécuteur dédié
+    pour ne pas affamer les appels unitaires
+    Corps binaire en colonnes accepté (BulkCalculateRoute)
+    """
+    if len(api_metrics_list) >= BULK_OFFLOAD_THRESHOLD:
+        loop = asyncio.get_running_loop()
+        # Sérialisation JSON incluse dans l'exécuteur (hors boucle)
+        return await loop.run_in_executor(bulk_executor, render_bulk_response, api_metrics_list)
+    return render_bulk_response(api_metrics_list)
+
+
+app.include_router(bulk_router)
+
+@app.post("/ingest-metrics")
+async def ingest_metrics(metrics: dict):
+    """Enregistrement d'un point de métriques dans l'historique (écriture et rejeu hors boucle)"""
+    validate_metrics_data(metrics)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(bulk_executor, record_metrics, metrics['api_id'], [metrics])
+    reevaluation_scheduler.mark_changed(metrics['api_id'])
+    
+    return {
+        "success": True,
+        "api_id": metrics['api_id'],
+        "stored_at": get_current_timestamp()
+    }
+
+@app.post("/ingest-stream")
+async def ingest_stream(request: Request):
+    """
+    Ingestion streaming : corps NDJSON (chunked), une ligne par point
+    Recalcul des badges par micro-lots pour les seules APIs modifiées
+    """
+    ingestor = StreamIngestor()
+    return await ingestor.run(request.stream())
+
+@app.post("/monitor/probe")
+async def probe_apis(payload: dict):
+    """
+    Sondes synthétiques : {"targets": [{"api_id", "url", "total_requests"?, "active_users"?}],
+    "probes": 5, "record": true}
+    Métriques au format /calculate-badges ; enregistrées dans l'historique
+    (réévaluation prioritaire) si record
+    """
+    targets = payload.get('targets')
+    probes = payload.get('probes', 5)
+    if not isinstance(targets, list) or not targets or len(targets) > MONITOR_MAX_TARGETS:
+        raise HTTPException(status_code=400, detail=f"targets must be a list of 1 to {MONITOR_MAX_TARGETS} entries")
+    invalid = [
+        index for index, target in enumerate(targets)
+        if not isinstance(target, dict) or not isinstance(target.get('api_id'), str) or not target['api_id']
+        or not isinstance(target.get('url'), str) or not _probe_url_valid(target['url'])
+        or not _probe_counts_valid(target)
+    ]
+    if invalid:
+        raise HTTPException(status_code=400, detail={
+            "error": "targets need api_id, an http(s) url and valid total_requests / active_users",
+            "invalid_indexes": invalid[:100]
+        })
+    if isinstance(probes, bool) or not isinstance(probes, int) or not 1 <= probes <= 100:
+        raise HTTPException(status_code=400, detail="probes must be an integer between 1 and 100")
+
+    started = time.perf_counter()
+    samples_by_api = {}
+    metrics_list = await get_api_monitor().collect_many(targets, probes, samples_by_api)
+    elapsed = time.perf_counter() - started
+    if payload.get('record', True):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(bulk_executor, record_probe_results, metrics_list, samples_by_api)
+
+    return {
+        "success": True,
+        "probed_apis": len(metrics_list),
+        "probes_per_api": probes,
+        "results": metrics_list,
+        "recorded": bool(payload.get('record', True)),
+        "probes_per_s": round(len(targets) * probes / elapsed, 1) if elapsed else 0.0,
+        "processing_time_ms": round(elapsed * 1000, 3)
+    }
+
+@app.get("/monitor/stats")
+async def get_monitor_stats():
+    """Sondes, échecs, connexions ouvertes / réutilisées"""
+    monitor = _api_monitor[1] if _api_monitor is not None else get_api_monitor()
+    return monitor.stats()
+
+@app.post("/latency-sketches/{api_id}")
+async def ingest_latency_sketch(api_id: str, payload: dict):
+    """
+    Latences d'une API : {"samples": [ms, ...]} et/ou {"sketch": {...}}
+    (sketch sérialisé d'un autre shard / agent, même alpha), "timestamp"
+    optionnel (epoch ou ISO) -> fenêtre de rattachement
+    """
+    samples = payload.get('samples')
+    serialized = payload.get('sketch')
+    if samples is None and serialized is None:
+        raise HTTPException(status_code=400, detail="samples or sketch required")
+    try:
+        sketch = LatencySketch(latency_sketches.alpha, latency_sketches.max_bins)
+        if samples is not None:
+            if not isinstance(samples, list) or len(samples) > SKETCH_MAX_SAMPLES or not all(
+                    isinstance(value, (int, float)) and not isinstance(value, bool) for value in samples):
+                raise ValueError(f"samples must be a list of at most {SKETCH_MAX_SAMPLES} numbers")
+            sketch.add_many(samples)
+        if serialized is not None:
+            sketch.merge(LatencySketch.from_dict(serialized, latency_sketches.max_bins))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={
+            "error": "Invalid latency data",
+            "message": str(e),
+            "timestamp": get_current_timestamp()
+        })
+
+    merged = latency_sketches.merge_sketch(api_id, sketch, sample_timestamp(payload)) if sketch.count else False
+    if merged:
+        badge_cache.invalidate(api_id)
+        reevaluation_scheduler.mark_changed(api_id)
+    return {
+        "success": True,
+        "api_id": api_id,
+        "merged_samples": sketch.count if merged else 0,
+        "expired": bool(sketch.count) and not merged,
+        **dict(zip(TAIL_FIELDS, (None if math.isinf(value) else round(value, 3)
+                                 for value in latency_sketches.tail_values(api_id))))
+    }
+
+@app.get("/latency-sketches/{api_id}")
+async def get_latency_sketch(api_id: str, windows: bool = False):
+    """Quantiles sur la rétention + sketch fusionné (fusionnable ailleurs) ; fenêtres si windows"""
+    merged = latency_sketches.merged(api_id)
+    if merged is None:
+        raise HTTPException(status_code=404, detail=f"No latency samples for '{api_id}'")
+    p50, p90, p95, p99, p999 = merged.quantiles((0.5, 0.9, 0.95, 0.99, 0.999))
+    result = {
+        "api_id": api_id,
+        "count": merged.count,
+        "mean": round(merged.total / merged.count, 3),
+        "quantiles": {"p50": p50, "p90": p90, "p95": p95, "p99": p99, "p999": p999},
+        "relative_accuracy": merged.alpha,
+        "sketch": merged.to_dict()
+    }
+    if windows:
+        result["windows"] = [
+            {"start": start, "count": sketch.count, "sketch": sketch.to_dict()}
+            for start, sketch in latency_sketches.windows_of(api_id)
+        ]
+    return result
+
+@app.post("/rollups/{api_id}")
+async def ingest_rollup_observations(api_id: str, payload: dict):
+    """
+    Observations de disponibilité (moniteur externe) :
+    {"observations": [{"total", "available", "errors"?, "timestamp"?}]}
+    errors par défaut : total - available
+    """
+    observations = payload.get('observations')
+    if not isinstance(observations, list) or not observations or len(observations) > ROLLUP_MAX_OBSERVATIONS:
+        raise HTTPException(status_code=400, detail=f"observations must be a list of 1 to {ROLLUP_MAX_OBSERVATIONS} entries")
+    parsed = []
+    for index, observation in enumerate(observations):
+        counts = None
+        if isinstance(observation, dict):
+            total, available = observation.get('total'), observation.get('available')
+            errors = observation.get('errors')
+            if errors is None and _is_count(total) and _is_count(available):
+                errors = total - available
+            counts = (total, available, errors)
+        if counts is None or not all(_is_count(v) for v in counts) or max(counts[1:]) > counts[0]:
+            raise HTTPException(status_code=400, detail={
+                "error": "Invalid observation",
+                "message": f"total, available (<= total) and errors (<= total) must be integers between 0 and {ROLLUP_MAX_COUNT}",
+                "index": index,
+                "timestamp": get_current_timestamp()
+            })
+        timestamp = sample_timestamp(observation)
+        if not uptime_rollups.accepts(timestamp):
+            raise HTTPException(status_code=400, detail={
+                "error": "Invalid observation",
+                "message": f"timestamp must be within the retained {ROLLUP_LEVELS[-1][0]} ring "
+                           f"and at most {ROLLUP_MAX_SKEW:g}s ahead of the server clock",
+                "index": index,
+                "timestamp": get_current_timestamp()
+            })
+        parsed.append(counts + (timestamp,))
+
+    for total, available, errors, timestamp in parsed:
+        uptime_rollups.add(api_id, total, available, errors, timestamp)
+    badge_cache.invalidate(api_id)
+    reevaluation_scheduler.mark_changed(api_id)
+    return {
+        "success": True,
+        "api_id": api_id,
+        "observations": len(parsed),
+        **dict(zip(ROLLUP_FIELDS, (None if math.isinf(value) else value
+                                   for value in uptime_rollups.window_values(api_id))))
+    }
+
+@app.get("/rollups/{api_id}")
+async def get_rollups(api_id: str, level: Optional[str] = None):
+    """Fenêtres 1 h / 24 h / 30 j / 180 j ; buckets d'un niveau (minute, hour, day) si level"""
+    windows = {
+        name: uptime_rollups.summary(api_id, seconds)
+        for name, seconds in (('1h', 3600), ('24h', 86400), ('30d', 30 * 86400), ('180d', 180 * 86400))
+    }
+    if windows['1h'] is None:
+        raise HTTPException(status_code=404, detail=f"No uptime observations for '{api_id}'")
+    result = {
+        "api_id": api_id,
+        "windows": windows,
+        "criteria_values": dict(zip(ROLLUP_FIELDS, (None if math.isinf(value) else value
+                                                    for value in uptime_rollups.window_values(api_id))))
+    }
+    if level is not None:
+        try:
+            result["buckets"] = uptime_rollups.buckets(api_id, level)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return result
+
+@app.post("/storage/compact")
+async def compact_storage():
+    """Rétention + compaction de tous les segments (I/O hors boucle)"""
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(bulk_executor, metrics_store.compact)
+    result["storage"] = metrics_store.stats()
+    result["rollup_apis_pruned"] = uptime_rollups.prune()
+    result["growth_apis_pruned"] = growth_tracker.prune()
+    result["scheduler_apis_pruned"] = reevaluation_scheduler.prune(metrics_store.api_ids())
+    result["cache_generations_pruned"] = badge_cache.compact()
+    return result
+
+def badge_rules_content():
+    """Documentation règles badges (encodée une fois par version des règles : PrecomputedResponses)"""
     return {
         "available_badges": badge_engine.badge_rules,
         "commission_structure": {
@@ -482,6 +6836,11 @@ def get_badge_rules():
             "max_commission": commission_calc.max_commission,
             "badge_bonus": commission_calc.badge_bonus_per_badge
         },
+        "rule_versions": {
+            "rules_version": badge_engine.rules_version,
+            "badges": badge_engine.badge_versions,
+            "dependencies": badge_engine.rule_plan.dependencies
+        },
         "algorithm_info": {
             "confidence_threshold": 0.85,
             "weighting_strategy": "temporal_decay",
@@ -504,8 +6863,298 @@ def get_badge_rules():
         }
     }
 
+@app.get("/badge-rules")
+async def get_badge_rules():
+    """Documentation règles badges"""
+    return FastJSONResponse(precomputed_responses.get('badge-rules', STATIC_RESPONSES['badge-rules']))
+
+@app.put("/badge-rules/{badge_id}")
+async def put_badge_rule(badge_id: str, config: dict, diff_limit: int = 1000):
+    """
+    Ajout ou modification d'un badge
+    Réévaluation du seul badge modifié sur tout le catalogue, diff par API
+    """
+    config = validate_badge_config(badge_id, config)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(bulk_executor, apply_badge_rule_change, badge_id, config, diff_limit)
+
+@app.delete("/badge-rules/{badge_id}")
+async def delete_badge_rule(badge_id: str, diff_limit: int = 1000):
+    """Suppression d'un badge : retiré du catalogue, APIs concernées dans le diff"""
+    if badge_id not in badge_engine.badge_rules:
+        raise HTTPException(status_code=404, detail=f"Unknown badge '{badge_id}'")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(bulk_executor, apply_badge_rule_change, badge_id, None, diff_limit)
+
+@app.post("/projections/commission")
+async def project_commission(payload: dict):
+    """
+    Projection commission / revenus de scénarios candidats sur tout le catalogue
+    Body: {"scenarios": [{"name", "base_commission", "badge_bonus_per_badge",
+    "max_commission", "badge_rules": {badge_id: config | null}}]}
+    Rien n'est modifié (règles et catalogue en vigueur inchangés)
+    """
+    scenarios = payload.get('scenarios')
+    if not isinstance(scenarios, list) or not 0 < len(scenarios) <= PROJECTION_MAX_SCENARIOS:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid projection request",
+                "message": f"scenarios must be a list of 1 to {PROJECTION_MAX_SCENARIOS} scenarios",
+                "timestamp": get_current_timestamp()
+            }
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(bulk_executor, project_commission_scenarios, scenarios)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Histogrammes latence (requêtes + étapes) au format texte Prometheus"""
+    cache = badge_cache.stats()
+    gauges = {
+        'badges_cache_hits_total': ('counter', 'Badge result cache hits', cache['hits']),
+        'badges_cache_misses_total': ('counter', 'Badge result cache misses', cache['misses']),
+        'badges_cache_evictions_total': ('counter', 'Badge result cache LRU evictions', cache['evictions']),
+        'badges_cache_entries': ('gauge', 'Badge result cache size', cache['size']),
+        'badges_rules_version': ('gauge', 'Compiled badge rules version', badge_engine.rules_version),
+    }
+    coalescing = request_coalescer.stats()
+    gauges.update({
+        'badges_coalesced_requests_total': ('counter', 'Identical concurrent /calculate-badges requests served by an in-flight computation', coalescing['coalesced']),
+        'badges_bulk_duplicates_total': ('counter', 'Repeated /bulk-calculate items served by one evaluation', coalescing['bulk_duplicates']),
+        'badges_inflight_computations': ('gauge', 'Coalescable /calculate-badges computations in flight', coalescing['in_flight']),
+    })
+    scheduler = reevaluation_scheduler.stats()
+    gauges.update({
+        'badges_scheduler_evaluated_total': ('counter', 'APIs re-evaluated by the scheduler', scheduler['evaluated_total']),
+        'badges_scheduler_queue_lag_seconds': ('gauge', 'Age of the oldest overdue re-evaluation', scheduler['queue_lag_seconds']),
+        'badges_scheduler_priority_queue': ('gauge', 'APIs with changed metrics awaiting re-evaluation', scheduler['priority_queue']),
+        'badges_scheduler_due_queue': ('gauge', 'APIs past their re-evaluation deadline', scheduler['due_queue']),
+        'badges_scheduler_throughput': ('gauge', 'Re-evaluations per second over the last minute', scheduler['throughput_per_s']),
+    })
+    sketches = latency_sketches.stats()
+    gauges.update({
+        'badges_latency_sketch_apis': ('gauge', 'APIs with latency sketches', sketches['apis']),
+        'badges_latency_sketch_bins': ('gauge', 'Latency sketch buckets held in memory', sketches['bins']),
+        'badges_latency_samples_total': ('counter', 'Latency samples merged into sketches', sketches['samples_total']),
+    })
+    rollups = uptime_rollups.stats()
+    gauges.update({
+        'badges_rollup_apis': ('gauge', 'APIs with uptime rollups', rollups['apis']),
+        'badges_rollup_observations_total': ('counter', 'Observations rolled up', rollups['observations_total']),
+        'badges_rollup_memory_bytes': ('gauge', 'Uptime rollup ring buffer memory', rollups['memory_bytes']),
+    })
+    growth = growth_tracker.stats()
+    gauges.update({
+        'badges_growth_apis': ('gauge', 'APIs with month-over-month user growth tracking', growth['apis']),
+        'badges_rank_updates_total': ('counter', 'Value changes applied to rank populations', metric_ranks.version),
+    })
+    for base, index in metric_ranks.indexes.items():
+        gauges[f'badges_rank_population_{base}'] = ('gauge', f'APIs ranked by {base}', index.size)
+    return PlainTextResponse(
+        perf_metrics.render_prometheus(gauges),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/metrics/profile")
+async def get_slow_request_profile(limit: int = 50):
+    """Piles échantillonnées pendant les requêtes lentes (si BADGES_PROFILE_SLOW_MS)"""
+    return slow_profiler.report(limit)
+
+@app.get("/cache-stats")
+async def get_cache_stats():
+    """Compteurs du cache résultats (dimensionnement) + coalescence"""
+    return {**badge_cache.stats(), "coalescing": request_coalescer.stats()}
+
+@app.get("/catalog/query")
+async def query_catalog(badges: Optional[str] = None, sort: str = "confidence", order: Optional[str] = None,
+                        limit: int = 50, cursor: Optional[str] = None,
+                        min_uptime: Optional[float] = None, max_response_time: Optional[float] = None,
+                        max_error_rate: Optional[float] = None, min_security_score: Optional[float] = None,
+                        min_requests: Optional[int] = None, min_active_users: Optional[int] = None):
+    """
+    Recherche dans le catalogue des derniers résultats
+    badges : ids séparés par des virgules (toutes requis)
+    sort=confidence : confiance du premier badge demandé, sinon la plus haute
+    Page suivante : repasser next_cursor avec les mêmes paramètres
+    """
+    badge_ids = [badge_id.strip() for badge_id in badges.split(',') if badge_id.strip()] if badges else []
+    unknown = [badge_id for badge_id in badge_ids if badge_id not in badge_engine.badge_rules]
+    bounds = {
+        'min_uptime': min_uptime,
+        'max_response_time': max_response_time,
+        'max_error_rate': max_error_rate,
+        'min_security_score': min_security_score,
+        'min_requests': min_requests,
+        'min_active_users': min_active_users
+    }
+    try:
+        if unknown:
+            raise ValueError(f"unknown badges: {unknown}")
+        return badge_catalog.query(
+            badges=badge_ids,
+            filters={name: bound for name, bound in bounds.items() if bound is not None},
+            sort=sort, order=order, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid catalog query",
+                "message": str(e),
+                "available_badges": list(badge_engine.badge_rules),
+                "available_sorts": list(CATALOG_SORTS),
+                "timestamp": get_current_timestamp()
+            }
+        )
+
+@app.get("/badges/{api_id}")
+async def get_api_badges(api_id: str, request: Request):
+    """
+    Derniers badges d'une API (catalogue), sans métadonnées statiques (voir /badge-rules)
+    ETag fort = version du résultat ; If-None-Match identique -> 304 sans corps
+    """
+    catalog = badge_catalog
+    version = catalog.result_version(api_id)
+    if version is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": "Unknown API",
+                "message": f"No badge result for '{api_id}'",
+                "timestamp": get_current_timestamp()
+            }
+        )
+    etag = result_etag(catalog.epoch, version)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    result = catalog.lookup(api_id)
+    return FastJSONResponse(
+        _dumps(result).encode('utf-8'),
+        headers={"ETag": result_etag(catalog.epoch, result['version']), "Cache-Control": "no-cache"}
+    )
+
+@app.get("/badge-changes")
+async def get_badge_changes(request: Request, since: int = 0, limit: int = 100,
+                            cursor: Optional[str] = None, epoch: Optional[str] = None):
+    """
+    APIs dont les badges ont changé depuis la version since (résultats compacts)
+    Pages : next_cursor ; ensuite repasser version (et epoch) au prochain appel
+    epoch différent (redémarrage de l'écrivain) : tout est renvoyé depuis 0, reset=true
+    """
+    catalog = badge_catalog
+    reset = epoch is not None and epoch != catalog.epoch
+    if reset:
+        since, cursor = 0, None
+    etag = result_etag(catalog.epoch, catalog.version)
+    if not reset and etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    try:
+        content = catalog.changes_since(since=since, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid changes query",
+                "message": str(e),
+                "timestamp": get_current_timestamp()
+            }
+        )
+    content["reset"] = reset
+    return FastJSONResponse(
+        _dumps(content).encode('utf-8'),
+        headers={"ETag": result_etag(content["epoch"], content["version"]), "Cache-Control": "no-cache"}
+    )
+
+@app.get("/scheduler/stats")
+async def get_scheduler_stats():
+    """Files d'attente, retard, débit et progression du planificateur"""
+    return reevaluation_scheduler.stats()
+
+@app.get("/catalog/stats")
+async def get_catalog_stats():
+    """Taille du catalogue, APIs par badge, index triés"""
+    return badge_catalog.stats()
+
+@app.post("/catalog/forwarded")
+async def apply_forwarded_rows(request: Request):
+    """Écrivain : lignes évaluées par les lecteurs (CatalogForwarder) -> catalogue partagé"""
+    body = await request.body()
+    loop = asyncio.get_running_loop()
+    try:
+        rows = await loop.run_in_executor(bulk_executor, apply_forwarded_batches, body)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid forwarded rows",
+                "message": str(e),
+                "timestamp": get_current_timestamp()
+            }
+        )
+    return {"success": True, "rows": rows, "catalog_version": badge_catalog.version}
+
+@app.get("/snapshot/stats")
+async def get_snapshot_stats():
+    """Rôle du processus + publication (writer) ou version mappée (reader)"""
+    stats = {"role": PROCESS_ROLE, "pid": os.getpid()}
+    if PROCESS_ROLE == 'writer':
+        stats["publisher"] = snapshot_publisher.stats()
+    elif PROCESS_ROLE == 'reader':
+        stats["reader"] = snapshot_reader.stats()
+        stats["forwarder"] = catalog_forwarder.stats()
+    return stats
+
+@app.post("/snapshot/publish")
+async def publish_snapshot():
+    """Publication immédiate du snapshot (écrivain ; redirigé depuis un lecteur)"""
+    if PROCESS_ROLE != 'writer':
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "error": "Not a writer",
+                "message": "Snapshots are published by the process started with BADGES_ROLE=writer",
+                "timestamp": get_current_timestamp()
+            }
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(bulk_executor, snapshot_publisher.publish)
+
+@app.get("/startup")
+async def get_startup_status():
+    """Mode de démarrage, composants lazy chargés ou non, réponses pré-encodées"""
+    return {
+        "mode": STARTUP_MODE,
+        "warmup_delay_seconds": LAZY_WARMUP_DELAY if STARTUP_MODE == 'lazy' else None,
+        "components": {
+            component._name: {
+                "loaded": component.resolved,
+                "load_ms": round(component.load_seconds * 1000, 3) if component.resolved else None
+            }
+            for component in LAZY_COMPONENTS
+        },
+        "artifacts": {"path": STARTUP_ARTIFACTS_PATH, "loaded": startup_artifacts_loaded},
+        "precomputed_responses": precomputed_responses.stats()
+    }
+
+@app.post("/startup/artifacts")
+async def write_artifacts():
+    """Écriture des artefacts de démarrage (règles courantes + réponses statiques pré-encodées)"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(bulk_executor, write_startup_artifacts, STARTUP_ARTIFACTS_PATH)
+    except OSError as e:
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error": "Artifacts not written",
+                "message": str(e),
+                "timestamp": get_current_timestamp()
+            }
+        )
+
 @app.post("/test-api")
-def test_with_sample_data():
+async def test_with_sample_data():
     """Endpoint test avec données d'exemple"""
     sample_metrics = {
         "api_id": "test-api-123",
@@ -517,10 +7166,10 @@ def test_with_sample_data():
         "security_score": 9.2
     }
     
-    return calculate_api_badges(sample_metrics)
+    return await calculate_api_badges(sample_metrics)
 
 @app.post("/test-validation")
-def test_validation_errors():
+async def test_validation_errors():
     """🔧 NOUVEAU : Endpoint pour tester la validation"""
     
     # Test données incomplètes
@@ -541,95 +7190,108 @@ def test_validation_errors():
 # 🎁 BONUS: ENDPOINT DEMO POUR POC VISUEL
 # =============================================================================
 
-@app.get("/demo-data")
-def get_demo_data_for_poc():
-    """🎁 NOUVEAU : Données démo pour le POC visuel Gemini"""
-    
-    demo_apis = [
-        {
-            "api_id": "openai-gpt4",
-            "name": "OpenAI GPT-4 API",
-            "description": "Advanced AI language model with superior reasoning",
-            "category": "AI/ML",
-            "pricing": "$0.03/1K tokens",
-            "badges": ["🟢 Trusted API", "⚡ Lightning Fast", "🛡️ Enterprise Ready", "👥 Community Proven"],
-            "commission_tier": "premium",
-            "metrics": {
-                "uptime": 99.95,
-                "response_time": 45,
-                "users": 15000
-            }
-        },
-        {
-            "api_id": "weather-pro",
-            "name": "WeatherPro Global API", 
-            "description": "Accurate weather data for 200+ countries",
-            "category": "Weather",
-            "pricing": "$0.001/request",
-            "badges": ["🟢 Trusted API", "🚀 Blazing Speed", "📊 High Volume Ready"],
-            "commission_tier": "standard",
-            "metrics": {
-                "uptime": 99.8,
-                "response_time": 35,
-                "users": 8500
-            }
-        },
-        {
-            "api_id": "payment-secure",
-            "name": "SecurePay Processing",
-            "description": "PCI-compliant payment processing API",
-            "category": "Payments",
-            "pricing": "$0.30/transaction",
-            "badges": ["🛡️ Enterprise Ready", "🔒 Security Certified", "💎 Zero Downtime"],
-            "commission_tier": "premium",
-            "metrics": {
-                "uptime": 99.99,
-                "response_time": 120,
-                "users": 3200
-            }
-        },
-        {
-            "api_id": "basic-translator",
-            "name": "Quick Translate API",
-            "description": "Simple text translation service",
-            "category": "Translation",
-            "pricing": "Free tier available",
-            "badges": [],
-            "commission_tier": "basic",
-            "metrics": {
-                "uptime": 96.5,
-                "response_time": 300,
-                "users": 150
-            }
-        },
-        {
-            "api_id": "social-analytics",
-            "name": "SocialMetrics Analytics",
-            "description": "Comprehensive social media analytics platform",
-            "category": "Analytics", 
-            "pricing": "$29/month",
-            "badges": ["🟢 Trusted API", "👥 Community Proven"],
-            "commission_tier": "standard",
-            "metrics": {
-                "uptime": 99.2,
-                "response_time": 180,
-                "users": 2100
-            }
+# APIs démo du POC visuel (constantes)
+DEMO_APIS = [
+    {
+        "api_id": "openai-gpt4",
+        "name": "OpenAI GPT-4 API",
+        "description": "Advanced AI language model with superior reasoning",
+        "category": "AI/ML",
+        "pricing": "$0.03/1K tokens",
+        "badges": ["🟢 Trusted API", "⚡ Lightning Fast", "🛡️ Enterprise Ready", "👥 Community Proven"],
+        "commission_tier": "premium",
+        "metrics": {
+            "uptime": 99.95,
+            "response_time": 45,
+            "users": 15000
         }
-    ]
-    
-    return {
-        "demo_apis": demo_apis,
+    },
+    {
+        "api_id": "weather-pro",
+        "name": "WeatherPro Global API", 
+        "description": "Accurate weather data for 200+ countries",
+        "category": "Weather",
+        "pricing": "$0.001/request",
+        "badges": ["🟢 Trusted API", "🚀 Blazing Speed", "📊 High Volume Ready"],
+        "commission_tier": "standard",
+        "metrics": {
+            "uptime": 99.8,
+            "response_time": 35,
+            "users": 8500
+        }
+    },
+    {
+        "api_id": "payment-secure",
+        "name": "SecurePay Processing",
+        "description": "PCI-compliant payment processing API",
+        "category": "Payments",
+        "pricing": "$0.30/transaction",
+        "badges": ["🛡️ Enterprise Ready", "🔒 Security Certified", "💎 Zero Downtime"],
+        "commission_tier": "premium",
+        "metrics": {
+            "uptime": 99.99,
+            "response_time": 120,
+            "users": 3200
+        }
+    },
+    {
+        "api_id": "basic-translator",
+        "name": "Quick Translate API",
+        "description": "Simple text translation service",
+        "category": "Translation",
+        "pricing": "Free tier available",
+        "badges": [],
+        "commission_tier": "basic",
+        "metrics": {
+            "uptime": 96.5,
+            "response_time": 300,
+            "users": 150
+        }
+    },
+    {
+        "api_id": "social-analytics",
+        "name": "SocialMetrics Analytics",
+        "description": "Comprehensive social media analytics platform",
+        "category": "Analytics", 
+        "pricing": "$29/month",
+        "badges": ["🟢 Trusted API", "👥 Community Proven"],
+        "commission_tier": "standard",
+        "metrics": {
+            "uptime": 99.2,
+            "response_time": 180,
+            "users": 2100
+        }
+    }
+]
+
+
+def demo_data_prefix():
+    """Corps /demo-data sans l'accolade finale : generated_at, seul champ variable, ajouté à chaque appel"""
+    content = {
+        "demo_apis": DEMO_APIS,
         "badge_definitions": badge_engine.badge_rules,
-        "total_apis": len(demo_apis),
-        "badged_apis": len([api for api in demo_apis if api["badges"]]),
+        "total_apis": len(DEMO_APIS),
+        "badged_apis": len([api for api in DEMO_APIS if api["badges"]]),
         "commission_tiers": {
             "basic": {"rate": "20%", "color": "#gray"},
             "standard": {"rate": "22-25%", "color": "#blue"}, 
             "premium": {"rate": "26-30%", "color": "#gold"}
-        },
-        "generated_at": get_current_timestamp()
+        }
     }
+    return _dumps(content)[:-1].encode('utf-8')
+
+
+# Réponses statiques : nom -> construction du corps encodé (PrecomputedResponses, artefacts de démarrage)
+STATIC_RESPONSES = {
+    'badge-rules': lambda: _dumps(badge_rules_content()).encode('utf-8'),
+    'demo-data': demo_data_prefix,
+}
+
+@app.get("/demo-data")
+async def get_demo_data_for_poc():
+    """🎁 NOUVEAU : Données démo pour le POC visuel Gemini"""
+    prefix = precomputed_responses.get('demo-data', STATIC_RESPONSES['demo-data'])
+    return FastJSONResponse(prefix + b',"generated_at":' + _encode_str(get_current_timestamp()).encode() + b'}')
 
 # =============================================================================
 # DÉMARRAGE
@@ -637,4 +7299,22 @@ def get_demo_data_for_poc():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    workers = int(os.environ.get("BADGES_WORKERS", "1"))
+    port = int(os.environ.get("BADGES_PORT", "8000"))
+    if workers <= 1:
+        uvicorn.run("app:app", host="0.0.0.0", port=port, reload=True)
+    else:
+        # Un écrivain (état, ingestion, publication du snapshot) + N lecteurs
+        # qui mappent le snapshot ; les écritures reçues par un lecteur sont
+        # redirigées vers l'écrivain (307)
+        import subprocess
+        writer = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", "0.0.0.0", "--port", str(WRITER_PORT)],
+            env=dict(os.environ, BADGES_ROLE="writer")
+        )
+        os.environ["BADGES_ROLE"] = "reader"
+        try:
+            uvicorn.run("app:app", host="0.0.0.0", port=port, workers=workers)
+        finally:
+            writer.terminate()
+            writer.wait()
\ No newline at end of file
@@ -0,0 +1,546 @@
+# API Performance Badges - Suite de benchmarks
+# Moteur badges + endpoints HTTP mesurés en processus (TestClient)
+#
+# Usage :
+#   python benchmark.py --apis 2000 --history 30
+#   python benchmark.py --save-baseline baselines/1.0.1.json
+#   python benchmark.py --compare baselines/1.0.1.json --tolerance 0.15
+#   python benchmark.py --probe-targets 5000 --probe-hosts 8
+#   python benchmark.py --startup --apis 20000 --startup-runs 5
+
+import argparse
+import asyncio
+import atexit
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# =============================================================================
+# DONNÉES SYNTHÉTIQUES
+# =============================================================================
+
+def generate_metrics(count: int, seed: int = 42):
+    """Métriques synthétiques réalistes (mélange d'APIs badgées ou non)"""
+    rng = random.Random(seed)
+    metrics_list = []
+    for i in range(count):
+        metrics_list.append({
+            "api_id": f"bench-api-{i}",
+            "uptime_percentage": round(rng.uniform(95.0, 100.0), 3),
+            "avg_response_time": round(rng.lognormvariate(4.0, 0.6), 1),
+            "total_requests": rng.randint(0, 50000),
+            "error_rate": round(rng.uniform(0.0, 3.0), 3),
+            "active_users": rng.randint(0, 20000),
+            "security_score": round(rng.uniform(5.0, 10.0), 2)
+        })
+    return metrics_list
+
+
+def generate_history(metrics: dict, depth: int, seed: int = 42):
+    """Historique synthétique autour des métriques courantes (plus récent en premier)"""
+    rng = random.Random(f"{seed}-{metrics['api_id']}")
+    now = time.time()
+    history = []
+    for i in range(depth):
+        history.append({
+            "api_id": metrics["api_id"],
+            "uptime_percentage": min(100.0, metrics["uptime_percentage"] + rng.uniform(-0.5, 0.5)),
+            "avg_response_time": max(0.0, metrics["avg_response_time"] * rng.uniform(0.8, 1.2)),
+            "total_requests": metrics["total_requests"],
+            "error_rate": max(0.0, metrics["error_rate"] + rng.uniform(-0.2, 0.2)),
+            "active_users": metrics["active_users"],
+            "security_score": metrics["security_score"],
+            "timestamp": now - (i + 1) * 86400
+        })
+    return history
+
+# =============================================================================
+# SERVEUR HTTP DE TEST (sondes APIMonitor)
+# =============================================================================
+
+STUB_BODY = b'{"status":"ok"}'
+
+
+async def _stub_handler(reader, writer):
+    """HTTP/1.1 keep-alive minimal : /error -> 500, /close -> Connection: close, /slow -> +20 ms"""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            path = request_line.split(b' ')[1]
+            status = b'500 Internal Server Error' if path.startswith(b'/error') else b'200 OK'
+            if path.startswith(b'/slow'):
+                await asyncio.sleep(0.02)
+            close = path.startswith(b'/close')
+            writer.write(
+                b'HTTP/1.1 ' + status + b'\r\nContent-Type: application/json\r\n'
+                b'X-Content-Type-Options: nosniff\r\nContent-Length: ' + str(len(STUB_BODY)).encode() +
+                (b'\r\nConnection: close' if close else b'') + b'\r\n\r\n' + STUB_BODY
+            )
+            await writer.drain()
+            if close:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def _run_stub_servers(count: int, ports):
+    async def serve():
+        servers = [await asyncio.start_server(_stub_handler, '127.0.0.1', 0) for _ in range(count)]
+        for server in servers:
+            ports.put(server.sockets[0].getsockname()[1])
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    asyncio.run(serve())
+
+
+def start_stub_servers(count: int):
+    """Serveurs de test dans un processus séparé (CPU du client mesuré seul) -> (processus, ports)"""
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_stub_servers, args=(count, ports), daemon=True)
+    process.start()
+    return process, [ports.get(timeout=10) for _ in range(count)]
+
+# =============================================================================
+# MESURES
+# =============================================================================
+
+def percentile(sorted_values: list, fraction: float):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(name: str, func, args_list: list, items_per_call: int = 1):
+    """Latence par appel (perf_counter_ns) + débit, puis pic mémoire (tracemalloc)"""
+    latencies = []
+    started = time.perf_counter()
+    for args in args_list:
+        t0 = time.perf_counter_ns()
+        func(*args)
+        latencies.append((time.perf_counter_ns() - t0) / 1e6)
+    elapsed = time.perf_counter() - started
+
+    # Passe séparée : tracemalloc fausserait les latences
+    sample = args_list[:max(1, min(len(args_list), 200))]
+    tracemalloc.start()
+    for args in sample:
+        func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    calls = len(latencies)
+    return {
+        "name": name,
+        "calls": calls,
+        "items_per_call": items_per_call,
+        "throughput_per_s": round(calls * items_per_call / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 4),
+        "p95_ms": round(percentile(latencies, 0.95), 4),
+        "p99_ms": round(percentile(latencies, 0.99), 4),
+        "peak_memory_kb": round(peak / 1024, 1)
+    }
+
+
+def measure_probes(app, options):
+    """Débit du moteur de sondes contre les serveurs de test : probes/s et probes/s par cœur"""
+    process, ports = start_stub_servers(options.probe_hosts)
+    try:
+        urls = [f"http://127.0.0.1:{ports[i % len(ports)]}/health" for i in range(options.probe_targets)]
+
+        async def run():
+            monitor = app.APIMonitor(max_per_host=options.probe_per_host)
+            # Contrôle de bout en bout : métriques au format create_api_metrics
+            checks = await monitor.collect_many([
+                {"api_id": "stub-ok", "url": urls[0]},
+                {"api_id": "stub-error", "url": f"http://127.0.0.1:{ports[0]}/error"},
+                {"api_id": "stub-close", "url": f"http://127.0.0.1:{ports[0]}/close"},
+            ], probes=3)
+            if [m["uptime_percentage"] for m in checks] != [100.0, 0.0, 100.0] or checks[1]["error_rate"] != 100.0:
+                raise RuntimeError(f"probe engine self-check failed: {checks}")
+            app.validate_metrics_data(checks[0])
+
+            latencies = []
+            wall_started, cpu_started = time.perf_counter(), time.process_time()
+            for _ in range(options.probe_rounds):
+                samples = await asyncio.gather(*(monitor.probe(url) for url in urls))
+                latencies.extend(sample.latency_ms for sample in samples)
+            wall = time.perf_counter() - wall_started
+            cpu = time.process_time() - cpu_started
+
+            tracemalloc.start()
+            await asyncio.gather(*(monitor.probe(url) for url in urls[:200]))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stats = monitor.stats()
+            await monitor.close()
+            return latencies, wall, cpu, peak, stats
+
+        latencies, wall, cpu, peak, stats = asyncio.run(run())
+    finally:
+        process.terminate()
+
+    if stats["failures"] != 3:  # les 3 sondes /error du contrôle
+        raise RuntimeError(f"probe failures against stub servers: {stats}")
+    latencies.sort()
+    return {
+        "name": "probe_engine",
+        "calls": len(latencies),
+        "items_per_call": 1,
+        "throughput_per_s": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 4),
+        "p95_ms": round(percentile(latencies, 0.95), 4),
+        "p99_ms": round(percentile(latencies, 0.99), 4),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "probes_per_core_s": round(len(latencies) / cpu, 1) if cpu else 0.0,
+        "connections_opened": stats["connections_opened"]
+    }
+
+
+def run_suite(options):
+    """Exécution de tous les benchmarks, stockage isolé dans un répertoire temporaire"""
+    data_dir = tempfile.mkdtemp(prefix="badges-bench-")
+    atexit.register(shutil.rmtree, data_dir, True)
+    os.environ["BADGES_DATA_DIR"] = data_dir
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    from fastapi.testclient import TestClient
+
+    metrics_list = generate_metrics(options.apis, options.seed)
+    histories = [generate_history(m, options.history, options.seed) for m in metrics_list]
+
+    # Historique réel en stockage (ordre chronologique)
+    for metrics, history in zip(metrics_list, histories):
+        app.record_metrics(metrics["api_id"], history[::-1])
+
+    engine = app.badge_engine
+    results = []
+
+    results.append(measure(
+        "validate_metrics_data", app.validate_metrics_data,
+        [(m,) for m in metrics_list]
+    ))
+    results.append(measure(
+        "_calculate_weighted_averages", engine._calculate_weighted_averages,
+        [(m, h) for m, h in zip(metrics_list, histories)]
+    ))
+    results.append(measure(
+        "calculate_badges", lambda m: engine.calculate_badges(m, aggregate=app.aggregates.get(m["api_id"])),
+        [(m,) for m in metrics_list]
+    ))
+
+    # Sketches de latence : 1000 échantillons par API, puis fusion des fenêtres + quantiles
+    rng = random.Random(options.seed)
+    latency_batches = [
+        (m["api_id"], [rng.lognormvariate(3.0, 0.8) for _ in range(1000)]) for m in metrics_list
+    ]
+    results.append(measure(
+        "latency_sketch_add", app.latency_sketches.add_samples, latency_batches, items_per_call=1000
+    ))
+    results.append(measure(
+        "latency_sketch_quantiles",
+        lambda api_id: app.latency_sketches.merged(api_id).quantiles((0.95, 0.99)),
+        [(m["api_id"],) for m in metrics_list]
+    ))
+
+    # Rollups de disponibilité : 6 mois d'observations horaires, puis fenêtres 30 j / 180 j
+    now = time.time()
+    rollup_observations = [
+        (m["api_id"], 60, 60 - (i % 3 == 0), i % 3 == 0, now - i * 3600)
+        for m in metrics_list[:50] for i in range(180 * 24)
+    ]
+    results.append(measure("uptime_rollup_add", app.uptime_rollups.add, rollup_observations))
+    results.append(measure(
+        "uptime_rollup_windows", app.uptime_rollups.gather,
+        [([m["api_id"] for m in metrics_list],)] * 20, items_per_call=len(metrics_list)
+    ))
+
+    client = TestClient(app.app)
+
+    def post(path, body):
+        response = client.post(path, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} -> HTTP {response.status_code}")
+
+    results.append(measure(
+        "http_calculate_badges", lambda m: post("/calculate-badges", m),
+        [(dict(m, avg_response_time=m["avg_response_time"] + 0.01 * r),)
+         for r in range(options.http_rounds) for m in metrics_list[:options.http_calls]]
+    ))
+    results.append(measure(
+        "http_calculate_badges_cached", lambda m: post("/calculate-badges", m),
+        [(metrics_list[0],)] * options.http_calls
+    ))
+
+    bulk_size = min(options.bulk_size, len(metrics_list))
+    bulk_body = metrics_list[:bulk_size]
+    results.append(measure(
+        "http_bulk_calculate", lambda body: post("/bulk-calculate", body),
+        [(bulk_body,)] * options.bulk_rounds, items_per_call=bulk_size
+    ))
+
+    # Lectures GET du catalogue : réponse complète puis revalidation If-None-Match (304)
+    def get(path, headers=None, expected=200):
+        response = client.get(path, headers=headers)
+        if response.status_code != expected:
+            raise RuntimeError(f"{path} -> HTTP {response.status_code}")
+        return response
+
+    lookup_ids = [m["api_id"] for m in bulk_body[:options.http_calls]]
+    etags = {api_id: get(f"/badges/{api_id}").headers["etag"] for api_id in lookup_ids}
+    results.append(measure(
+        "http_badge_lookup", lambda api_id: get(f"/badges/{api_id}"), [(api_id,) for api_id in lookup_ids]
+    ))
+    results.append(measure(
+        "http_badge_lookup_not_modified",
+        lambda api_id: get(f"/badges/{api_id}", {"If-None-Match": etags[api_id]}, 304),
+        [(api_id,) for api_id in lookup_ids]
+    ))
+
+    if options.probe_targets > 0:
+        results.append(measure_probes(app, options))
+
+    return {
+        "config": {
+            "apis": options.apis,
+            "history": options.history,
+            "bulk_size": bulk_size,
+            "probe_targets": options.probe_targets,
+            "probe_hosts": options.probe_hosts,
+            "seed": options.seed
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results
+    }
+
+# =============================================================================
+# DÉMARRAGE À FROID (import, startup, premières requêtes)
+# =============================================================================
+
+# eager : stockages rechargés au démarrage ; lazy : au premier usage ; + artefacts pré-encodés
+STARTUP_MODES = {
+    "eager": {"BADGES_STARTUP_MODE": "eager"},
+    "lazy": {"BADGES_STARTUP_MODE": "lazy", "BADGES_STARTUP_ARTIFACTS": os.devnull},
+    "lazy_artifacts": {"BADGES_STARTUP_MODE": "lazy"},
+}
+STARTUP_STAGES = ("import", "startup", "first_calculate", "first_badge_rules", "first_demo_data", "ready")
+
+
+def prepare_startup_data(data_dir: str, options):
+    """Stockages sauvegardés d'un catalogue synthétique + artefacts de démarrage, dans data_dir"""
+    os.environ["BADGES_DATA_DIR"] = data_dir
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+
+    rng = random.Random(options.seed)
+    now = time.time()
+    metrics_list = generate_metrics(options.apis, options.seed)
+    for metrics in metrics_list:
+        history = generate_history(metrics, options.history, options.seed)
+        app.record_metrics(metrics["api_id"], history[::-1])
+        app.latency_sketches.add_samples(metrics["api_id"], [rng.lognormvariate(3.0, 0.8) for _ in range(100)])
+        for i in range(24):
+            app.uptime_rollups.add(metrics["api_id"], 60, 60, 0, now - i * 3600)
+    app.latency_sketches.save(app.LATENCY_SKETCH_PATH)
+    app.uptime_rollups.save(app.UPTIME_ROLLUP_PATH)
+    app.growth_tracker.save(app.GROWTH_PATH)
+    app.write_startup_artifacts(app.STARTUP_ARTIFACTS_PATH)
+    return metrics_list[0]
+
+
+def peak_rss_kb():
+    """RSS max du processus (VmHWM : ru_maxrss hérite du pic du parent à travers exec sous Linux)"""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_startup_child(data_dir: str):
+    """
+    Processus neuf : import de app, démarrage (lifespan) puis premières requêtes
+    Durées en ms + RSS max sur la sortie standard (JSON) ; arrêt sans shutdown
+    """
+    # Client de test importé hors mesure (httpx : pas une dépendance de app)
+    from fastapi.testclient import TestClient
+    started = time.perf_counter()
+    os.environ["BADGES_DATA_DIR"] = data_dir
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    imported = time.perf_counter()
+
+    client = TestClient(app.app)
+    client.__enter__()
+    timings = {"import": imported - started}
+    stage_started = time.perf_counter()
+    timings["startup"] = stage_started - imported
+    with open(os.path.join(data_dir, "first_request.json"), "r", encoding="utf-8") as f:
+        metrics = json.load(f)
+    for stage, call in (
+        ("first_calculate", lambda: client.post("/calculate-badges", json=metrics)),
+        ("first_badge_rules", lambda: client.get("/badge-rules")),
+        ("first_demo_data", lambda: client.get("/demo-data")),
+    ):
+        response = call()
+        if response.status_code != 200:
+            raise RuntimeError(f"{stage} -> HTTP {response.status_code}")
+        now = time.perf_counter()
+        timings[stage] = now - stage_started
+        stage_started = now
+        if stage == "first_calculate":
+            timings["ready"] = now - started
+    report = {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+    report["max_rss_kb"] = peak_rss_kb()
+    print(json.dumps(report), flush=True)
+    os._exit(0)
+
+
+def run_startup_suite(options):
+    """Démarrages à froid répétés par mode (un processus par mesure), catalogue sauvegardé commun"""
+    data_dir = tempfile.mkdtemp(prefix="badges-startup-")
+    atexit.register(shutil.rmtree, data_dir, True)
+    first_request = prepare_startup_data(data_dir, options)
+    with open(os.path.join(data_dir, "first_request.json"), "w", encoding="utf-8") as f:
+        json.dump(first_request, f)
+
+    results = []
+    for mode, env in STARTUP_MODES.items():
+        runs = []
+        for _ in range(options.startup_runs):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--startup-child", data_dir],
+                env=dict(os.environ, **env), capture_output=True, text=True, check=True
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        rss = sorted(run["max_rss_kb"] for run in runs)
+        for stage in STARTUP_STAGES:
+            latencies = sorted(run[stage] for run in runs)
+            results.append({
+                "name": f"startup_{mode}_{stage}",
+                "calls": len(latencies),
+                "items_per_call": 1,
+                "throughput_per_s": round(1000 / percentile(latencies, 0.50), 1) if percentile(latencies, 0.50) else 0.0,
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+                "p99_ms": percentile(latencies, 0.99),
+                "peak_memory_kb": float(percentile(rss, 0.50))
+            })
+
+    return {
+        "config": {
+            "apis": options.apis,
+            "history": options.history,
+            "startup_runs": options.startup_runs,
+            "seed": options.seed
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results
+    }
+
+# =============================================================================
+# RAPPORT + BASELINES
+# =============================================================================
+
+def print_report(report: dict):
+    header = f"{'benchmark':<42}{'calls':>8}{'items/s':>14}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'peak KB':>11}"
+    print(header)
+    print("-" * len(header))
+    for r in report["results"]:
+        print(f"{r['name']:<42}{r['calls']:>8}{r['throughput_per_s']:>14.1f}"
+              f"{r['p50_ms']:>11.4f}{r['p95_ms']:>11.4f}{r['p99_ms']:>11.4f}{r['peak_memory_kb']:>11.1f}")
+    for r in report["results"]:
+        if "probes_per_core_s" in r:
+            print(f"\n{r['name']}: {r['probes_per_core_s']:.1f} probes per CPU-second "
+                  f"({r['connections_opened']} connections opened)")
+
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float):
+    """Régression : débit en baisse ou p99 en hausse au-delà de la tolérance"""
+    previous = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    for r in report["results"]:
+        old = previous.get(r["name"])
+        if old is None:
+            continue
+        throughput_ratio = r["throughput_per_s"] / old["throughput_per_s"] if old["throughput_per_s"] else 1.0
+        p99_ratio = r["p99_ms"] / old["p99_ms"] if old["p99_ms"] else 1.0
+        status = "ok"
+        if throughput_ratio < 1.0 - tolerance or p99_ratio > 1.0 + tolerance:
+            status = "REGRESSION"
+            regressions.append(r["name"])
+        print(f"{r['name']:<42} throughput x{throughput_ratio:.2f}  p99 x{p99_ratio:.2f}  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks API Performance Badges")
+    parser.add_argument("--apis", type=int, default=2000, help="nombre d'APIs synthétiques")
+    parser.add_argument("--history", type=int, default=30, help="points d'historique par API")
+    parser.add_argument("--bulk-size", type=int, default=1000, help="taille du lot /bulk-calculate")
+    parser.add_argument("--bulk-rounds", type=int, default=5)
+    parser.add_argument("--http-calls", type=int, default=500)
+    parser.add_argument("--http-rounds", type=int, default=1)
+    parser.add_argument("--probe-targets", type=int, default=2000, help="sondes par vague (0 = désactivé)")
+    parser.add_argument("--probe-rounds", type=int, default=5)
+    parser.add_argument("--probe-hosts", type=int, default=4, help="serveurs HTTP de test")
+    parser.add_argument("--probe-per-host", type=int, default=16, help="connexions max par hôte")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-baseline", metavar="PATH", help="enregistrer le rapport comme baseline")
+    parser.add_argument("--compare", metavar="PATH", help="comparer avec une baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="écart toléré (0.10 = 10%%)")
+    parser.add_argument("--startup", action="store_true",
+                        help="démarrage à froid uniquement (eager / lazy / lazy + artefacts)")
+    parser.add_argument("--startup-runs", type=int, default=5, help="démarrages mesurés par mode")
+    parser.add_argument("--startup-child", metavar="DATA_DIR", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.startup_child:
+        run_startup_child(options.startup_child)
+
+    report = run_startup_suite(options) if options.startup else run_suite(options)
+    print_report(report)
+
+    if options.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(options.save_baseline)), exist_ok=True)
+        with open(options.save_baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f"\nBaseline saved to {options.save_baseline}")
+
+    if options.compare:
+        with open(options.compare, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"\nComparison with {options.compare} (tolerance {options.tolerance:.0%})")
+        if compare_with_baseline(report, baseline, options.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# Stockage isolé + planificateur / pool de processus désactivés, avant l'import de app
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("BADGES_DATA_DIR", tempfile.mkdtemp(prefix="badges-tests-"))
+os.environ.setdefault("BADGES_SCHEDULER_ENABLED", "0")
+os.environ.setdefault("BADGES_BULK_WORKERS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as badges_app
+
+
+@pytest.fixture(scope="session")
+def app():
+    return badges_app
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(badges_app.app) as test_client:
+        yield test_client
+
+
+_api_counter = [0]
+
+
+@pytest.fixture
+def metrics():
+    """Métriques valides d'une API jamais vue (état global partagé entre les tests)"""
+    _api_counter[0] += 1
+    return {
+        "api_id": f"test-api-{_api_counter[0]}",
+        "uptime_percentage": 99.95,
+        "avg_response_time": 45.0,
+        "total_requests": 20000,
+        "error_rate": 0.2,
+        "active_users": 3000,
+        "security_score": 9.5
+    }
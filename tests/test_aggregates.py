@@ -0,0 +1,93 @@
+import random
+import time
+
+import pytest
+
+FIELDS = ('uptime_percentage', 'avg_response_time', 'error_rate', 'security_score')
+
+
+def random_point(rng, api_id, timestamp):
+    return {
+        "api_id": api_id,
+        "uptime_percentage": rng.uniform(90.0, 100.0),
+        "avg_response_time": rng.lognormvariate(4.0, 0.8),
+        "total_requests": rng.randint(0, 50000),
+        "error_rate": rng.uniform(0.0, 5.0),
+        "active_users": rng.randint(0, 20000),
+        "security_score": rng.uniform(5.0, 10.0),
+        "timestamp": timestamp
+    }
+
+
+@pytest.fixture
+def replay(tmp_path, app):
+    """Historique aléatoire stocké -> (agrégats rejoués depuis le disque, historique du plus récent au plus ancien)"""
+    def build(seed, points):
+        rng = random.Random(seed)
+        store = app.MetricsStore(str(tmp_path / f"store-{seed}"), max_points=points)
+        now = time.time()
+        history = [random_point(rng, "api", now - (points - i) * 60) for i in range(points)]
+        store.append_many("api", history)
+        return app.DecayedAggregates(store), history[::-1], rng
+    return build
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_incremental_matches_formula_within_tolerance(app, replay, seed):
+    aggregates, history, rng = replay(seed, 400)
+    current = random_point(rng, "api", time.time())
+    sums, weight = aggregates.get("api")
+    incremental = app.badge_engine._weighted_averages_from_aggregate(current, sums, weight)
+    formula = app.badge_engine._calculate_weighted_averages(current, history)
+    for key in FIELDS:
+        assert abs(incremental[key] - formula[key]) <= app.AGGREGATE_TOLERANCE * abs(formula[key])
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_badge_decisions_agree_outside_threshold_band(app, replay, seed):
+    aggregates, history, rng = replay(seed, 30)
+    current = random_point(rng, "api", time.time())
+    earned_at = "2024-01-01T00:00:00"
+    incremental = {badge["id"]: badge["confidence_score"] for badge in
+                   app.badge_engine.calculate_badges(current, aggregate=aggregates.get("api"), earned_at=earned_at)}
+    formula = {badge["id"]: badge["confidence_score"] for badge in
+               app.badge_engine.calculate_badges(current, historical_data=history, earned_at=earned_at)}
+    for badge_id in incremental.keys() & formula.keys():
+        assert incremental[badge_id] == pytest.approx(formula[badge_id], abs=1e-9)
+    # Décisions divergentes seulement à AGGREGATE_TOLERANCE du seuil de confiance
+    for badge_id in incremental.keys() ^ formula.keys():
+        confidence = incremental.get(badge_id, formula.get(badge_id))
+        assert confidence - app.CONFIDENCE_THRESHOLD < 1e-9
+
+
+def test_incremental_updates_match_replay(app, replay):
+    aggregates, history, rng = replay(7, 50)
+    point = random_point(rng, "api", time.time())
+    aggregates.store.append_many("api", [point])
+    before_sums, before_weight = aggregates.get("api")
+    rebuilt = app.DecayedAggregates(aggregates.store)
+    sums, weight = rebuilt.get("api")
+    assert weight == pytest.approx(before_weight)
+    assert sums == pytest.approx(before_sums)
+
+
+def test_unknown_api_does_not_allocate_a_row(client, app, metrics):
+    rows = len(app.aggregates._rows)
+    for i in range(20):
+        assert client.post("/calculate-badges", json=dict(metrics, api_id=f"never-stored-{i}")).status_code == 200
+    sums, weight = app.aggregates.get("never-stored-0")
+    assert weight == 0.0 and sums == [0.0] * len(sums)
+    assert len(app.aggregates._rows) == rows
+
+
+def test_failed_store_write_leaves_aggregates_untouched(app, metrics):
+    with pytest.raises(Exception):
+        app.record_metrics(metrics["api_id"], [dict(metrics, total_requests=2 ** 70)])
+    assert app.aggregates.get(metrics["api_id"])[1] == 0.0
+
+
+def test_record_counts_each_point_once(app, metrics):
+    app.record_metrics(metrics["api_id"], [metrics])
+    app.record_metrics(metrics["api_id"], [metrics])
+    assert app.aggregates.get(metrics["api_id"])[1] == pytest.approx(1.95)
+    assert len(app.metrics_store.read_last(metrics["api_id"], 10)) == 2
@@ -0,0 +1,127 @@
+import copy
+
+import pytest
+
+
+@pytest.fixture
+def rules(app):
+    """Règles par défaut rétablies après le test (badges ajoutés retirés, modifiés restaurés)"""
+    original = copy.deepcopy(app.badge_engine.badge_rules)
+    yield original
+    current = app.badge_engine.badge_rules
+    for badge_id in list(current):
+        if badge_id not in original:
+            app.apply_badge_rule_change(badge_id, None)
+    for badge_id, config in original.items():
+        if current.get(badge_id) != config:
+            app.apply_badge_rule_change(badge_id, config)
+
+
+def _fast(rules, **changes):
+    config = copy.deepcopy(rules["lightning_fast"])
+    config["criteria"] = dict(config["criteria"], **changes.pop("criteria", {}))
+    config.update(changes)
+    return config
+
+
+def _badges(client, api_id):
+    return {badge["id"] for badge in client.get(f"/badges/{api_id}").json()["badges"]}
+
+
+@pytest.fixture
+def apis(client, metrics):
+    """Une API à 40 ms et trois à 80 ms, toutes lightning_fast avec les règles par défaut"""
+    prefix = metrics["api_id"]
+    batch = [dict(metrics, api_id=f"{prefix}-fast", avg_response_time=40.0)]
+    batch += [dict(metrics, api_id=f"{prefix}-slow-{i}", avg_response_time=80.0) for i in range(3)]
+    client.post("/bulk-calculate", json=batch)
+    assert all("lightning_fast" in _badges(client, m["api_id"]) for m in batch)
+    return [m["api_id"] for m in batch]
+
+
+def test_criteria_change_recomputes_only_that_badge(client, app, rules, apis, monkeypatch):
+    reevaluated = []
+    reevaluate = app.reevaluate_catalog_badges
+
+    def recording(badge_ids):
+        reevaluated.append(list(badge_ids))
+        return reevaluate(badge_ids)
+
+    monkeypatch.setattr(app, "reevaluate_catalog_badges", recording)
+    before = {api_id: _badges(client, api_id) for api_id in apis}
+    body = client.put("/badge-rules/lightning_fast", json=_fast(rules, criteria={"response_time": 50})).json()
+
+    assert body["change"] == "updated"
+    assert body["reevaluated_badges"] == ["lightning_fast"] and reevaluated == [["lightning_fast"]]
+    assert sorted(body["dependencies"]) == ["avg_response_time", "total_requests"]
+    fast, slow = apis[0], apis[1:]
+    assert _badges(client, fast) == before[fast]
+    for api_id in slow:
+        assert _badges(client, api_id) == before[api_id] - {"lightning_fast"}
+        assert body["diff"][api_id] == {"gained": [], "lost": ["lightning_fast"]}
+    assert fast not in body["diff"]
+    assert body["summary"]["lightning_fast"]["lost"] >= 3
+
+    restored = client.put("/badge-rules/lightning_fast", json=rules["lightning_fast"]).json()
+    for api_id in slow:
+        assert restored["diff"][api_id] == {"gained": ["lightning_fast"], "lost": []}
+        assert "lightning_fast" in _badges(client, api_id)
+
+
+def test_diff_is_truncated_to_diff_limit(client, rules, apis):
+    body = client.put("/badge-rules/lightning_fast", params={"diff_limit": 1},
+                      json=_fast(rules, criteria={"response_time": 50})).json()
+    assert body["changed_apis"] >= 3
+    assert len(body["diff"]) == 1
+    assert body["diff_truncated"] is True
+
+
+def test_add_and_delete_a_badge(client, app, rules, apis):
+    config = {"name": "Sub 50", "icon": "s", "description": "d", "criteria": {"response_time": 50}}
+    added = client.put("/badge-rules/sub_50", json=config).json()
+    assert added["change"] == "added"
+    assert added["reevaluated_badges"] == ["sub_50"]
+    assert added["diff"][apis[0]] == {"gained": ["sub_50"], "lost": []}
+    assert "sub_50" in _badges(client, apis[0])
+    assert all("sub_50" not in _badges(client, api_id) for api_id in apis[1:])
+    assert app.badge_engine.badge_versions["sub_50"] == added["rules_version"]
+
+    removed = client.delete("/badge-rules/sub_50").json()
+    assert removed["change"] == "removed"
+    assert removed["diff"][apis[0]] == {"gained": [], "lost": ["sub_50"]}
+    assert "sub_50" not in _badges(client, apis[0])
+    assert "sub_50" not in app.badge_engine.badge_rules
+    assert client.delete("/badge-rules/sub_50").status_code == 404
+
+
+def test_metadata_change_does_not_reevaluate(client, app, rules, apis, monkeypatch):
+    def forbidden(badge_ids):
+        raise AssertionError("metadata change must not re-evaluate")
+
+    monkeypatch.setattr(app, "reevaluate_catalog_badges", forbidden)
+    version = app.badge_engine.rules_version
+    body = client.put("/badge-rules/lightning_fast", json=_fast(rules, name="Very Fast")).json()
+    assert body["change"] == "metadata_updated"
+    assert body["reevaluated_badges"] == [] and body["reevaluated_apis"] == 0
+    assert body["diff"] == {}
+    assert app.badge_engine.rules_version == version + 1
+    assert client.get("/badge-rules").json()["available_badges"]["lightning_fast"]["name"] == "Very Fast"
+
+    unchanged = client.put("/badge-rules/lightning_fast", json=_fast(rules, name="Very Fast")).json()
+    assert unchanged["change"] == "unchanged"
+
+
+@pytest.mark.parametrize("config, message", [
+    ({"name": "x", "icon": "x", "description": "x"}, "missing fields"),
+    ({"name": "x", "icon": "x", "description": "x", "criteria": {}}, "non-empty"),
+    ({"name": "x", "icon": "x", "description": "x", "criteria": {"no_such_metric": 1}}, "unknown criterion"),
+    ({"name": "x", "icon": "x", "description": "x", "criteria": {"uptime": 0}}, "positive number"),
+    ({"name": "x", "icon": "x", "description": "x", "criteria": {"uptime": True}}, "positive number"),
+    ({"name": 3, "icon": "x", "description": "x", "criteria": {"uptime": 99}}, "name must be a string"),
+])
+def test_invalid_rules_are_rejected(client, app, rules, config, message):
+    version = app.badge_engine.rules_version
+    response = client.put("/badge-rules/broken", json=config)
+    assert response.status_code == 400
+    assert message in response.json()["detail"]["message"]
+    assert app.badge_engine.rules_version == version
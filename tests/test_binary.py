@@ -0,0 +1,149 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+BINARY = {"content-type": "application/x-badges-bulk", "accept": "application/json"}
+
+
+def encode_bulk(app, items):
+    """Corps application/x-badges-bulk d'une liste de métriques complètes"""
+    ids = [item["api_id"].encode("utf-8") for item in items]
+    width = max((len(api_id) for api_id in ids), default=0)
+    blocks = [app.BULK_INPUT_HEADER.pack(app.BULK_INPUT_MAGIC, len(items), width)]
+    blocks.append(app._pad8(b"".join(api_id.ljust(width, b"\0") for api_id in ids)))
+    for field, dtype in zip(app.METRIC_FIELDS, app.BULK_COLUMN_DTYPES):
+        blocks.append(np.array([item[field] for item in items], dtype=dtype).tobytes())
+    return b"".join(blocks)
+
+
+def _batch(size: int, seed: int):
+    rng = random.Random(seed)
+    batch = [
+        {
+            "api_id": f"binary-{seed}-{rng.randint(0, size // 4)}",
+            "uptime_percentage": round(rng.uniform(95, 100), 3),
+            "avg_response_time": round(rng.uniform(10, 200), 1),
+            "total_requests": rng.randint(0, 20000),
+            "error_rate": round(rng.uniform(0, 3), 2),
+            "active_users": rng.randint(0, 5000),
+            "security_score": round(rng.uniform(5, 10), 1)
+        }
+        for _ in range(size)
+    ]
+    batch[3] = dict(batch[3], uptime_percentage=120.0)
+    batch[5] = dict(batch[5], total_requests=2 ** 60)
+    batch[7] = dict(batch[0])
+    batch[9] = dict(batch[3])
+    batch[11] = dict(batch[11], api_id="")
+    return batch
+
+
+def _strip(content):
+    results = [
+        (r["api_id"], [(b["id"], b["confidence_score"]) for b in r["badges"]], r["commission_info"])
+        for r in content["results"]
+    ]
+    errors = [
+        (e["index"], e["api_id"], e["status"],
+         {k: v for k, v in e["error"].items() if k != "timestamp"} if isinstance(e["error"], dict) else e["error"])
+        for e in content["errors"]
+    ]
+    return results, errors
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_binary_matches_json(client, app, seed):
+    batch = _batch(300, seed)
+    json_content = client.post("/bulk-calculate", json=batch).json()
+    binary_content = client.post("/bulk-calculate", content=encode_bulk(app, batch), headers=BINARY).json()
+
+    assert _strip(binary_content) == _strip(json_content)
+    assert binary_content["processed_apis"] == json_content["processed_apis"]
+
+
+def test_binary_response_matches_json(client, app):
+    batch = _batch(200, 3)
+    json_content = client.post("/bulk-calculate", json=batch).json()
+    body = client.post(
+        "/bulk-calculate", content=encode_bulk(app, batch), headers={"content-type": BINARY["content-type"]}
+    ).content
+
+    magic, n, width, k, names_size = app.BULK_RESULT_HEADER.unpack_from(body)
+    assert magic == app.BULK_RESULT_MAGIC and n == len(batch)
+    offset = app.BULK_RESULT_HEADER.size
+    names = body[offset:offset + names_size].decode("utf-8").split("\n")
+    offset += names_size + (-names_size % 8)
+    offset += n * width + (-(n * width) % 8)
+    status = np.frombuffer(body, dtype=np.uint8, count=n, offset=offset)
+    offset += n + (-n % 8)
+    offset += 4 * n + (-(4 * n) % 8)
+    confidences = np.frombuffer(body, dtype="<f8", count=k * n, offset=offset).reshape(k, n)
+
+    failed = {error["index"] for error in json_content["errors"]}
+    assert set(np.flatnonzero(status).tolist()) == failed
+    results = iter(json_content["results"])
+    for index in range(n):
+        if index in failed:
+            continue
+        awarded = {badge["id"]: badge["confidence_score"] for badge in next(results)["badges"]}
+        column = confidences[:, index]
+        assert {names[b]: float(column[b]) for b in range(k) if not math.isnan(column[b])} == awarded
+
+
+def test_binary_duplicates_are_evaluated_once(client, app, metrics, monkeypatch):
+    other = dict(metrics, api_id=metrics["api_id"] + "-other")
+    batch = [metrics, other, metrics, metrics]
+    evaluated = []
+    evaluate = app.evaluate_binary_rows
+
+    def recording(api_ids, raw, timings, state):
+        evaluated.append(list(api_ids))
+        return evaluate(api_ids, raw, timings, state)
+
+    monkeypatch.setattr(app, "evaluate_binary_rows", recording)
+    before = app.request_coalescer.stats()["bulk_duplicates"]
+    content = client.post("/bulk-calculate", content=encode_bulk(app, batch), headers=BINARY).json()
+
+    assert evaluated == [[metrics["api_id"], other["api_id"]]]
+    assert app.request_coalescer.stats()["bulk_duplicates"] == before + 2
+    assert [r["api_id"] for r in content["results"]] == [m["api_id"] for m in batch]
+
+
+def test_binary_catalog_keeps_the_last_row(client, app, metrics):
+    fast = dict(metrics, avg_response_time=40.0)
+    slow = dict(metrics, avg_response_time=400.0)
+    client.post("/bulk-calculate", content=encode_bulk(app, [fast, slow, fast]), headers=BINARY)
+    binary_badges = client.get(f"/badges/{metrics['api_id']}").json()["badges"]
+
+    json_id = metrics["api_id"] + "-json"
+    batch = [dict(m, api_id=json_id) for m in (fast, slow, fast)]
+    client.post("/bulk-calculate", json=batch)
+    assert client.get(f"/badges/{json_id}").json()["badges"] == binary_badges
+    assert "lightning_fast" in {badge["id"] for badge in binary_badges}
+
+
+def test_binary_process_pool_matches_in_process(client, app, monkeypatch):
+    batch = _batch(400, 4)
+    body = encode_bulk(app, batch)
+    in_process = client.post("/bulk-calculate", content=body, headers=BINARY).json()
+
+    monkeypatch.setattr(app, "BULK_PROCESS_WORKERS", 2)
+    monkeypatch.setattr(app, "BULK_PARALLEL_THRESHOLD", 100)
+    submitted = []
+    submit = app.submit_bulk_columns
+
+    def recording(*args):
+        future = submit(*args)
+        submitted.append(future)
+        return future
+
+    monkeypatch.setattr(app, "submit_bulk_columns", recording)
+    try:
+        parallel = client.post("/bulk-calculate", content=body, headers=BINARY).json()
+    finally:
+        app.reset_bulk_process_pool(app.get_bulk_process_pool())
+
+    assert submitted and all(future is not None for future in submitted)
+    assert _strip(parallel) == _strip(in_process)
@@ -0,0 +1,112 @@
+import asyncio
+
+
+def test_repeated_calculation_is_served_from_cache(client, app, metrics):
+    first = client.post("/calculate-badges", json=metrics).json()
+    hits = app.badge_cache.hits
+    second = client.post("/calculate-badges", json=metrics).json()
+    assert app.badge_cache.hits == hits + 1
+    assert second["badges"] == first["badges"]
+
+
+def test_put_after_invalidation_is_dropped(app, metrics):
+    cache = app.BadgeResultCache()
+    record = app.parse_metrics(metrics)
+    cached, token = cache.lookup(record, 1)
+    assert cached is None
+    # Nouvelles métriques ingérées pendant le calcul
+    cache.invalidate(record.api_id)
+    cache.put(record, 1, ([], {}), token)
+    assert cache.get(record, 1) is None
+    assert cache.stats()["stale_puts"] == 1
+    # Un calcul démarré après l'invalidation se stocke normalement
+    cached, token = cache.lookup(record, 1)
+    cache.put(record, 1, ([], {}), token)
+    assert cache.get(record, 1) == ([], {})
+
+
+def test_put_after_clear_is_dropped(app, metrics):
+    cache = app.BadgeResultCache()
+    record = app.parse_metrics(metrics)
+    _, token = cache.lookup(record, 1)
+    cache.clear()
+    cache.put(record, 1, ([], {}), token)
+    assert cache.get(record, 1) is None
+
+
+def test_ingest_during_calculation_is_not_masked(client, app, metrics, monkeypatch):
+    """record_metrics entre le lookup et le put : pas de résultat périmé en cache"""
+    api_id = metrics["api_id"]
+    newer = dict(metrics, uptime_percentage=50.0)
+    calculate = app.badge_engine.calculate_badges
+
+    def calculate_then_ingest(*args, **kwargs):
+        badges = calculate(*args, **kwargs)
+        app.record_metrics(api_id, [app.parse_metrics(newer)])
+        return badges
+
+    monkeypatch.setattr(app.badge_engine, "calculate_badges", calculate_then_ingest)
+    asyncio.run(app.render_calculation(metrics))
+    monkeypatch.undo()
+    assert app.badge_cache.get(app.parse_metrics(metrics), app.badge_engine.rules_version) is None
+
+
+def test_rank_results_follow_the_population(client, app, metrics, monkeypatch):
+    """Critère de rang : un résultat en cache ne survit pas à un déplacement de la population"""
+    population = app.MetricRanks()
+    monkeypatch.setattr(app.badge_engine, "rank_source", population)
+    monkeypatch.setattr(app.badge_catalog, "ranks", population)
+    rule = {"name": "Top users", "icon": "t", "description": "d", "criteria": {"top_active_users": 10}}
+    assert client.put("/badge-rules/top_users", json=rule).status_code == 200
+    try:
+        prefix = metrics["api_id"]
+        client.post("/bulk-calculate", json=[
+            dict(metrics, api_id=f"{prefix}-small-{i}", active_users=100 * (i + 1)) for i in range(29)
+        ])
+        top = dict(metrics, active_users=10 ** 6)
+        ids = lambda body: {badge["id"] for badge in body["badges"]}
+        assert "top_users" in ids(client.post("/calculate-badges", json=top).json())
+
+        for i in range(29):
+            client.post("/calculate-badges", json=dict(metrics, api_id=f"{prefix}-big-{i}", active_users=10 ** 7 + i))
+        assert population.top_percent("active_users", 10 ** 6, prefix) > 10
+
+        assert "top_users" not in ids(client.post("/calculate-badges", json=top).json())
+        catalog_ids = {badge["id"] for badge in client.get(f"/badges/{prefix}").json()["badges"]}
+        assert "top_users" not in catalog_ids
+    finally:
+        client.delete("/badge-rules/top_users")
+
+
+def test_generations_stay_bounded(app, metrics):
+    cache = app.BadgeResultCache(max_entries=10)
+    record = app.parse_metrics(metrics)
+    in_flight = app.parse_metrics(dict(metrics, api_id="in-flight"))
+    cache.put(record, 1, ([], {}))
+    _, token = cache.lookup(in_flight, 1)
+    # Invalidations d'APIs jamais mises en cache (ingestion continue)
+    for i in range(25):
+        cache.invalidate(f"ingested-{i}")
+    assert cache.stats()["generations"] <= 10
+    # Entrées conservées, mais le calcul en cours ne peut plus se stocker
+    assert cache.get(record, 1) == ([], {})
+    cache.put(in_flight, 1, ([], {}), token)
+    assert cache.get(in_flight, 1) is None
+
+    cache.invalidate("in-flight")
+    cache.clear()
+    assert cache.stats()["generations"] == 0
+
+
+def test_compaction_forgets_generations(client, app, metrics):
+    record = app.parse_metrics(metrics)
+    _, token = app.badge_cache.lookup(record, app.badge_engine.rules_version)
+    app.badge_cache.invalidate(metrics["api_id"])
+    assert app.badge_cache.stats()["generations"] >= 1
+
+    result = client.post("/storage/compact").json()
+    assert result["cache_generations_pruned"] >= 1
+    assert app.badge_cache.stats()["generations"] == 0
+    # Génération oubliée : le jeton d'avant l'invalidation reste périmé
+    app.badge_cache.put(record, app.badge_engine.rules_version, ([], {}), token)
+    assert app.badge_cache.get(record, app.badge_engine.rules_version) is None
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+
+def _batch(size: int, seed: int):
+    rng = random.Random(seed)
+    return [
+        {
+            "api_id": f"columnar-{seed}-{i}",
+            # Valeurs proches des seuils : décisions et arrondis sensibles
+            "uptime_percentage": rng.choice([99.9, 99.95, 99.99, rng.uniform(97, 100)]),
+            "avg_response_time": rng.choice([50.0, 100.0, 200.0, rng.uniform(10, 400)]),
+            "total_requests": rng.choice([10000, 100000, rng.randint(0, 2000000)]),
+            "error_rate": rng.choice([0.1, 1.0, rng.uniform(0, 5)]),
+            "active_users": rng.choice([1000, 10000, rng.randint(0, 50000)]),
+            "security_score": rng.choice([8.0, 9.0, 9.5, rng.uniform(5, 10)])
+        }
+        for i in range(size)
+    ]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_columnar_matches_scalar(app, seed):
+    batch = _batch(400, seed)
+    rng = random.Random(seed)
+    for metrics in batch[::3]:
+        history = [dict(metrics, avg_response_time=rng.uniform(10, 400)) for _ in range(rng.randint(1, 4))]
+        app.record_metrics(metrics["api_id"], history)
+
+    earned_at = app.get_current_timestamp()
+    columnar = app.ColumnarBadgeEngine(app.badge_engine, app.aggregates).calculate_batch(batch, earned_at=earned_at)
+    for metrics, badges in zip(batch, columnar):
+        scalar = app.badge_engine.calculate_badges(
+            metrics, aggregate=app.aggregates.get(metrics["api_id"]), earned_at=earned_at
+        )
+        assert badges is not None
+        assert [(b["id"], b["confidence_score"]) for b in badges] == \
+            [(b["id"], b["confidence_score"]) for b in scalar]
+
+
+def test_columnar_leaves_ineligible_rows_to_the_scalar_path(app, metrics):
+    batch = [
+        dict(metrics, uptime_percentage=101),
+        dict(metrics, total_requests=2 ** 60),
+        dict(metrics, security_score="9"),
+        {k: v for k, v in metrics.items() if k != "error_rate"},
+        dict(metrics, api_id=""),
+        metrics
+    ]
+    results = app.ColumnarBadgeEngine(app.badge_engine, app.aggregates).calculate_batch(batch)
+    assert results[:5] == [None] * 5
+    assert results[5] is not None
+
+
+def test_missing_fields_are_reported(client, metrics):
+    del metrics["error_rate"]
+    response = client.post("/calculate-badges", json=metrics)
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["error"] == "Missing required fields"
+    assert detail["missing_fields"] == ["error_rate"]
+
+
+@pytest.mark.parametrize("field, value", [
+    ("uptime_percentage", 100.5),
+    ("uptime_percentage", "99"),
+    ("avg_response_time", -1),
+    ("total_requests", 1.5),
+    ("error_rate", 101),
+    ("active_users", -3),
+    ("security_score", 11),
+    ("api_id", ""),
+])
+def test_invalid_values_are_rejected(client, metrics, field, value):
+    response = client.post("/calculate-badges", json=dict(metrics, **{field: value}))
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "Invalid data format"
+
+
+def test_bulk_reports_failures_by_index(client, metrics):
+    batch = [metrics, dict(metrics, api_id=metrics["api_id"] + "-bad", error_rate=-1), {}]
+    content = client.post("/bulk-calculate", json=batch).json()
+    assert content["successful_processing"] == 1
+    assert [(e["index"], e["status"]) for e in content["errors"]] == \
+        [(1, "validation_failed"), (2, "validation_failed")]
+    assert content["errors"][1]["api_id"] == "unknown-2"
+
+
+@pytest.mark.parametrize("body", [b"", b"BDGBULK0" + b"\0" * 8, b"BDGBULK1" + b"\1\0\0\0\4\0\0\0" + b"x" * 8])
+def test_malformed_binary_payload_is_rejected(client, body):
+    response = client.post("/bulk-calculate", content=body, headers={"content-type": "application/x-badges-bulk"})
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "Invalid binary payload"
@@ -0,0 +1,105 @@
+import itertools
+
+_series = itertools.count()
+
+
+def _apis(metrics, count: int):
+    """APIs isolées des autres tests par un nombre d'utilisateurs propre à la série"""
+    base = 10 ** 12 * (next(_series) + 1)
+    return [
+        dict(metrics, api_id=f"{metrics['api_id']}-{i}", active_users=base + i)
+        for i in range(count)
+    ], base
+
+
+def test_result_etag_and_not_modified(client, metrics):
+    client.post("/calculate-badges", json=metrics)
+    response = client.get(f"/badges/{metrics['api_id']}")
+    etag = response.headers["etag"]
+
+    cached = client.get(f"/badges/{metrics['api_id']}", headers={"if-none-match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert client.get(f"/badges/{metrics['api_id']}", headers={"if-none-match": f'W/{etag}, "x"'}).status_code == 304
+
+    client.post("/calculate-badges", json=dict(metrics, avg_response_time=900.0, uptime_percentage=90.0))
+    changed = client.get(f"/badges/{metrics['api_id']}", headers={"if-none-match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["version"] > response.json()["version"]
+
+
+def test_unknown_api_is_not_found(client):
+    response = client.get("/badges/never-calculated")
+    assert response.status_code == 404
+    assert response.json()["detail"]["error"] == "Unknown API"
+
+
+def test_changes_feed_pages_every_change_once(client, metrics):
+    start = client.get("/badge-changes", params={"limit": 1}).json()["version"]
+    apis, _ = _apis(metrics, 7)
+    client.post("/bulk-calculate", json=apis)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"since": start, "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/badge-changes", params=params).json()
+        seen.extend(page["changes"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    ours = [change for change in seen if change["api_id"].startswith(metrics["api_id"])]
+    assert sorted(change["api_id"] for change in ours) == sorted(api["api_id"] for api in apis)
+    # Une version par mise à jour du catalogue : les pages suivent (version, ligne)
+    versions = [change["version"] for change in seen]
+    assert versions == sorted(versions)
+    assert len({change["api_id"] for change in seen}) == len(seen)
+    assert pages >= 3
+
+    etag = client.get("/badge-changes", params={"since": page["version"]}).headers["etag"]
+    assert client.get("/badge-changes", params={"since": page["version"]},
+                      headers={"if-none-match": etag}).status_code == 304
+
+
+def test_changes_feed_resets_on_a_new_epoch(client, metrics):
+    client.post("/calculate-badges", json=metrics)
+    current = client.get("/badge-changes", params={"limit": 1}).json()
+    page = client.get("/badge-changes", params={"since": current["version"], "epoch": "other"}).json()
+    assert page["reset"] is True
+    assert page["since"] == 0
+    assert page["total_changes"] > 0
+
+
+def test_changes_feed_rejects_bad_parameters(client):
+    assert client.get("/badge-changes", params={"limit": 0}).status_code == 400
+    assert client.get("/badge-changes", params={"since": -1}).status_code == 400
+    assert client.get("/badge-changes", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_query_pages_follow_the_sort_order(client, metrics):
+    apis, base = _apis(metrics, 7)
+    client.post("/bulk-calculate", json=apis)
+
+    params = {"sort": "active_users", "min_active_users": base, "limit": 3}
+    ids, cursor = [], None
+    while True:
+        page = client.get("/catalog/query", params=dict(params, cursor=cursor) if cursor else params).json()
+        ids.extend(item["api_id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert ids == [api["api_id"] for api in reversed(apis)]
+    first_cursor = client.get("/catalog/query", params=params).json()["next_cursor"]
+    mismatched = client.get("/catalog/query", params={"sort": "uptime", "cursor": first_cursor})
+    assert mismatched.status_code == 400
+
+
+def test_query_rejects_unknown_badges(client):
+    response = client.get("/catalog/query", params={"badges": "no_such_badge"})
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "Invalid catalog query"
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+
+def test_concurrent_identical_calls_share_one_computation(app, metrics, monkeypatch):
+    release = threading.Event()
+    calls = []
+    compute = app.compute_calculation
+
+    def blocking_compute(*args):
+        calls.append(threading.current_thread().name)
+        release.wait(5)
+        return compute(*args)
+
+    monkeypatch.setattr(app, "compute_calculation", blocking_compute)
+
+    async def scenario():
+        coalesced = app.request_coalescer.coalesced
+        tasks = [asyncio.create_task(app.calculate_api_badges(dict(metrics))) for _ in range(5)]
+        # La boucle reste libre pendant le calcul : les suiveurs rejoignent le vol en cours
+        while app.request_coalescer.coalesced < coalesced + 4:
+            await asyncio.sleep(0.001)
+        release.set()
+        responses = await asyncio.gather(*tasks)
+        return {response.body for response in responses}
+
+    bodies = asyncio.run(scenario())
+    assert len(bodies) == 1
+    assert len(calls) == 1
+    assert calls[0].startswith("calc-badges")
+
+
+def test_cache_miss_runs_off_the_event_loop(client, app, metrics, monkeypatch):
+    threads = []
+    get = app.aggregates.get
+
+    def recording_get(api_id):
+        threads.append(threading.current_thread())
+        return get(api_id)
+
+    monkeypatch.setattr(app.aggregates, "get", recording_get)
+    assert client.post("/calculate-badges", json=metrics).status_code == 200
+    assert threads and threads[0].name.startswith("calc-badges")
+
+
+def test_bulk_items_are_deduplicated(client, app, metrics):
+    duplicates = app.request_coalescer.bulk_duplicates
+    response = client.post("/bulk-calculate", json=[metrics, dict(metrics), dict(metrics)])
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 3
+    assert results[0]["badges"] == results[1]["badges"] == results[2]["badges"]
+    assert app.request_coalescer.bulk_duplicates == duplicates + 2
@@ -0,0 +1,38 @@
+import json
+import sys
+import threading
+
+from fastapi.responses import JSONResponse
+
+
+def test_calculation_body_matches_json_response(app, metrics):
+    badges = app.badge_engine.calculate_badges(metrics)
+    commission = app.commission_calc.calculate_commission_impact(len(badges))
+    content = {"api_id": metrics["api_id"], "badges": badges, "business_impact": commission}
+    expected = JSONResponse(json.loads(json.dumps(content, default=dict))).body
+    assert app.badge_encoder.encode_calculation(content) == expected
+
+
+def test_earned_at_not_shared_between_concurrent_encodings(app):
+    template = app.intern_badge_template('trusted_api', app.badge_engine.badge_rules['trusted_api'])
+    errors = []
+
+    def encode(stamp):
+        awards = [app.BadgeAward(template, 0.9, stamp) for _ in range(20)]
+        for _ in range(2000):
+            encoded = json.loads(app.badge_encoder.encode_badges(awards))
+            if any(badge['earned_at'] != stamp for badge in encoded):
+                errors.append(stamp)
+                return
+
+    threads = [threading.Thread(target=encode, args=(f"2024-01-0{i}T00:00:00",)) for i in range(1, 5)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert not errors
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+QS = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+
+def _samples(seed: int, size: int = 20000):
+    rng = np.random.default_rng(seed)
+    # Corps log-normal + queue lente + quelques zéros
+    values = np.concatenate([rng.lognormal(3.5, 0.6, size), rng.uniform(500, 5000, size // 50), np.zeros(10)])
+    return rng.permutation(values)
+
+
+def _assert_within_alpha(sketch, values):
+    for q, estimate in zip(QS, sketch.quantiles(QS)):
+        exact = np.percentile(values, q * 100, method="lower")
+        assert abs(estimate - exact) <= sketch.alpha * exact + 1e-9, (q, estimate, exact)
+
+
+@pytest.mark.parametrize("seed, alpha", [(1, 0.01), (2, 0.01), (3, 0.02)])
+def test_quantiles_within_relative_accuracy(app, seed, alpha):
+    values = _samples(seed)
+    sketch = app.LatencySketch(alpha)
+    sketch.add_many(values)
+    assert sketch.count == len(values)
+    assert sketch.total == pytest.approx(values.sum())
+    _assert_within_alpha(sketch, values)
+    assert sketch.quantile(0.0) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(values.max(), rel=alpha)
+
+
+def test_merge_equals_a_single_sketch(app):
+    values = _samples(4)
+    whole = app.LatencySketch()
+    whole.add_many(values)
+    merged = app.LatencySketch()
+    for part in np.array_split(values, 7):
+        shard = app.LatencySketch()
+        shard.add_many(part)
+        merged.merge(shard)
+    assert merged.bins == whole.bins
+    assert (merged.count, merged.zero_count, merged.min, merged.max) == \
+        (whole.count, whole.zero_count, whole.min, whole.max)
+    assert merged.quantiles(QS) == whole.quantiles(QS)
+    _assert_within_alpha(merged, values)
+
+    with pytest.raises(ValueError):
+        merged.merge(app.LatencySketch(0.05))
+
+
+def test_serialized_sketch_round_trips(app):
+    sketch = app.LatencySketch()
+    sketch.add_many(_samples(5))
+    restored = app.LatencySketch.from_dict(sketch.to_dict())
+    assert restored.bins == sketch.bins
+    assert (restored.count, restored.zero_count, restored.total, restored.min, restored.max) == \
+        (sketch.count, sketch.zero_count, sketch.total, sketch.min, sketch.max)
+    assert restored.quantiles(QS) == sketch.quantiles(QS)
+    assert app.LatencySketch.from_dict(app.LatencySketch().to_dict()).quantile(0.5) is None
+
+
+@pytest.mark.parametrize("data", [
+    [],
+    {"alpha": "x"},
+    {"zero_count": -1},
+    {"bins": {"1": 2}},
+    {"bins": [[1, -2]]},
+    {"bins": [[1.5, 2]]},
+])
+def test_malformed_sketch_is_rejected(app, data):
+    with pytest.raises(ValueError):
+        app.LatencySketch.from_dict(data)
+
+
+def test_collapsed_sketch_keeps_the_upper_tail(app):
+    values = _samples(6)
+    sketch = app.LatencySketch(0.01, max_bins=64)
+    sketch.add_many(values)
+    assert len(sketch.bins) <= 64
+    exact = np.percentile(values, 99.9, method="lower")
+    assert abs(sketch.quantile(0.999) - exact) <= 0.01 * exact
+
+
+def test_windows_expire_out_of_retention(app, monkeypatch):
+    now = 10 ** 6 + 30.0
+    monkeypatch.setattr(app.time, "time", lambda: now)
+    store = app.LatencySketchStore(window_seconds=60, windows=3)
+    assert store.add_samples("api", [10.0] * 99 + [900.0], timestamp=now - 120)
+    assert store.add_samples("api", [20.0] * 100, timestamp=now)
+    assert not store.add_samples("api", [30.0], timestamp=now - 180)
+    assert store.merged("api").count == 200
+    p95, p99 = store.tail_values("api")
+    assert p99 == pytest.approx(20.0, rel=0.01)
+
+    # La fenêtre la plus ancienne sort de la rétention : quantiles recalculés sans elle
+    now += 60
+    assert store.merged("api").count == 100
+    assert [start for start, _ in store.windows_of("api")] == [store._window(now - 60)]
+    assert store.tail_values("api") == pytest.approx((20.0, 20.0), rel=0.01)
+    assert store.tail_values("missing") == app.MISSING_TAILS
+
+
+def test_store_save_and_load(app, tmp_path):
+    store = app.LatencySketchStore()
+    store.add_samples("api", _samples(7, 2000))
+    path = str(tmp_path / "sketches.json")
+    store.save(path)
+    loaded = app.LatencySketchStore()
+    assert loaded.load(path) == 1
+    assert loaded.tail_values("api") == store.tail_values("api")
+
+
+def test_p99_criterion_follows_the_sketch(client, metrics):
+    rule = {"name": "Tail Fast", "icon": "t", "description": "p99 under 200ms", "criteria": {"p99_response_time": 200}}
+    assert client.put("/badge-rules/tail_fast", json=rule).status_code == 200
+    try:
+        prefix = metrics["api_id"]
+        fast, slow, unknown = f"{prefix}-fast", f"{prefix}-slow", f"{prefix}-unknown"
+        fast_body = client.post(f"/latency-sketches/{fast}", json={"samples": [50.0] * 980 + [150.0] * 20}).json()
+        slow_body = client.post(f"/latency-sketches/{slow}", json={"samples": [50.0] * 950 + [1000.0] * 50}).json()
+        assert fast_body["p99_response_time"] == pytest.approx(150.0, rel=0.01)
+        assert slow_body["p99_response_time"] == pytest.approx(1000.0, rel=0.01)
+
+        earned = {}
+        for api_id in (fast, slow, unknown):
+            content = client.post("/calculate-badges", json=dict(metrics, api_id=api_id)).json()
+            earned[api_id] = {badge["id"] for badge in content["badges"]}
+        assert "tail_fast" in earned[fast]
+        assert "tail_fast" not in earned[slow]
+        assert "tail_fast" not in earned[unknown]
+
+        # Nouvelle queue lente : le résultat mis en cache est invalidé
+        client.post(f"/latency-sketches/{fast}", json={"samples": [2000.0] * 200})
+        content = client.post("/calculate-badges", json=dict(metrics, api_id=fast)).json()
+        assert "tail_fast" not in {badge["id"] for badge in content["badges"]}
+    finally:
+        client.delete("/badge-rules/tail_fast")
+
+
+def test_invalid_latency_payloads_are_rejected(client):
+    assert client.post("/latency-sketches/x", json={}).status_code == 400
+    response = client.post("/latency-sketches/x", json={"samples": [1.0, -5.0]})
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "Invalid latency data"
+    assert client.post("/latency-sketches/x", json={"sketch": {"alpha": 0.5, "bins": [[1, 1]]}}).status_code == 400
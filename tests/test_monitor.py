@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.mark.parametrize("fields", [
+    {"active_users": "abc"}, {"active_users": 2 ** 70}, {"total_requests": -5}, {"total_requests": 1.5}
+])
+def test_probe_rejects_invalid_target_counts_before_probing(client, fields):
+    probes = client.get("/monitor/stats").json()["probes"]
+    target = dict({"api_id": "probe-invalid", "url": "http://127.0.0.1:9/health"}, **fields)
+    response = client.post("/monitor/probe", json={"targets": [target], "probes": 1})
+    assert response.status_code == 400
+    assert response.json()["detail"]["invalid_indexes"] == [0]
+    assert client.get("/monitor/stats").json()["probes"] == probes
+
+
+def test_record_probe_results_validates_before_writing(app, metrics):
+    weight_before = app.aggregates.get(metrics["api_id"])
+    with pytest.raises(HTTPException):
+        app.record_probe_results([metrics, dict(metrics, total_requests=-5)])
+    assert len(app.metrics_store.read_last(metrics["api_id"], 10)) == 0
+    assert app.aggregates.get(metrics["api_id"]) == weight_before
+
+
+def test_slow_host_does_not_hold_global_slots(app):
+    async def scenario():
+        release = asyncio.Event()
+
+        async def serve(reader, writer, slow):
+            await reader.readuntil(b"\r\n\r\n")
+            if slow:
+                await release.wait()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+            await writer.drain()
+            writer.close()
+
+        slow_server = await asyncio.start_server(lambda r, w: serve(r, w, True), "127.0.0.1", 0)
+        fast_server = await asyncio.start_server(lambda r, w: serve(r, w, False), "127.0.0.1", 0)
+        slow_url = f"http://127.0.0.1:{slow_server.sockets[0].getsockname()[1]}/"
+        fast_url = f"http://127.0.0.1:{fast_server.sockets[0].getsockname()[1]}/"
+        monitor = app.APIMonitor(max_concurrency=2, max_per_host=1, timeout=5.0)
+        try:
+            slow = [asyncio.create_task(monitor.probe(slow_url)) for _ in range(5)]
+            await asyncio.sleep(0.05)
+            # Un seul créneau global pris par l'hôte lent : l'hôte rapide passe
+            fast = await asyncio.wait_for(monitor.probe(fast_url), 2.0)
+            assert fast.status == 200
+            assert not any(task.done() for task in slow)
+            release.set()
+            assert [sample.status for sample in await asyncio.gather(*slow)] == [200] * 5
+        finally:
+            release.set()
+            await monitor.close()
+            slow_server.close()
+            fast_server.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,105 @@
+import random
+import threading
+
+import pytest
+
+
+def _batch(size: int, seed: int):
+    rng = random.Random(seed)
+    return [
+        {
+            "api_id": f"parallel-{seed}-{rng.randint(0, size // 10)}",
+            "uptime_percentage": rng.uniform(95, 100),
+            "avg_response_time": rng.uniform(10, 200),
+            "total_requests": rng.randint(0, 20000),
+            "error_rate": rng.uniform(0, 3),
+            "active_users": rng.randint(0, 5000),
+            "security_score": rng.uniform(5, 10)
+        }
+        for _ in range(size)
+    ]
+
+
+def _strip(content):
+    results = [
+        (r["api_id"], [(b["id"], b["confidence_score"]) for b in r["badges"]], r["commission_info"])
+        for r in content["results"]
+    ]
+    # Détails d'erreur sans leur horodatage
+    errors = [
+        (e["index"], e["api_id"], e["status"],
+         {k: v for k, v in e["error"].items() if k != "timestamp"} if isinstance(e["error"], dict) else e["error"])
+        for e in content["errors"]
+    ]
+    return results, errors
+
+
+@pytest.fixture
+def process_pool(app, monkeypatch):
+    monkeypatch.setattr(app, "BULK_PROCESS_WORKERS", 2)
+    monkeypatch.setattr(app, "BULK_PARALLEL_THRESHOLD", 100)
+    yield app.get_bulk_process_pool()
+    app.reset_bulk_process_pool(app.get_bulk_process_pool())
+
+
+def test_process_pool_matches_in_process(app, process_pool, monkeypatch):
+    batch = _batch(600, 1)
+    for metrics in batch[:50]:
+        app.record_metrics(metrics["api_id"], [metrics])
+    batch[17] = {}
+    batch[300]["uptime_percentage"] = "x"
+    batch[420]["total_requests"] = 2 ** 60
+    batch[599]["security_score"] = 11
+
+    parallel = app.run_bulk_calculation(batch)
+    monkeypatch.setattr(app, "BULK_PROCESS_WORKERS", 1)
+    in_process = app.run_bulk_calculation(batch)
+
+    assert _strip(parallel) == _strip(in_process)
+    assert [e["index"] for e in parallel["errors"]] == [17, 300, 599]
+
+
+def test_workers_receive_columns(app, process_pool, monkeypatch):
+    calls = []
+    submit = process_pool.submit
+
+    def recording_submit(fn, *args):
+        calls.append(args)
+        return submit(fn, *args)
+
+    monkeypatch.setattr(process_pool, "submit", recording_submit)
+    app.run_bulk_calculation(_batch(200, 2))
+
+    assert calls
+    for row_ids, values, *_ in calls:
+        assert values.dtype.name == "float64"
+        assert values.shape == (len(row_ids), len(app.METRIC_FIELDS))
+
+
+def test_pool_is_created_once_under_concurrency(app, monkeypatch):
+    monkeypatch.setattr(app, "_bulk_process_pool", None)
+    created = []
+
+    class Pool:
+        def __init__(self, **kwargs):
+            created.append(self)
+
+        def shutdown(self, **kwargs):
+            pass
+
+    monkeypatch.setattr(app, "ProcessPoolExecutor", Pool)
+    barrier = threading.Barrier(8)
+    pools = []
+
+    def get():
+        barrier.wait()
+        pools.append(app.get_bulk_process_pool())
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(pool is created[0] for pool in pools)
@@ -0,0 +1,129 @@
+import random
+
+import pytest
+
+
+@pytest.fixture
+def catalog(app, monkeypatch):
+    """Catalogue isolé des autres tests : badges calculés avec les règles en vigueur, sans historique"""
+    rng = random.Random(7)
+    catalog = app.BadgeCatalog()
+    batch = [
+        {
+            "api_id": f"projection-{i}",
+            "uptime_percentage": rng.choice([95.5, 99.0, 99.95, 99.995, rng.uniform(90, 100)]),
+            "avg_response_time": rng.choice([40.0, 90.0, 150.0, rng.uniform(10, 300)]),
+            "total_requests": rng.choice([300, 1500, 8000, 50000]),
+            "error_rate": rng.uniform(0, 3),
+            "active_users": rng.choice([200, 1500, 20000]),
+            "security_score": rng.choice([7.0, 8.5, 9.5])
+        }
+        for i in range(60)
+    ]
+    catalog.update_many((m["api_id"], m, app.badge_engine.calculate_badges(m)) for m in batch)
+    monkeypatch.setattr(app, "badge_catalog", catalog)
+    return batch
+
+
+def _expected(app, batch, rules, calculator):
+    """Boucle par API : calculate_badges puis calculate_commission_impact"""
+    engine = app.BadgeCalculationEngine()
+    engine.badge_rules = rules
+    counts = [len(engine.calculate_badges(m)) for m in batch]
+    impacts = [calculator.calculate_commission_impact(count) for count in counts]
+    commission = [impact["total_commission"] for impact in impacts]
+    revenue = [impact["total_commission"] * (1 + impact["revenue_increase_estimate"]) for impact in impacts]
+    return counts, commission, revenue
+
+
+def _calculator(app, **parameters):
+    calculator = app.CommissionCalculator()
+    for parameter, value in parameters.items():
+        setattr(calculator, parameter, value)
+    return calculator
+
+
+def _check(summary, counts, commission, revenue):
+    assert summary["total_badges"] == sum(counts)
+    assert summary["badge_count_distribution"] == {str(c): counts.count(c) for c in sorted(set(counts))}
+    assert summary["commission"]["average"] == pytest.approx(sum(commission) / len(commission), abs=1e-6)
+    assert summary["commission"]["min"] == pytest.approx(min(commission), abs=1e-6)
+    assert summary["commission"]["max"] == pytest.approx(max(commission), abs=1e-6)
+    assert summary["platform_revenue_index"]["average"] == pytest.approx(sum(revenue) / len(revenue), abs=1e-6)
+
+
+def test_current_rules_match_the_per_api_loop(client, app, catalog):
+    rules = app.badge_engine.badge_rules
+    parameters = {"base_commission": 0.15, "badge_bonus_per_badge": 0.02, "max_commission": 0.25}
+    body = client.post("/projections/commission", json={"scenarios": [dict(parameters, name="cheaper")]}).json()
+    assert body["apis"] == len(catalog)
+
+    current = _expected(app, catalog, rules, app.commission_calc)
+    _check(body["current"], *current)
+    scenario = body["scenarios"][0]
+    assert scenario["name"] == "cheaper" and scenario["badge_rules_changed"] == []
+    assert scenario["parameters"] == parameters
+    _check(scenario, *_expected(app, catalog, rules, _calculator(app, **parameters)))
+    assert scenario["vs_current"]["apis_gaining_badges"] == scenario["vs_current"]["apis_losing_badges"] == 0
+
+
+def test_badge_rule_overrides_are_evaluated_without_changing_the_rules(client, app, catalog):
+    rules = app.badge_engine.badge_rules
+    version = app.badge_engine.rules_version
+    stricter = dict(rules["lightning_fast"], criteria={"response_time": 60, "min_requests": 500})
+    added = {"name": "Busy", "icon": "b", "description": "d", "criteria": {"active_users": 10000}}
+    overrides = {"lightning_fast": stricter, "zero_downtime": None, "busy": added}
+    body = client.post("/projections/commission", json={"scenarios": [{"badge_rules": overrides}]}).json()
+
+    scenario = body["scenarios"][0]
+    assert scenario["name"] == "scenario-0"
+    assert sorted(scenario["badge_rules_changed"]) == sorted(overrides)
+    projected = dict(rules, lightning_fast=stricter, busy=added)
+    del projected["zero_downtime"]
+    counts, commission, revenue = _expected(app, catalog, projected, app.commission_calc)
+    _check(scenario, counts, commission, revenue)
+    assert "zero_downtime" not in scenario["badges_awarded"]
+    assert scenario["badges_awarded"]["busy"] == sum(1 for m in catalog if m["active_users"] >= 10000)
+
+    current_counts = _expected(app, catalog, rules, app.commission_calc)[0]
+    vs_current = scenario["vs_current"]
+    assert vs_current["apis_gaining_badges"] == sum(1 for a, b in zip(counts, current_counts) if a > b)
+    assert vs_current["apis_losing_badges"] == sum(1 for a, b in zip(counts, current_counts) if a < b)
+    assert app.badge_engine.rules_version == version
+    assert "busy" not in app.badge_engine.badge_rules
+
+
+@pytest.mark.parametrize("scenario, message", [
+    ("not-an-object", "scenario must be an object"),
+    ({"surprise": 1}, "unknown fields"),
+    ({"name": 3}, "name must be a string"),
+    ({"base_commission": 1.5}, "base_commission must be a number between 0 and 1"),
+    ({"max_commission": True}, "max_commission must be a number between 0 and 1"),
+    ({"badge_rules": []}, "badge_rules must be an object"),
+    ({"badge_rules": {"no_such_badge": None}}, "unknown badge 'no_such_badge'"),
+    ({"badge_rules": {"lightning_fast": "fast"}}, "must be an object or null"),
+    ({"badge_rules": {"lightning_fast": {"name": "x", "icon": "x", "description": "x",
+                                         "criteria": {"uptime": -1}}}}, "positive number"),
+])
+def test_invalid_scenarios_are_rejected(client, scenario, message):
+    response = client.post("/projections/commission", json={"scenarios": [{"name": "ok"}, scenario]})
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["error"] == "Invalid projection scenario"
+    assert detail["scenario"] == 1
+    assert message in detail["message"]
+
+
+@pytest.mark.parametrize("scenarios", [None, [], "x"])
+def test_malformed_scenario_lists_are_rejected(client, scenarios):
+    response = client.post("/projections/commission", json={"scenarios": scenarios})
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "Invalid projection request"
+
+
+def test_too_many_scenarios_are_rejected(client, app):
+    scenarios = [{"name": f"s{i}"} for i in range(app.PROJECTION_MAX_SCENARIOS + 1)]
+    response = client.post("/projections/commission", json={"scenarios": scenarios})
+    assert response.status_code == 400
+    assert str(app.PROJECTION_MAX_SCENARIOS) in response.json()["detail"]["message"]
+    assert client.post("/projections/commission", json={"scenarios": scenarios[:-1]}).status_code == 200
@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+import pytest
+
+TOP_RULE = {"name": "Top", "icon": "t", "description": "d", "criteria": {"top_active_users": 10}}
+
+
+@pytest.fixture
+def population(app):
+    """30 APIs, active_users 100..3000 (un bucket chacune) ; pop-29 est en tête"""
+    ranks = app.MetricRanks()
+    api_ids = [f"pop-{i}" for i in range(30)]
+    ranks.update_many("active_users", api_ids, [100.0 * (i + 1) for i in range(30)])
+    return ranks
+
+
+def test_own_entry_is_excluded(app, population):
+    index = population.indexes["active_users"]
+    # Sans exclusion, pop-29 (3000) compterait devant sa nouvelle valeur
+    assert index.top_percent(100.0) == app.rank_percent(29, 30)
+    assert index.top_percent(100.0, "pop-29") == app.rank_percent(28, 30)
+    # Une API hors population compte une fois pour elle-même
+    assert index.top_percent(100.0, "newcomer") == app.rank_percent(29, 31)
+    # Valeur inchangée : rang identique à celui calculé sur le catalogue
+    assert index.top_percent(3000.0, "pop-29") == index.top_percent(3000.0)
+
+
+def test_rank_sources_agree(app, population):
+    api_ids = ["pop-29", "pop-3", "newcomer", "pop-0"]
+    values = np.array([100.0, 2750.0, 1500.0, 3000.0])
+    expected = [population.top_percent("active_users", v, a) for a, v in zip(api_ids, values.tolist())]
+    assert population.top_percent_many("active_users", values, api_ids).tolist() == expected
+    frozen = population.frozen([f"pop-{i}" for i in range(30)] + ["other"])
+    assert frozen.top_percent_many("active_users", values, api_ids).tolist() == expected
+    assert [frozen.top_percent("active_users", v, a) for a, v in zip(api_ids, values.tolist())] == expected
+    # Fragment envoyé à un worker
+    assert frozen.frozen(api_ids).top_percent_many("active_users", values, api_ids).tolist() == expected
+    # Snapshot : buckets alignés sur les api_ids triés du snapshot
+    snapshot_ids = sorted([f"pop-{i}" for i in range(30)])
+    arrays = population.frozen(snapshot_ids).arrays()
+    arrays["api_ids"] = np.array([api_id.encode() for api_id in snapshot_ids], dtype=bytes)
+    table = app.SnapshotTable(dict(arrays, sums=np.zeros((30, 4)), weights=np.zeros(30),
+                                   derived=np.zeros((30, len(app.DERIVED_FIELDS)))))
+    restored = app.FrozenRanks.from_arrays(arrays, table)
+    assert restored.top_percent_many("active_users", values, api_ids).tolist() == expected
+
+
+def test_scalar_and_columnar_rank_the_sent_value(app, population):
+    engine = app.BadgeCalculationEngine()
+    engine.set_badge_rule("top10", TOP_RULE)
+    engine.rank_source = population
+    batch = []
+    for i in range(40):
+        batch.append({"api_id": "pop-29" if i == 0 else f"pop-{i % 30}", "uptime_percentage": 99.0,
+                      "avg_response_time": 80.0, "total_requests": 1000, "error_rate": 0.5,
+                      "active_users": 2750 if i == 0 else 100 * (i % 30 + 1), "security_score": 7.0})
+    api_ids = sorted({m["api_id"] for m in batch})
+    source = app.PrecomputedAggregates(api_ids, np.zeros((len(api_ids), 4)), np.zeros(len(api_ids)))
+    scalar = [[b.template.id for b in engine.calculate_badges(m, aggregate=source.get(m["api_id"]))] for m in batch]
+    columnar = [[b.template.id for b in badges]
+                for badges in app.ColumnarBadgeEngine(engine, source).calculate_batch(batch)]
+    assert scalar == columnar
+    # pop-29 descendu à 2750 : 2 APIs devant (2800, 2900), son ancienne entrée (3000) exclue
+    assert "top10" in scalar[0]
+
+
+def test_catalog_rank_updates_follow_catalog_writes(app):
+    ranks = app.MetricRanks()
+    catalog = app.BadgeCatalog()
+    catalog.ranks = ranks
+
+    def write(value):
+        row = np.array([[99.0, 50.0, 1000.0, 0.1, value, 8.0]])
+        for _ in range(200):
+            catalog.update_columns(["racer"], row, [], np.zeros((0, 1)))
+
+    threads = [threading.Thread(target=write, args=(value,)) for value in (100.0, 5000.0)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stored = catalog._metrics[catalog._rows["racer"], app.METRIC_FIELDS.index("active_users")]
+    own = ranks.indexes["active_users"].own_bins(["racer"])[0]
+    assert own == np.searchsorted(app.RANK_EDGES, stored, "right")
@@ -0,0 +1,40 @@
+import math
+import time
+
+import pytest
+
+
+def observation(**fields):
+    return {"observations": [dict({"total": 60, "available": 60}, **fields)]}
+
+
+def test_window_counts_observations(client):
+    response = client.post("/rollups/rollup-basic", json={"observations": [
+        {"total": 60, "available": 60}, {"total": 60, "available": 57, "errors": 3}
+    ]})
+    assert response.status_code == 200
+    summary = client.get("/rollups/rollup-basic").json()
+    assert summary["windows"]["1h"]["total"] == 120
+
+
+@pytest.mark.parametrize("timestamp", [
+    float("nan"), 1e300, 2 ** 2000, time.time() + 5 * 365 * 86400, time.time() - 400 * 86400
+], ids=["nan", "1e300", "huge-int", "5-years-ahead", "older-than-day-ring"])
+def test_rejects_out_of_range_timestamps(client, app, timestamp):
+    api_id = "rollup-future"
+    assert client.post(f"/rollups/{api_id}", json=observation()).status_code == 200
+    body = '{"observations":[{"total":60,"available":60,"timestamp":%s}]}' % (
+        "NaN" if timestamp != timestamp else repr(timestamp))
+    response = client.post(f"/rollups/{api_id}", content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 400
+    # Les observations courantes restent visibles et comptées
+    assert client.post(f"/rollups/{api_id}", json=observation()).status_code == 200
+    direct = math.inf if isinstance(timestamp, int) else timestamp
+    assert app.uptime_rollups.add(api_id, 60, 60, 0, direct) is False
+    assert client.get(f"/rollups/{api_id}").json()["windows"]["1h"]["total"] >= 120
+
+
+@pytest.mark.parametrize("total", [2 ** 70, 2 ** 41, -1, True])
+def test_rejects_out_of_range_counts(client, total):
+    response = client.post("/rollups/rollup-counts", json=observation(total=total, available=0))
+    assert response.status_code == 400
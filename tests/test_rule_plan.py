@@ -0,0 +1,137 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+
+def _reference_confidence(metrics: dict, criteria: dict):
+    """Évaluation d'origine (if/elif par critère), avant compilation des règles en plan"""
+    scores = []
+
+    for criterion, threshold in criteria.items():
+        if criterion == 'uptime':
+            score = min(1.0, metrics['uptime_percentage'] / threshold)
+        elif criterion == 'response_time':
+            score = min(1.0, threshold / max(metrics['avg_response_time'], 1))
+        elif criterion == 'error_rate':
+            actual_error = max(metrics['error_rate'], 0.01)
+            score = min(1.0, threshold / actual_error)
+        elif criterion == 'security_score':
+            score = min(1.0, metrics['security_score'] / threshold)
+        elif criterion == 'min_requests':
+            score = min(1.0, metrics['total_requests'] / threshold)
+        elif criterion == 'active_users':
+            score = min(1.0, metrics['active_users'] / threshold)
+        else:
+            score = 0.5
+
+        scores.append(max(0.0, score))
+
+    if not scores:
+        return 0.0
+
+    geometric_mean = 1.0
+    for score in scores:
+        geometric_mean *= max(score, 0.01)
+
+    return geometric_mean ** (1.0 / len(scores))
+
+
+def _reference_badges(rules: dict, metrics: dict):
+    earned = []
+    for badge_id, config in rules.items():
+        confidence = _reference_confidence(metrics, config['criteria'])
+        if confidence >= 0.85:
+            earned.append((badge_id, round(confidence, 2)))
+    return earned
+
+
+def _table():
+    """Cas limites (seuils exacts, planchers, zéros) + tirages proches des seuils"""
+    base = {"uptime_percentage": 99.9, "avg_response_time": 100.0, "total_requests": 10000,
+            "error_rate": 1.0, "active_users": 1000, "security_score": 9.0}
+    rows = [
+        base,
+        dict(base, avg_response_time=0.0, error_rate=0.0),
+        dict(base, avg_response_time=0.5, error_rate=0.005),
+        dict(base, uptime_percentage=0.0, total_requests=0, active_users=0, security_score=0.0),
+        dict(base, uptime_percentage=100.0, avg_response_time=50.0, total_requests=5000, security_score=8.0),
+        dict(base, uptime_percentage=99.99, avg_response_time=117.0, error_rate=1.17),
+        dict(base, avg_response_time=10 ** 6, error_rate=100.0),
+    ]
+    rng = random.Random(11)
+    for _ in range(300):
+        rows.append({
+            "uptime_percentage": rng.choice([95.0, 98.0, 99.0, 99.9, 99.99, rng.uniform(80, 100)]),
+            "avg_response_time": rng.choice([50.0, 100.0, rng.uniform(0, 400)]),
+            "total_requests": rng.choice([200, 500, 1000, 2000, 5000, 10000, rng.randint(0, 20000)]),
+            "error_rate": rng.choice([0.0, 1.0, rng.uniform(0, 5)]),
+            "active_users": rng.choice([1000, rng.randint(0, 3000)]),
+            "security_score": rng.choice([8.0, 9.0, rng.uniform(0, 10)])
+        })
+    return [dict(row, api_id=f"plan-{i}") for i, row in enumerate(rows)]
+
+
+def _extended_rules(app):
+    """Règles par défaut + critères inconnus + seuils partagés entre badges"""
+    rules = copy.deepcopy(app.BadgeCalculationEngine().badge_rules)
+    meta = {"icon": "x", "description": "x"}
+    rules.update({
+        "legacy_only": dict(meta, name="Legacy", criteria={"legacy_score": 3}),
+        "legacy_mixed": dict(meta, name="Legacy mixed", criteria={"uptime": 99.0, "legacy_score": 3, "response_time": 100}),
+        # 0.5^(1/6) > 0.85 : attribuable malgré le critère inconnu
+        "legacy_lenient": dict(meta, name="Legacy lenient", criteria={
+            "uptime": 95.0, "response_time": 400, "min_requests": 100, "security_score": 5.0,
+            "active_users": 100, "legacy_score": 1}),
+        "shared_fast": dict(meta, name="Shared", criteria={"min_requests": 500, "response_time": 100}),
+        "shared_reliable": dict(meta, name="Reliable", criteria={"uptime": 99.9, "error_rate": 1.0, "min_requests": 2000}),
+        "empty": dict(meta, name="Empty", criteria={})
+    })
+    return rules
+
+
+def _engine(app, rules):
+    engine = app.BadgeCalculationEngine()
+    engine.badge_rules = rules
+    return engine
+
+
+@pytest.mark.parametrize("extended", [False, True], ids=["defaults", "unknown-and-shared"])
+def test_compiled_plan_matches_original_evaluation(app, extended):
+    rules = _extended_rules(app) if extended else app.BadgeCalculationEngine().badge_rules
+    engine = _engine(app, rules)
+    table = _table()
+    ids = [row["api_id"] for row in table]
+    source = app.PrecomputedAggregates(ids, np.zeros((len(ids), len(app.WEIGHTED_FIELDS))), np.zeros(len(ids)))
+    columnar = app.ColumnarBadgeEngine(engine, source).calculate_batch(table)
+
+    for row, batch_badges in zip(table, columnar):
+        expected = _reference_badges(rules, row)
+        assert [(b["id"], b["confidence_score"]) for b in engine.calculate_badges(row)] == expected, row
+        assert [(b["id"], b["confidence_score"]) for b in batch_badges] == expected, row
+
+
+def test_default_rules_cover_every_badge(app):
+    rules = app.BadgeCalculationEngine().badge_rules
+    assert len(rules) == 8
+    earned = {badge_id for row in _table() for badge_id, _ in _reference_badges(rules, row)}
+    # Table discriminante : chaque badge par défaut attribué au moins une fois
+    assert earned == set(rules)
+
+
+def test_plan_shares_slots_and_marks_unknown_criteria(app):
+    rules = _extended_rules(app)
+    plan = app.compile_badge_rules(rules, intern=False)
+    criteria = [(c, t) for config in rules.values() for c, t in config["criteria"].items()]
+    assert len(plan.slots) == len(set(criteria)) < len(criteria)
+
+    badges = {badge_id: (indices, exponent) for badge_id, _, indices, exponent in plan.badges}
+    assert set(badges["shared_fast"][0]) == set(badges["lightning_fast"][0])
+    assert set(badges["shared_reliable"][0]) & set(badges["enterprise_ready"][0])
+    unknown = [i for i, slot in enumerate(plan.slots) if slot[0] == -1]
+    assert len(unknown) == 2 and unknown[0] in badges["legacy_only"][0] and unknown[0] in badges["legacy_mixed"][0]
+    assert app.score_slot(plan.slots[unknown[0]], 123.0) == app.UNKNOWN_CRITERION_SCORE
+    assert badges["empty"] == ((), None)
+    assert any(badge_id == "legacy_lenient" for row in _table() for badge_id, _ in _reference_badges(rules, row))
+    assert plan.dependencies["legacy_only"] == ()
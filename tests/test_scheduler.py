@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+CADENCES = {"premium": 100.0, "standard": 1000.0, "basic": 10000.0}
+
+
+@pytest.fixture
+def scheduler(app, tmp_path):
+    return app.ReevaluationScheduler(str(tmp_path / "scheduler.json"), cadences=CADENCES, jitter=0.1,
+                                     batch_size=10, max_rate=0)
+
+
+def _run_batch(scheduler, batch, counts, monkeypatch, app, during=None):
+    def reevaluate(api_ids):
+        if during is not None:
+            during()
+        return {api_id: counts.get(api_id, 0) for api_id in api_ids}, []
+
+    monkeypatch.setattr(app, "reevaluate_stored_apis", reevaluate)
+
+    async def scenario():
+        slots = asyncio.Semaphore(1)
+        await slots.acquire()
+        await scheduler._run_batch(batch, slots)
+
+    asyncio.run(scenario())
+
+
+def test_changed_apis_come_first(scheduler):
+    scheduler.track(["due-a", "due-b"], now=0.0)
+    scheduler.mark_changed("changed")
+    batch = scheduler._take_batch(now=10 ** 6)
+    assert batch[0] == "changed"
+    assert sorted(batch[1:]) == ["due-a", "due-b"]
+    assert scheduler._take_batch(now=10 ** 6) == []
+
+
+def test_change_during_a_running_batch_is_kept(app, scheduler, monkeypatch):
+    scheduler.mark_changed("api")
+    assert scheduler._take_batch(now=0.0) == ["api"]
+    # Métriques ingérées pendant l'évaluation du lot
+    scheduler.mark_changed("api")
+    assert scheduler._take_batch(now=0.0) == []
+    assert scheduler.stats()["priority_queue"] == 1
+    assert scheduler._seconds_to_next(0.0) > 0
+
+    _run_batch(scheduler, ["api"], {}, monkeypatch, app)
+    assert scheduler._take_batch(now=0.0) == ["api"]
+
+
+def test_next_run_follows_the_tier_with_jitter(app, scheduler, monkeypatch):
+    api_ids = [f"api-{i}" for i in range(200)]
+    scheduler.track(api_ids, now=0.0)
+    # Premier passage étalé sur la cadence basic par une phase stable
+    first = dict(scheduler._due)
+    assert all(0.0 <= due < CADENCES["basic"] for due in first.values())
+    assert len({round(due) for due in first.values()}) > 150
+
+    counts = {api_id: 5 if i % 2 else 0 for i, api_id in enumerate(api_ids)}
+    _run_batch(scheduler, api_ids, counts, monkeypatch, app)
+    progress = scheduler._progress
+    for api_id in api_ids:
+        last_run, tier = progress[api_id]
+        assert tier == ("premium" if counts[api_id] else "basic")
+        delay = scheduler._due[api_id] - last_run
+        assert CADENCES[tier] * 0.9 <= delay <= CADENCES[tier] * 1.1
+    delays = {scheduler._due[api_id] - progress[api_id][0] for api_id in api_ids}
+    assert len(delays) > 100
+
+
+def test_progress_is_persisted_and_resumed(app, scheduler, monkeypatch, tmp_path):
+    _run_batch(scheduler, ["kept", "premium"], {"premium": 4}, monkeypatch, app)
+    scheduler.mark_changed("pending")
+    scheduler.persist()
+
+    resumed = app.ReevaluationScheduler(scheduler.state_path, cadences=CADENCES, jitter=0.0, max_rate=0)
+    assert resumed.load()
+    assert resumed._progress == scheduler._progress
+    resumed.track(["kept", "premium", "new"], now=0.0)
+    last_run = scheduler._progress["premium"][0]
+    assert resumed._due["premium"] == pytest.approx(last_run + CADENCES["premium"])
+    assert resumed._due["kept"] == pytest.approx(scheduler._progress["kept"][0] + CADENCES["basic"])
+    assert resumed._take_batch(now=0.0)[0] == "pending"
+
+
+def test_missing_state_file_starts_empty(app, tmp_path):
+    scheduler = app.ReevaluationScheduler(str(tmp_path / "absent.json"), cadences=CADENCES)
+    assert scheduler.load() is False
+    assert scheduler.stats()["tracked_apis"] == 0
+
+
+def test_stats_count_overdue_entries(app, scheduler, monkeypatch):
+    scheduler.track([f"api-{i}" for i in range(50)], now=0.0)
+    # Entrée remplacée : l'ancienne reste dans le tas mais n'est plus comptée
+    scheduler._schedule("api-0", 10 ** 9)
+    horizon = sorted(due for api_id, due in scheduler._due.items())[19]
+    expected = sum(1 for due in scheduler._due.values() if due <= horizon)
+
+    monkeypatch.setattr(app.time, "time", lambda: horizon)
+    stats = scheduler.stats()
+    assert stats["due_queue"] == expected == 20
+    assert stats["queue_lag_seconds"] == round(horizon - min(scheduler._due.values()), 3)
+
+
+def test_prune_forgets_removed_apis(app, scheduler, monkeypatch):
+    _run_batch(scheduler, ["kept", "removed"], {}, monkeypatch, app)
+    scheduler.mark_changed("removed")
+    assert scheduler.prune(["kept"]) == 1
+    assert set(scheduler._progress) == {"kept"}
+    assert "removed" not in scheduler._due
+    assert scheduler._take_batch(now=10 ** 11) == ["kept"]
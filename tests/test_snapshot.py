@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+SWAPPED = ("evaluation_state", "badge_engine", "commission_calc", "aggregates", "columnar_engine", "badge_catalog")
+
+
+@pytest.fixture
+def reader(app, client, metrics, tmp_path, monkeypatch):
+    """Snapshot publié puis installé comme dans un lecteur ; état de l'écrivain restauré ensuite"""
+    for name in SWAPPED:
+        monkeypatch.setattr(app, name, getattr(app, name))
+    assert client.post("/calculate-badges", json=metrics).status_code == 200
+    path = str(tmp_path / "badges.snapshot")
+    app.SnapshotPublisher(path).publish()
+    forwarded = []
+    monkeypatch.setattr(app.catalog_forwarder, "submit", lambda *batch: forwarded.append(batch))
+    writer_state = app.evaluation_state
+    before = (writer_state.engine.badge_rules, writer_state.engine.rules_version, writer_state.engine.rule_plan,
+              writer_state.engine.rank_source, writer_state.columnar.aggregates)
+    reader = app.SnapshotReader(path)
+    assert reader.refresh()
+    return writer_state, before, forwarded
+
+
+def test_install_snapshot_swaps_a_new_state(app, client, reader, metrics):
+    writer_state, before, _ = reader
+    state = app.evaluation_state
+    assert state is not writer_state
+    assert state.engine is not writer_state.engine and state.commission is not writer_state.commission
+    # L'état précédent n'est jamais modifié : un calcul en cours le garde entier
+    engine = writer_state.engine
+    assert (engine.badge_rules, engine.rules_version, engine.rule_plan,
+            engine.rank_source, writer_state.columnar.aggregates) == before
+    assert state.columnar.engine is state.engine and state.columnar.aggregates is state.aggregates
+    assert state.engine.rules_version == engine.rules_version
+    assert app.badge_catalog is state.catalog and state.catalog.read_only
+    assert client.get(f"/badges/{metrics['api_id']}").status_code == 200
+
+
+def test_reader_results_are_forwarded(app, client, reader, metrics):
+    _, _, forwarded = reader
+    other = dict(metrics, api_id=metrics["api_id"] + "-reader")
+    response = client.post("/calculate-badges", json=other)
+    assert response.status_code == 200
+    client.post("/bulk-calculate", json=[dict(metrics, api_id=metrics["api_id"] + "-bulk")])
+    assert [batch[0] for batch in forwarded] == [[other["api_id"]], [metrics["api_id"] + "-bulk"]]
+    api_ids, values, awarded = forwarded[0]
+    assert sum(len(positions) for positions, _ in awarded.values()) == len(response.json()["badges"])
+
+
+def test_forwarded_rows_reach_the_catalog(app, client, metrics):
+    api_id = metrics["api_id"]
+    values = [[float(metrics[field]) for field in app.METRIC_FIELDS]]
+    body = {"batches": [app.forwarded_batch_payload([api_id], values, {"trusted_api": ([0], [0.97])})]}
+    version = app.badge_catalog.version
+    response = client.post("/catalog/forwarded", content=json.dumps(body))
+    assert response.status_code == 200 and response.json()["rows"] == 1
+    badges = client.get(f"/badges/{api_id}").json()["badges"]
+    assert badges == [{"id": "trusted_api", "confidence_score": 0.97}]
+    changes = client.get("/badge-changes", params={"since": version}).json()["changes"]
+    assert [change["api_id"] for change in changes] == [api_id]
+
+
+@pytest.mark.parametrize("batch", [
+    {"api_ids": ["a", "a"], "values": [[0] * 6] * 2, "awarded": {}},
+    {"api_ids": ["a"], "values": [[0] * 5], "awarded": {}},
+    {"api_ids": ["a"], "values": [[0] * 6], "awarded": {"trusted_api": [[1], [0.9]]}},
+    {"api_ids": ["a"], "values": [[0] * 6], "awarded": {"trusted_api": [[0], [0.9, 0.8]]}},
+    {"api_ids": [""], "values": [[0] * 6], "awarded": {}},
+], ids=["duplicate-api", "short-row", "position-out-of-range", "confidence-count", "empty-api-id"])
+def test_forwarded_rows_are_validated(app, client, batch):
+    version = app.badge_catalog.version
+    body = {"batches": [{"api_ids": ["ok"], "values": [[0] * 6], "awarded": {}}, batch]}
+    response = client.post("/catalog/forwarded", content=json.dumps(body))
+    assert response.status_code == 400
+    # Lots validés en entier avant application
+    assert app.badge_catalog.version == version
+
+
+def test_forwarder_queue_is_bounded(app):
+    forwarder = app.CatalogForwarder(max_rows=3)
+    for i in range(5):
+        forwarder.submit([f"api-{i}", f"api-{i}b"], [[0.0] * 6] * 2, {})
+    batches = forwarder.take()
+    assert [batch["api_ids"][0] for _, batch in batches] == ["api-4"]
+    assert forwarder.stats()["dropped_rows"] == 8
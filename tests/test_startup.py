@@ -0,0 +1,99 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXTRA_RULE = {"name": "Busy", "icon": "b", "description": "d", "criteria": {"min_requests": 1}}
+
+# Nombre de badges attribués par une instance fraîche, pour un mode de démarrage donné
+COUNT_BADGES = """
+import json, app
+from fastapi.testclient import TestClient
+with TestClient(app.app) as client:
+    body = client.post('/calculate-badges', json=json.loads(%r)).json()
+print(len(body['badges']), app.startup_artifacts_loaded)
+"""
+
+
+@pytest.fixture
+def fresh_rules(app, monkeypatch):
+    monkeypatch.setattr(app, "badge_engine", app.BadgeCalculationEngine())
+    monkeypatch.setattr(app, "precomputed_responses", app.PrecomputedResponses())
+    return app.badge_engine
+
+
+def test_artifacts_restore_rules_and_versions(app, fresh_rules, tmp_path):
+    path = str(tmp_path / "artifacts.json")
+    fresh_rules.set_badge_rule("busy", EXTRA_RULE)
+    version = fresh_rules.rules_version
+    app.write_startup_artifacts(path)
+    app.badge_engine = app.BadgeCalculationEngine()
+    assert app.load_startup_artifacts(path)
+    assert app.badge_engine.badge_rules["busy"] == EXTRA_RULE
+    assert app.badge_engine.rules_version == version
+
+
+def test_artifacts_from_other_builtin_rules_are_ignored(app, fresh_rules, tmp_path, monkeypatch):
+    path = str(tmp_path / "artifacts.json")
+    fresh_rules.set_badge_rule("busy", EXTRA_RULE)
+    app.write_startup_artifacts(path)
+    monkeypatch.setattr(app, "builtin_rules_digest", lambda: "rules of another release")
+    app.badge_engine = app.BadgeCalculationEngine()
+    assert not app.load_startup_artifacts(path)
+    assert "busy" not in app.badge_engine.badge_rules
+
+
+def test_artifacts_without_rules_digest_are_ignored(app, fresh_rules, tmp_path):
+    path = tmp_path / "artifacts.json"
+    app.write_startup_artifacts(str(path))
+    artifacts = json.loads(path.read_text())
+    del artifacts["builtin_rules"]
+    path.write_text(json.dumps(artifacts))
+    assert not app.load_startup_artifacts(str(path))
+
+
+def test_eager_and_lazy_award_the_same_badges(app, fresh_rules, tmp_path, metrics):
+    """Artefact écrit après l'ajout d'une règle : mêmes badges dans les deux modes"""
+    fresh_rules.set_badge_rule("busy", EXTRA_RULE)
+    app.write_startup_artifacts(str(tmp_path / "startup_artifacts.json"))
+    outputs = {}
+    for mode in ("eager", "lazy"):
+        env = dict(os.environ, BADGES_DATA_DIR=str(tmp_path), BADGES_STARTUP_MODE=mode,
+                   BADGES_SCHEDULER_ENABLED="0", BADGES_BULK_WORKERS="1", BADGES_LAZY_WARMUP_DELAY="60")
+        env.pop("BADGES_STARTUP_ARTIFACTS", None)
+        result = subprocess.run([sys.executable, "-c", COUNT_BADGES % json.dumps(metrics)], cwd=REPO, env=env,
+                                capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stderr
+        outputs[mode] = result.stdout.split()[-2:]
+    assert outputs["eager"] == outputs["lazy"] == ["9", "True"]
+
+
+def test_lazy_component_keeps_a_single_reference(app, monkeypatch):
+    """Proxy jamais remplacé dans le module : références importées et capturées voient le même objet"""
+    built = []
+
+    def factory():
+        built.append(app.LatencySketchStore())
+        return built[-1]
+
+    component = app.LazyComponent("lazy_sketches", factory)
+    monkeypatch.setattr(app, "lazy_sketches", component, raising=False)
+    captured = app.DerivedMetrics(component, app.UptimeRollups(), app.GrowthTracker(app.MetricRanks()))
+    imported = app.lazy_sketches
+    assert not app.is_loaded(component) and built == []
+
+    threads = [threading.Thread(target=component.add_samples, args=("api", [10.0, 20.0])) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1 and app.is_loaded(component)
+    assert app.lazy_sketches is component is imported
+    assert component.resolve() is built[0]
+    assert built[0].merged("api").count == 16
+    assert captured.derived_values("api")[:len(app.TAIL_FIELDS)] == built[0].tail_values("api")
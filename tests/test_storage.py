@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.mark.parametrize("field", ["total_requests", "active_users"])
+def test_ingest_rejects_integers_beyond_int64(client, app, metrics, field):
+    response = client.post("/ingest-metrics", json=dict(metrics, **{field: 2 ** 70}))
+    assert response.status_code == 400
+    assert len(app.metrics_store.read_last(metrics["api_id"], 10)) == 0
+
+
+def test_ingest_accepts_int64_max(client, app, metrics):
+    response = client.post("/ingest-metrics", json=dict(metrics, total_requests=app.INT64_MAX))
+    assert response.status_code == 200
+    assert int(app.metrics_store.read_last(metrics["api_id"], 1)['total_requests'][0]) == app.INT64_MAX
+
+
+def test_ingest_rejects_non_finite_timestamp(client, metrics):
+    body = '{"api_id":"%s","uptime_percentage":99,"avg_response_time":50,"total_requests":10,' \
+           '"error_rate":0,"active_users":1,"security_score":8,"timestamp":NaN}' % metrics["api_id"]
+    response = client.post("/ingest-metrics", content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 400
+
+
+def test_compact_forgets_apis_emptied_by_retention(tmp_path, app, metrics):
+    store = app.MetricsStore(str(tmp_path), retention_days=1)
+    old = time.time() - 3 * 86400
+    store.append_many("expired", [dict(metrics, timestamp=old)])
+    store.append_many("kept", [dict(metrics, timestamp=time.time())])
+
+    result = store.compact()
+    assert result["removed_apis"] == 1
+    assert store.api_ids() == ["kept"]
+    # L'index réécrit est relu tel quel
+    assert app.MetricsStore(str(tmp_path)).api_ids() == ["kept"]
+
+
+def test_ingest_runs_off_the_event_loop(client, app, metrics, monkeypatch):
+    threads = []
+    append_many = app.metrics_store.append_many
+
+    def recording_append(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return append_many(*args, **kwargs)
+
+    monkeypatch.setattr(app.metrics_store, "append_many", recording_append)
+    assert client.post("/ingest-metrics", json=metrics).status_code == 200
+    assert threads and threads[0].name.startswith("bulk-badges")
+    assert app.metrics_store.has_history(metrics["api_id"])
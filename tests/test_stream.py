@@ -0,0 +1,80 @@
+import asyncio
+import json
+import threading
+
+
+async def _chunks(parts):
+    for part in parts:
+        yield part
+
+
+def _run(ingestor, parts):
+    return asyncio.run(ingestor.run(_chunks(parts)))
+
+
+def test_oversized_line_across_chunks_is_rejected_once(app, metrics):
+    ingestor = app.StreamIngestor(max_line_bytes=300)
+    valid = json.dumps(metrics).encode()
+    parts = [b'{"api_id":"' + b"x" * 400, b"y" * 400, b"z" * 400 + b'"}\n' + valid + b'\n']
+
+    result = _run(ingestor, parts)
+    assert result["rejected"] == 1
+    assert result["accepted"] == 1
+    assert result["lines_received"] == 2
+    assert result["errors"] == [{"line": 1, "error": "Line exceeds 300 bytes", "status": "validation_failed"}]
+
+
+def test_oversized_line_within_a_chunk_is_rejected(app, metrics):
+    ingestor = app.StreamIngestor(max_line_bytes=300)
+    valid = json.dumps(metrics).encode()
+    result = _run(ingestor, [b"x" * 400 + b'\n' + valid + b'\n'])
+    assert result["rejected"] == 1
+    assert result["accepted"] == 1
+
+
+def test_batch_failures_are_bounded(app, metrics, monkeypatch):
+    def failing(batch):
+        raise RuntimeError("storage down")
+
+    monkeypatch.setattr(app, "process_metrics_batch", failing)
+    monkeypatch.setattr(app, "STREAM_MAX_ERRORS", 3)
+    ingestor = app.StreamIngestor(batch_size=1)
+    line = json.dumps(metrics).encode() + b'\n'
+
+    result = _run(ingestor, [line] * 10)
+    assert result["accepted"] == 10
+    assert result["micro_batches"] == 10
+    assert len(result["errors"]) == 3
+    assert result["errors"][0] == {"batch": 1, "error": "storage down", "status": "processing_failed"}
+
+
+def test_batches_run_on_the_bulk_executor(app, metrics, monkeypatch):
+    threads = []
+
+    def recording(batch):
+        threads.append(threading.current_thread().name)
+        return len(batch)
+
+    monkeypatch.setattr(app, "process_metrics_batch", recording)
+    result = _run(app.StreamIngestor(batch_size=2), [json.dumps(metrics).encode() + b'\n'] * 4)
+    assert result["recomputed_apis"] == 4
+    assert threads and all(name.startswith("bulk-badges") for name in threads)
+
+
+def test_batch_uses_one_evaluation_state(app, metrics, monkeypatch):
+    """Catalogue et commission lus dans l'état capturé en début de lot, pas dans les globales"""
+    current = app.evaluation_state
+    commission = app.CommissionCalculator()
+    commission.base_commission = 0.05
+    state = app.EvaluationState(current.engine, current.columnar, current.aggregates,
+                                app.BadgeCatalog(), commission)
+    monkeypatch.setattr(app, "evaluation_state", state)
+    monkeypatch.setattr(app, "badge_catalog", None)
+    monkeypatch.setattr(app, "commission_calc", None)
+    monkeypatch.setattr(app, "columnar_engine", None)
+
+    batch = [dict(metrics, api_id=f"{metrics['api_id']}-{i}") for i in range(app.COLUMNAR_BATCH_THRESHOLD)]
+    assert app.process_metrics_batch(batch) == len(batch)
+    assert len(state.catalog) == len(batch)
+    latest = app.latest_results[batch[0]["api_id"]]
+    assert latest["commission_info"]["base_commission"] == 0.05